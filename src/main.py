@@ -3,8 +3,12 @@ import argparse
 import matplotlib.pyplot as plt
 from modules.eddy_profile import EddyProfile
 from modules.flow_field import FlowField
+from modules import flow_field
 from modules.query import Query
 from modules import shape_function
+from modules import server
+from modules import session
+from modules.session import Session
 
 
 def main(args=None):
@@ -49,6 +53,45 @@ def main(args=None):
         metavar="X_FUNC",
         help="X velocity profile function to be used (default: none)"
     )
+    new_parser.add_argument(
+        "-b",
+        default=flow_field.GENERATE_BLOCK_SIZE,
+        metavar="BLOCK",
+        type=int,
+        help="Number of eddies generated and written at once, to create fields larger than memory "
+        f"(default: {flow_field.GENERATE_BLOCK_SIZE})",
+    )
+    new_parser.add_argument(
+        "-w",
+        default=None,
+        metavar="WORKERS",
+        type=int,
+        help="Number of worker threads generating the eddies (default: number of CPUs)",
+    )
+    new_parser.add_argument(
+        "--seed",
+        default=None,
+        metavar="SEED",
+        type=int,
+        help="Seed of the random eddies, the same field for a seed whatever the workers (default: random)",
+    )
+
+    # Convert field subparser
+    convert_parser = subparsers.add_parser(
+        "convert", help="Convert fields saved as .pkl files to field directories, show help: 'convert -h'."
+    )
+    convert_parser.add_argument(
+        "-n",
+        required=True,
+        metavar="NAME",
+        nargs="+",
+        help="Names of the fields to convert, separated by spaces",
+    )
+    convert_parser.add_argument(
+        "-k",
+        action="store_true",
+        help="Keep the .pkl files after converting",
+    )
 
     # Query field subparser
     query_parser = subparsers.add_parser(
@@ -77,11 +120,127 @@ def main(args=None):
         help="Cutoff value in shape function, mutiples of length-scale (default: 2.0)",
     )
 
+    # Inflow planes subparser
+    inflow_parser = subparsers.add_parser(
+        "inflow", help="Generate inflow planes over time on an existing field, show help: 'inflow -h'."
+    )
+
+    inflow_parser.add_argument(
+        "-n", required=True, metavar="NAME", help="Name of the existing field"
+    )
+
+    inflow_parser.add_argument(
+        "-t",
+        required=True,
+        metavar=("START", "STOP", "STEP"),
+        nargs=3,
+        type=float,
+        help="Range of times of the frames, stop included",
+    )
+
+    inflow_parser.add_argument(
+        "-x",
+        metavar="X",
+        type=float,
+        help="Position of the plane along x (default: low x bound of the field)",
+    )
+
+    inflow_parser.add_argument(
+        "-l",
+        metavar=("Y", "Z"),
+        nargs=2,
+        type=float,
+        help="Lower bounds of the plane in y and z (default: those of the field)",
+    )
+
+    inflow_parser.add_argument(
+        "-u",
+        metavar=("Y", "Z"),
+        nargs=2,
+        type=float,
+        help="Upper bounds of the plane in y and z (default: those of the field)",
+    )
+
+    inflow_parser.add_argument(
+        "-r",
+        default=0.2,
+        metavar="STEP",
+        type=float,
+        help="Step size (resolution) of the plane (default: 0.2)",
+    )
+
+    inflow_parser.add_argument(
+        "-o",
+        metavar="OUTPUT",
+        help="Name of the output file in 'results' folder (default: NAME_inflow)",
+    )
+
+    inflow_parser.add_argument(
+        "-m",
+        default=flow_field.MEMORY_LIMIT,
+        metavar="MEMORY",
+        type=float,
+        help=f"Memory budget of each block of frames in MB (default: {flow_field.MEMORY_LIMIT})",
+    )
+
+    inflow_parser.add_argument(
+        "-s", metavar="SHAPE", help="Shape function to be used (default: gaussian)"
+    )
+
+    inflow_parser.add_argument(
+        "-c",
+        metavar="CUTOFF",
+        type=float,
+        help="Cutoff value in shape function, mutiples of length-scale (default: 2.0)",
+    )
+
+    # Serve queries subparser
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep fields loaded and serve query requests, show help: 'serve -h'."
+    )
+
+    serve_parser.add_argument(
+        "-n",
+        required=True,
+        metavar="NAME",
+        nargs="+",
+        help="Names of the existing fields, separated by spaces",
+    )
+
+    serve_parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Unix socket to listen on (default: line-delimited stdin and stdout)",
+    )
+
+    serve_parser.add_argument(
+        "-m",
+        default=session.MEMORY_LIMIT,
+        metavar="MEMORY",
+        type=float,
+        help="Memory budget of loaded fields in MB, least recently used fields are unloaded "
+        f"(default: {session.MEMORY_LIMIT})",
+    )
+
+    serve_parser.add_argument(
+        "-s", metavar="SHAPE", help="Shape function to be used (default: gaussian)"
+    )
+
+    serve_parser.add_argument(
+        "-c",
+        metavar="CUTOFF",
+        type=float,
+        help="Cutoff value in shape function, mutiples of length-scale (default: 2.0)",
+    )
+
     # Parse arguments
     args = parser.parse_args(args)
 
     if hasattr(args, 'n'):
-        args.n = args.n.replace(".json", "")
+        if isinstance(args.n, list):
+            args.n = [n.replace(".json", "").replace(".pkl", "") for n in args.n]
+        else:
+            args.n = args.n.replace(".json", "")
     if hasattr(args, 'q'):
         args.q = args.q.replace(".json", "")
 
@@ -89,15 +248,25 @@ def main(args=None):
     if args.command == "new":
         try:
             profile = EddyProfile(args.p)
-            field = FlowField(
-                profile=profile, name=args.n, dimensions=args.d, avg_vel=args.v, x_vel_prof=args.x
+            FlowField.generate(
+                profile=profile, name=args.n, dimensions=args.d, avg_vel=args.v, x_vel_prof=args.x,
+                block_size=args.b, seed=args.seed, workers=args.w,
             )
-            field.save()
             print(f"New field '{args.n}' created and saved successfully")
         except Exception as e:
             print(f"Error creating new field: {e}", file=sys.stderr)
             return
 
+    # Convert fields saved as .pkl files
+    if args.command == "convert":
+        for name in args.n:
+            try:
+                FlowField.convert(name, keep=args.k)
+                print(f"Field '{name}' converted successfully")
+            except Exception as e:
+                print(f"Error converting field '{name}': {e}", file=sys.stderr)
+                return
+
     # Query exiting field
     if args.command == "query":
         try:
@@ -125,6 +294,68 @@ def main(args=None):
             print(f"Error handling query: {e}", file=sys.stderr)
             return
 
+    # Generate inflow planes over time
+    if args.command == "inflow":
+        try:
+            field = FlowField.load(args.n)
+        except Exception as e:
+            print(f"Error loading field '{args.n}': {e}", file=sys.stderr)
+            return
+
+        try:
+            if args.s is not None:
+                shape_function.set_active(args.s)
+            if args.c is not None:
+                shape_function.set_cutoff(args.c)
+        except Exception as e:
+            print(f"Error setting shape function: {e}", file=sys.stderr)
+            return
+
+        output = f"{args.n}_inflow" if args.o is None else args.o.replace(".npy", "")
+        try:
+            start, stop, step = args.t
+            if not (0 <= start <= stop and step > 0):
+                raise ValueError("Times must be a non-negative start, a stop not before it and a positive step")
+            times = field.step_coords(start, stop, step)
+            vel = field.sum_vel_inflow(
+                times, args.x, args.l, args.u, args.r, out_file=output, memory_limit=args.m
+            )
+            print(f"Inflow planes {vel.shape} saved to results/{output}.npy, index in results/{output}.json")
+        except Exception as e:
+            print(f"Error generating inflow planes: {e}", file=sys.stderr)
+            return
+
+    # Serve queries on fields kept in memory
+    if args.command == "serve":
+        try:
+            field_session = Session(args.m)
+        except Exception as e:
+            print(f"Error starting session: {e}", file=sys.stderr)
+            return
+        for name in args.n:
+            try:
+                field_session.get(name)
+            except Exception as e:
+                print(f"Error loading field '{name}': {e}", file=sys.stderr)
+                return
+
+        try:
+            if args.s is not None:
+                shape_function.set_active(args.s)
+            if args.c is not None:
+                shape_function.set_cutoff(args.c)
+        except Exception as e:
+            print(f"Error setting shape function: {e}", file=sys.stderr)
+            return
+
+        # Responses may go to stdout, so no progress bars
+        FlowField.verbose = False
+        print(f"Serving fields {', '.join(field_session.queries)}", file=sys.stderr)
+        if args.socket is not None:
+            server.serve_socket(field_session, args.socket)
+        else:
+            server.serve_stream(field_session)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,120 @@
+"""
+Cell list index for culling eddies by chunk.
+
+The cells are the chunks of a meshgrid query. The range of cells that each eddy affects
+(the cell plus the eddy margin) is found once per query, so that the eddies of a chunk
+are fetched by slicing instead of masking all eddies again for every chunk.
+"""
+import numpy as np
+
+
+class CellList:
+    """
+    Cell list index of eddies over the chunks of a meshgrid.
+
+    Cells are addressed by their chunk indices `(i, j, k)` along x, y and z.
+    An eddy belongs to every cell it is within the margin of, as in `FlowField.within_margin`.
+    """
+
+    def __init__(self, centers: np.ndarray, margins: np.ndarray, edges: list):
+        """
+        Build the index.
+
+        Parameters
+        ----------
+        centers : np.ndarray
+            Array of eddy centers, shape `(N, 3)`.
+        margins : np.ndarray
+            Array of eddy margins, outside of which an eddy does not affect a point.
+        edges : list
+            For each axis, an array of shape `(n, 2)` with the low and high coordinates of each cell.
+            Cells must be sorted and must not overlap.
+        """
+        self.edges = [np.asarray(e, dtype=float).reshape(-1, 2) for e in edges]
+        self.shape = tuple(len(e) for e in self.edges)
+
+        # Range [start, stop) of cells each eddy is within the margin of, along each axis
+        self.start = np.stack(
+            [np.searchsorted(e[:, 1], centers[:, a] - margins, side="right") for a, e in enumerate(self.edges)],
+            axis=-1,
+        )
+        self.stop = np.stack(
+            [np.searchsorted(e[:, 0], centers[:, a] + margins, side="left") for a, e in enumerate(self.edges)],
+            axis=-1,
+        )
+
+        # Eddies of the same margin span (almost) the same number of cells,
+        # sort each group by their first x cell so a slab is a contiguous range of the group
+        self.groups = []
+        for margin in np.unique(margins):
+            members = np.flatnonzero(margins == margin)
+            members = members[np.argsort(self.start[members, 0], kind="stable")]
+            span = int(np.max(self.stop[members, 0] - self.start[members, 0]))
+            self.groups.append((members, self.start[members, 0], span))
+
+    def query_slab(self, i: int):
+        """
+        Get the indices of eddies affecting the x-slab of cells `i`.
+
+        Returns
+        -------
+        np.ndarray
+            Indices into the `centers` used to build the index, in ascending order.
+        """
+        parts = [np.empty(0, dtype=int)]
+        for members, first, span in self.groups:
+            low = np.searchsorted(first, i - span + 1, side="left")
+            high = np.searchsorted(first, i, side="right")
+            candidates = members[low:high]
+            parts.append(candidates[self.stop[candidates, 0] > i])
+        return np.sort(np.concatenate(parts))
+
+    def slab(self, i: int):
+        """
+        Get the cells of the x-slab `i`, to fetch eddies of each `(j, k)` cell with `SlabCells.query`.
+        """
+        indices = self.query_slab(i)
+        return SlabCells(indices, self.start[indices, 1:], self.stop[indices, 1:], self.shape[1:])
+
+
+class SlabCells:
+    """
+    Eddies of an x-slab of cells, listed by `(j, k)` cell in the y-z plane.
+    """
+
+    def __init__(self, indices: np.ndarray, start: np.ndarray, stop: np.ndarray, shape: tuple):
+        """
+        Parameters
+        ----------
+        indices : np.ndarray
+            Indices of the eddies in the slab, in ascending order.
+        start : np.ndarray
+            First y and z cell of each eddy, shape `(n, 2)`.
+        stop : np.ndarray
+            Last y and z cell (exclusive) of each eddy, shape `(n, 2)`.
+        shape : tuple
+            Number of cells along y and z.
+        """
+        self.indices = indices
+        self.shape = shape
+
+        # Expand each eddy into one entry per (j, k) cell it affects
+        span = np.maximum(stop - start, 0)
+        counts = span[:, 0] * span[:, 1]
+        owner = np.repeat(np.arange(len(indices)), counts)
+        local = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = start[owner, 0] + local // span[owner, 1]
+        k = start[owner, 1] + local % span[owner, 1]
+
+        # Sort the entries by cell, keeping the eddies in ascending order within each cell
+        cell = j * shape[1] + k
+        order = np.argsort(cell, kind="stable")
+        self.members = indices[owner[order]]
+        self.offsets = np.searchsorted(cell[order], np.arange(shape[0] * shape[1] + 1))
+
+    def query(self, j: int, k: int):
+        """
+        Get the indices of eddies affecting the cell `(j, k)` of the slab, in ascending order.
+        """
+        c = j * self.shape[1] + k
+        return self.members[self.offsets[c] : self.offsets[c + 1]]
@@ -6,10 +6,29 @@ Currently only supports spherical isotropic eddies.
 import numpy as np
 from modules import shape_function
 
+KERNELS = ["chunk", "splat", "separable"]  # Available meshgrid kernels, see `sum_vel_*` functions
+SPLAT_BATCH_SIZE = 2**18  # Eddy-point pairs evaluated at once by the splat kernel
+
+# Approximate peak memory in bytes per eddy-point pair of a kernel call, used to size chunks.
+# The splat kernel is bounded by `SPLAT_BATCH_SIZE` instead, the chunk estimate is used to stay conservative.
+PAIR_BYTES = {"chunk": 96, "splat": 96, "separable": 24}
+# Approximate fixed cost of a kernel call, in number of eddy-point pairs that take the same time
+CALL_PAIRS = {"chunk": 1000, "splat": 1000, "separable": 10000}
+
+# Terms of the cross product rk x alpha: (velocity component, sign, axis of rk, component of alpha)
+CROSS_TERMS = [
+    (0, 1, 1, 2),
+    (0, -1, 2, 1),
+    (1, 1, 2, 0),
+    (1, -1, 0, 2),
+    (2, 1, 0, 1),
+    (2, -1, 1, 0),
+]
+
 
 def sum_vel_chunk(
     centers: np.ndarray,
-    sigma: np.ndarray,
+    sigma: np.ndarray | float,
     alpha: np.ndarray,
     x_coords: np.ndarray,
     y_coords: np.ndarray,
@@ -25,8 +44,8 @@ def sum_vel_chunk(
     ----------
     centers : np.ndarray
         Array of eddy centers.
-    sigma : np.ndarray
-        Array of eddy length scales.
+    sigma : np.ndarray | float
+        Array of eddy length scales, or the length scale of all eddies.
     alpha : np.ndarray
         Array of eddy intensities.
     x_coords : np.ndarray
@@ -50,7 +69,7 @@ def sum_vel_chunk(
     # Reshape the centers, alpha, and sigma arrays to allow broadcasting
     chunk_centers = centers.reshape(-1, 1, 1, 1, 3)
     chunk_alpha = alpha.reshape(-1, 1, 1, 1, 3)
-    chunk_sigma = sigma.reshape(-1, 1, 1, 1, 1)
+    chunk_sigma = np.reshape(sigma, (-1, 1, 1, 1, 1))
 
     # Calculate the relative position vectors and normalize
     try:
@@ -65,11 +84,470 @@ def sum_vel_chunk(
     # Calculate the normalized distance
     dk = np.linalg.norm(rk, axis=-1)[..., np.newaxis]
 
-    # Calculate the velocity fluctuation due to each eddy
-    vel_fluct = shape_function.active(dk, chunk_sigma) * np.cross(rk, chunk_alpha)
+    # Calculate the velocity fluctuation due to each eddy,
+    # with the cross product rk x alpha written out to skip the overhead of np.cross on small chunks
+    cross = np.empty_like(rk)
+    for c in range(3):
+        u, v = (c + 1) % 3, (c + 2) % 3
+        np.subtract(
+            rk[..., u] * chunk_alpha[..., v],
+            rk[..., v] * chunk_alpha[..., u],
+            out=cross[..., c],
+        )
+    vel_fluct = shape_function.active(dk, chunk_sigma) * cross
+    del cross
     del rk, dk, chunk_alpha, chunk_sigma
 
     # Sum the velocity fluctuations from all eddies
     vel_fluct = np.sum(vel_fluct, axis=0)
 
     return vel_fluct
+
+
+def sum_vel_slab(
+    vel: np.ndarray,
+    i: int,
+    index,
+    centers: np.ndarray,
+    sigma: float,
+    alpha: np.ndarray,
+    margin: float,
+    x_coords: np.ndarray,
+    y_coords: np.ndarray,
+    z_coords: np.ndarray,
+    y_chunks: list,
+    z_chunks: list,
+    kernel: str = "chunk",
+    progress=None,
+):
+    """
+    Add the velocity fluctuations due to eddies of one length scale into an x-slab of chunks,
+    looping through y and z chunks.
+
+    Parameters
+    ----------
+    vel : np.ndarray
+        Velocity array of the slab to add into, shape `(len(x_coords), len(y_coords), len(z_coords), 3)`.
+    i : int
+        Index of the x-slab in `index`.
+    index : CellList
+        Cell list of the eddies over the chunks of the meshgrid.
+    centers : np.ndarray
+        Array of all eddy centers.
+    sigma : float
+        Length scale of all eddies.
+    alpha : np.ndarray
+        Array of all eddy intensities.
+    margin : float
+        Margin of all eddies, outside of which an eddy does not affect a point.
+    x_coords : np.ndarray
+        Array of x coordinates spanning the slab.
+    y_coords : np.ndarray
+        Array of y coordinates spanning the meshgrid.
+    z_coords : np.ndarray
+        Array of z coordinates spanning the meshgrid.
+    y_chunks : list
+        Indices of `y_coords` in each y chunk.
+    z_chunks : list
+        Indices of `z_coords` in each z chunk.
+    kernel : str, optional
+        Kernel used to sum eddy contributions, one of `KERNELS`, by default "chunk".
+    progress : Callable, optional
+        Called with the number of grid points done after each chunk.
+    """
+    if kernel == "splat":
+        idx = index.query_slab(i)
+        vel += sum_vel_splat(
+            centers[idx],
+            sigma,
+            alpha[idx],
+            margin,
+            x_coords,
+            y_coords,
+            z_coords,
+        )
+        if progress is not None:
+            progress(len(x_coords) * len(y_coords) * len(z_coords))
+        return
+
+    chunk_kernel = sum_vel_chunk_separable if kernel == "separable" else sum_vel_chunk
+    cells = index.slab(i)
+    for j, yc in enumerate(y_chunks):
+        for k, zc in enumerate(z_chunks):
+            idx = cells.query(j, k)
+            vel[
+                :,
+                yc[0] : yc[-1] + 1,
+                zc[0] : zc[-1] + 1,
+                :,
+            ] += chunk_kernel(
+                centers[idx],
+                sigma,
+                alpha[idx],
+                x_coords,
+                y_coords[yc],
+                z_coords[zc],
+            )
+            if progress is not None:
+                progress(len(x_coords) * len(yc) * len(zc))
+
+
+def sum_vel_chunk_separable(
+    centers: np.ndarray,
+    sigma: np.ndarray | float,
+    alpha: np.ndarray,
+    x_coords: np.ndarray,
+    y_coords: np.ndarray,
+    z_coords: np.ndarray,
+):
+    """
+    Calculate the velocity field due to each eddy within a chunk, for the gaussian shape function only.
+
+    The gaussian factors into 1D exponentials along x, y and z, and `rk x alpha` is linear in the
+    per-axis offsets, so each eddy only needs `nx + ny + nz` exponentials instead of one per point.
+    Eddies entirely within the cutoff of the chunk are summed with outer products,
+    eddies crossing the cutoff are masked by their squared normalized distance.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        Array of eddy centers.
+    sigma : np.ndarray | float
+        Array of eddy length scales, or the length scale of all eddies.
+    alpha : np.ndarray
+        Array of eddy intensities.
+    x_coords : np.ndarray
+        Array of x coordinates spanning the chunk.
+    y_coords : np.ndarray
+        Array of y coordinates spanning the chunk.
+    z_coords : np.ndarray
+        Array of z coordinates spanning the chunk.
+
+    Returns
+    -------
+    np.ndarray
+        Array of velocity fluctuations due to each eddy within the chunk.
+    """
+    coords = (x_coords, y_coords, z_coords)
+    vel_fluct = np.zeros((len(x_coords), len(y_coords), len(z_coords), 3))
+
+    # Per-axis normalized offsets and 1D gaussian factors, shape (N, n) for each axis
+    rel = [(coords[a] - centers[:, a, np.newaxis]) / np.reshape(sigma, (-1, 1)) for a in range(3)]
+    sq = [r**2 for r in rel]
+    gauss = [np.exp(-shape_function.HALF_PI * s) for s in sq]
+    gauss[0] *= shape_function.C
+
+    # Classify eddies by the nearest and farthest point of the chunk against the cutoff
+    cutoff_sq = shape_function.get_cutoff() ** 2
+    near = sq[0].min(axis=1) + sq[1].min(axis=1) + sq[2].min(axis=1)
+    far = sq[0].max(axis=1) + sq[1].max(axis=1) + sq[2].max(axis=1)
+    inside = far < cutoff_sq
+    crossing = ~inside & (near < cutoff_sq)
+
+    # Eddies fully within the cutoff: for each component, (nx * ny, 2N) @ (2N, nz) over both terms
+    if np.any(inside):
+        g_in = [gauss[a][inside] for a in range(3)]
+        r_in = [rel[a][inside] for a in range(3)]
+        a_in = alpha[inside]
+        for comp in range(3):
+            xy_parts = []
+            z_parts = []
+            for _, sign, axis, a_comp in CROSS_TERMS[2 * comp : 2 * comp + 2]:
+                factors = [g_in[0] * (sign * a_in[:, a_comp, np.newaxis]), g_in[1], g_in[2]]
+                factors[axis] = factors[axis] * r_in[axis]
+                xy_parts.append(
+                    (factors[0][:, :, np.newaxis] * factors[1][:, np.newaxis, :]).reshape(len(a_in), -1)
+                )
+                z_parts.append(factors[2])
+            vel_fluct[..., comp] += (
+                np.concatenate(xy_parts).T @ np.concatenate(z_parts)
+            ).reshape(vel_fluct.shape[:3])
+
+    # Eddies crossing the cutoff: same factors, masked pair by pair without transcendentals
+    if np.any(crossing):
+        sq_c = [s[crossing] for s in sq]
+        mask = (
+            sq_c[0][:, :, np.newaxis, np.newaxis]
+            + sq_c[1][:, np.newaxis, :, np.newaxis]
+            + sq_c[2][:, np.newaxis, np.newaxis, :]
+        ) < cutoff_sq
+        weight = (
+            gauss[0][crossing][:, :, np.newaxis, np.newaxis]
+            * gauss[1][crossing][:, np.newaxis, :, np.newaxis]
+            * gauss[2][crossing][:, np.newaxis, np.newaxis, :]
+            * mask
+        )
+        del mask
+        for comp, sign, axis, a_comp in CROSS_TERMS:
+            factor = rel[axis][crossing] * (sign * alpha[crossing, a_comp, np.newaxis])
+            vel_fluct[..., comp] += np.einsum(f"nijk,n{'ijk'[axis]}->ijk", weight, factor)
+
+    return vel_fluct
+
+
+def sum_vel_splat(
+    centers: np.ndarray,
+    sigma: np.ndarray | float,
+    alpha: np.ndarray,
+    margins: np.ndarray | float,
+    x_coords: np.ndarray,
+    y_coords: np.ndarray,
+    z_coords: np.ndarray,
+    batch_size: int = SPLAT_BATCH_SIZE,
+):
+    """
+    Calculate the velocity field due to eddies by writing each eddy only into its own bounding box.
+
+    Unlike `sum_vel_chunk`, which evaluates every eddy against every point of the region,
+    this kernel finds the window of grid indices within `margins` of each eddy center
+    and only evaluates the eddy on that window.
+    Eddies of the same length scale are processed together in vectorized batches.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        Array of eddy centers.
+    sigma : np.ndarray | float
+        Array of eddy length scales, or the length scale of all eddies.
+    alpha : np.ndarray
+        Array of eddy intensities.
+    margins : np.ndarray | float
+        Array of eddy influence radii, outside of which the eddy contribution is ignored,
+        or the influence radius of all eddies.
+    x_coords : np.ndarray
+        Array of x coordinates spanning the region, sorted ascending.
+    y_coords : np.ndarray
+        Array of y coordinates spanning the region, sorted ascending.
+    z_coords : np.ndarray
+        Array of z coordinates spanning the region, sorted ascending.
+    batch_size : int, optional
+        Approximate number of eddy-point pairs evaluated at once, by default `SPLAT_BATCH_SIZE`.
+
+    Returns
+    -------
+    np.ndarray
+        Array of velocity fluctuations due to all eddies within the region.
+    """
+    coords = (x_coords, y_coords, z_coords)
+    shape = (len(x_coords), len(y_coords), len(z_coords))
+    vel = np.zeros((np.prod(shape), 3))
+    sigma = np.broadcast_to(sigma, len(centers))
+    margins = np.broadcast_to(margins, len(centers))
+
+    # Window of grid indices [start, stop) covered by each eddy along each axis
+    start = np.stack(
+        [np.searchsorted(coords[a], centers[:, a] - margins, side="right") for a in range(3)],
+        axis=-1,
+    )
+    stop = np.stack(
+        [np.searchsorted(coords[a], centers[:, a] + margins, side="left") for a in range(3)],
+        axis=-1,
+    )
+    touching = np.all(stop > start, axis=-1)
+
+    # Eddies of the same length scale have (almost) the same window size, batch them together
+    for s in np.unique(sigma[touching]):
+        group = np.flatnonzero(touching & (sigma == s))
+        # Sort by window start so that a batch writes to a compact part of the output
+        group = group[np.lexsort((start[group, 2], start[group, 1], start[group, 0]))]
+        width = np.max(stop[group] - start[group], axis=0)
+        step = max(1, batch_size // int(np.prod(width)))
+        for b in range(0, len(group), step):
+            batch = group[b : b + step]
+            vel_batch, flat = _splat_batch(
+                centers[batch],
+                sigma[batch],
+                alpha[batch],
+                start[batch],
+                stop[batch],
+                width,
+                coords,
+                shape,
+            )
+            # Accumulate into the output, offset to the smallest index touched by the batch
+            low = np.min(flat)
+            flat = np.broadcast_to(flat - low, vel_batch[0].shape).ravel()
+            for c in range(3):
+                part = np.bincount(flat, weights=vel_batch[c].ravel())
+                vel[low : low + len(part), c] += part
+
+    return vel.reshape(*shape, 3)
+
+
+def _splat_batch(centers, sigma, alpha, start, stop, width, coords, shape):
+    """
+    Evaluate a batch of eddies on their index windows, padded to a common `width`.
+    Returns the three velocity fluctuation components and the flat output indices,
+    each of shape `(B, wx, wy, wz)`. Padded entries have zero velocity.
+    """
+    expand = [
+        (slice(None), slice(None), np.newaxis, np.newaxis),
+        (slice(None), np.newaxis, slice(None), np.newaxis),
+        (slice(None), np.newaxis, np.newaxis, slice(None)),
+    ]
+    flat = 0
+    mask = True
+    rel = []
+    for a in range(3):
+        idx = start[:, a, np.newaxis] + np.arange(width[a])
+        mask = mask & (idx < stop[:, a, np.newaxis])[expand[a]]
+        idx = np.minimum(idx, shape[a] - 1)
+        flat = flat * shape[a] + idx[expand[a]]
+        # Relative position along this axis, normalized by the length scale
+        rel.append(((coords[a][idx] - centers[:, a, np.newaxis]) / sigma[:, np.newaxis])[expand[a]])
+    rx, ry, rz = rel
+
+    # Normalized distance, broadcast from the per-axis windows to the (B, wx, wy, wz) box
+    dk = np.sqrt(rx**2 + ry**2 + rz**2)
+    q = shape_function.active(dk, sigma.reshape(-1, 1, 1, 1)) * mask
+
+    # Cross product of the relative position and the eddy intensity, component by component
+    ax, ay, az = (alpha[:, c].reshape(-1, 1, 1, 1) for c in range(3))
+    vel_fluct = (
+        q * (ry * az - rz * ay),
+        q * (rz * ax - rx * az),
+        q * (rx * ay - ry * ax),
+    )
+
+    return vel_fluct, flat
+
+
+def sum_vel_section(
+    centers: np.ndarray,
+    sigma: float,
+    alpha: np.ndarray,
+    margin: float,
+    x_coords: np.ndarray,
+    y_coords: np.ndarray,
+    z_coords: np.ndarray,
+    batch_size: int = SPLAT_BATCH_SIZE,
+):
+    """
+    Calculate the velocity field due to eddies of one length scale on a plane or a line of grid points,
+    a grid with a single coordinate along one or two axes.
+
+    The sphere of influence of an eddy (of radius `margin`) cuts the plane in a disk, or the line in a segment,
+    which gets smaller the further the eddy is from the plane or line.
+    Each eddy is only evaluated on the grid points in the bounding box of its section,
+    listed as eddy-point pairs for `sum_vel_pairs`.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        Array of eddy centers.
+    sigma : float
+        Length scale of all eddies.
+    alpha : np.ndarray
+        Array of eddy intensities.
+    margin : float
+        Influence radius of all eddies, outside of which the eddy contribution is ignored.
+    x_coords : np.ndarray
+        Array of x coordinates spanning the region, sorted ascending.
+    y_coords : np.ndarray
+        Array of y coordinates spanning the region, sorted ascending.
+    z_coords : np.ndarray
+        Array of z coordinates spanning the region, sorted ascending.
+    batch_size : int, optional
+        Approximate number of eddy-point pairs evaluated at once, by default `SPLAT_BATCH_SIZE`.
+
+    Returns
+    -------
+    np.ndarray
+        Array of velocity fluctuations due to all eddies within the region.
+    """
+    coords = (x_coords, y_coords, z_coords)
+    shape = tuple(len(c) for c in coords)
+    points = np.stack(np.meshgrid(*coords, indexing="ij"), axis=-1).reshape(-1, 3)
+    vel = np.zeros((len(points), 3))
+
+    # Radius of the section of each eddy by the plane or line
+    fixed = [a for a in range(3) if shape[a] == 1]
+    dist_sq = sum((centers[:, a] - coords[a][0]) ** 2 for a in fixed) if fixed else np.zeros(len(centers))
+    radius = np.sqrt(np.maximum(margin**2 - dist_sq, 0))
+
+    # Window of grid indices [start, stop) covered by each section along each axis
+    start = np.zeros((len(centers), 3), dtype=int)
+    stop = np.ones((len(centers), 3), dtype=int)
+    for a in range(3):
+        if a in fixed:
+            stop[:, a] = radius > 0
+        else:
+            start[:, a] = np.searchsorted(coords[a], centers[:, a] - radius, side="right")
+            stop[:, a] = np.searchsorted(coords[a], centers[:, a] + radius, side="left")
+    width = np.maximum(stop - start, 0)
+    counts = np.prod(width, axis=1)
+
+    # Expand batches of eddies into one pair per grid point in their windows
+    ends = np.cumsum(counts)
+    b = 0
+    while b < len(centers):
+        done = ends[b - 1] if b > 0 else 0
+        e = max(int(np.searchsorted(ends, done + batch_size, side="right")), b + 1)
+        eddy_idx = np.repeat(np.arange(b, e), counts[b:e])
+        local = np.arange(len(eddy_idx)) - np.repeat(ends[b:e] - counts[b:e] - done, counts[b:e])
+        w = width[eddy_idx]
+        i = start[eddy_idx, 0] + local // (w[:, 1] * w[:, 2])
+        j = start[eddy_idx, 1] + local // w[:, 2] % w[:, 1]
+        k = start[eddy_idx, 2] + local % w[:, 2]
+        point_idx = (i * shape[1] + j) * shape[2] + k
+        sum_vel_pairs(centers, sigma, alpha, points, eddy_idx, point_idx, out=vel)
+        b = e
+
+    return vel.reshape(*shape, 3)
+
+
+def sum_vel_pairs(
+    centers: np.ndarray,
+    sigma: float,
+    alpha: np.ndarray,
+    points: np.ndarray,
+    eddy_idx: np.ndarray,
+    point_idx: np.ndarray,
+    out: np.ndarray = None,
+):
+    """
+    Calculate the velocity fluctuations at scattered points from a list of eddy-point pairs.
+
+    Only the listed pairs are evaluated, so the cost follows the number of interactions
+    instead of the number of eddies times the number of points.
+    With `out`, the pairs are added to it in place, without touching the other points.
+
+    Parameters
+    ----------
+    centers : np.ndarray
+        Array of eddy centers.
+    sigma : float
+        Length scale of all eddies.
+    alpha : np.ndarray
+        Array of eddy intensities.
+    points : np.ndarray
+        Array of point coordinates, shape `(M, 3)`.
+    eddy_idx : np.ndarray
+        Index into `centers` of the eddy of each pair.
+    point_idx : np.ndarray
+        Index into `points` of the point of each pair.
+    out : np.ndarray, optional
+        Array of shape `(M, 3)` to add the velocity fluctuations to, by default a new array.
+
+    Returns
+    -------
+    np.ndarray
+        Array of velocity fluctuations at each point, shape `(M, 3)`, `out` if given.
+    """
+    rk = (points[point_idx] - centers[eddy_idx]) / sigma
+    dk = np.sqrt(np.sum(rk**2, axis=-1))
+    q = shape_function.active(dk, sigma)
+    pair_alpha = alpha[eddy_idx]
+
+    # Cross product rk x alpha, scaled by the shape function and summed into each point
+    vel_fluct = np.zeros((len(points), 3)) if out is None else out
+    for c in range(3):
+        u, v = (c + 1) % 3, (c + 2) % 3
+        weights = q * (rk[:, u] * pair_alpha[:, v] - rk[:, v] * pair_alpha[:, u])
+        if out is None:
+            vel_fluct[:, c] = np.bincount(point_idx, weights=weights, minlength=len(points))
+        else:
+            # Only the points of the pairs, instead of a count over every point
+            np.add.at(vel_fluct[:, c], point_idx, weights)
+
+    return vel_fluct
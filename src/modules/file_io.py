@@ -3,6 +3,9 @@ This module provides functions to read and write files in different formats.
 """
 import os
 import json
+import hashlib
+import itertools
+import threading
 import numpy as np
 import pickle
 
@@ -51,6 +54,9 @@ def read(sub_dir: str, name: str, format="json"):
         # Numpy file, return as np.ndarray
         if format == "npy":
             return np.load(f"{DIR}/{sub_dir}/{name}.{format}")
+        # Numpy file, return as a read-only memory map
+        if format == "mmap":
+            return np.load(f"{DIR}/{sub_dir}/{name}.npy", mmap_mode="r")
         # Pickle file, return as object
         if format == "obj":
             with open(f"{DIR}/{sub_dir}/{name}.pkl", "rb") as file:
@@ -85,8 +91,12 @@ def write(sub_dir: str, name: str, content, format='json', indent=None):
     try:
         os.makedirs(f"{DIR}/{sub_dir}", exist_ok=True)
         # numpy array, save as .npy
+        # Written to a temporary file first, so memory maps of the previous file stay valid
         if format == "npy":
-            return np.save(f"{DIR}/{sub_dir}/{name}.npy", content)
+            path = f"{DIR}/{sub_dir}/{name}.npy"
+            with open(f"{path}.{os.getpid()}.tmp", "wb") as file:
+                np.save(file, content)
+            return os.replace(f"{path}.{os.getpid()}.tmp", path)
         # dict, save as .json
         if format == "json":
             with open(f"{DIR}/{sub_dir}/{name}.json", "w") as file:
@@ -103,6 +113,124 @@ def write(sub_dir: str, name: str, content, format='json', indent=None):
         raise FailToWrite(f"Cannot write file: {e}")
 
 
+def open_memmap(sub_dir: str, name: str, shape: tuple, dtype=np.float64):
+    """
+    Create a zero-filled `.npy` file in the specified sub-directory, opened as a memory map.
+
+    Parameters
+    ----------
+    sub_dir : str
+        Sub-directory to write to.
+    name : str
+        Name of the file to create.
+    shape : tuple
+        Shape of the array.
+    dtype : data-type, optional
+        Data type of the array, by default np.float64.
+
+    Returns
+    -------
+    np.memmap
+        Memory-mapped array backed by the file.
+
+    Raises
+    ------
+    FailToWrite
+        If the file cannot be created.
+    """
+    try:
+        os.makedirs(f"{DIR}/{sub_dir}", exist_ok=True)
+        return np.lib.format.open_memmap(
+            f"{DIR}/{sub_dir}/{name}.npy", mode="w+", dtype=dtype, shape=shape
+        )
+    except (IOError, ValueError) as e:
+        raise FailToWrite(f"Cannot create memory-mapped file: {e}")
+
+
+def read_points(sub_dir: str, name: str, cache_dir: str = ".cache", batch_size: int = 2**16):
+    """
+    Open an array of point coordinates from a `.npy` or `.csv` file, without loading it into memory.
+
+    A `.npy` file is memory-mapped. A `.csv` file, with one point `x,y,z` per line
+    (comment lines starting with `#`), is converted batch by batch into a memory-mapped `.npy` file
+    in `cache_dir`, named by the path, size and modification time of the `.csv` file,
+    so it is parsed again only if it changes.
+
+    Parameters
+    ----------
+    sub_dir : str
+        Sub-directory to read from.
+    name : str
+        Name of the file to read, including the `.npy` or `.csv` extension.
+        An absolute path is used as is.
+    cache_dir : str, optional
+        Sub-directory to convert `.csv` files into, by default ".cache".
+    batch_size : int, optional
+        Number of lines of a `.csv` file parsed at once, by default 2**16.
+
+    Returns
+    -------
+    np.ndarray
+        Memory-mapped array of point coordinates, shape `(M, 3)`.
+
+    Raises
+    ------
+    FailToRead
+        If the file cannot be read.
+    """
+    path = os.path.join(DIR, sub_dir, name)
+    try:
+        if name.endswith(".npy"):
+            points = np.load(path, mmap_mode="r")
+        elif name.endswith(".csv"):
+            stat = os.stat(path)
+            source = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+            stem = os.path.splitext(os.path.basename(name))[0]
+            stem = f"{stem}_{hashlib.sha256(source.encode()).hexdigest()[:16]}"
+            converted = os.path.join(DIR, cache_dir, f"{stem}.npy")
+            if os.path.exists(converted):
+                points = np.load(converted, mmap_mode="r")
+            else:
+                with open(path, "r") as file:
+                    count = sum(1 for line in file if line.strip() and not line.lstrip().startswith("#"))
+                # Converted into a temporary file first, so a partly converted file is never read
+                temp = os.path.join(DIR, cache_dir, f"{stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+                try:
+                    points = open_memmap(cache_dir, os.path.basename(temp)[:-4], (count, 3))
+                    with open(path, "r") as file:
+                        done = 0
+                        while True:
+                            lines = list(itertools.islice(file, batch_size))
+                            if not lines:
+                                break
+                            batch = np.loadtxt(lines, delimiter=",", ndmin=2)
+                            if done + len(batch) > count:
+                                break
+                            points[done : done + len(batch)] = batch
+                            done += len(batch)
+                    if done != count or lines:
+                        raise ValueError("File changed while reading")
+                    points.flush()
+                    del points
+                    try:
+                        os.replace(temp, converted)
+                    except PermissionError:
+                        # Another request converted the same file first and has it mapped (Windows)
+                        if not os.path.exists(converted):
+                            raise
+                finally:
+                    if os.path.exists(temp):
+                        os.remove(temp)
+                points = np.load(converted, mmap_mode="r")
+        else:
+            raise ValueError("Points file must be .npy or .csv")
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(f"Points must have shape (M, 3), got {points.shape}")
+        return points
+    except Exception as e:
+        raise FailToRead(f"Cannot read {sub_dir} file '{name}': {e}")
+
+
 def clear(sub_dir):
     """
     Clear the specified sub-directory.
@@ -121,6 +249,10 @@ def clear(sub_dir):
         os.makedirs(f"{DIR}/{sub_dir}", exist_ok=True)
         for file in os.listdir(f"{DIR}/{sub_dir}"):
             if os.path.isfile(f"{DIR}/{sub_dir}/{file}"):
-                os.remove(f"{DIR}/{sub_dir}/{file}")
+                # Concurrent queries may clear the same directory
+                try:
+                    os.remove(f"{DIR}/{sub_dir}/{file}")
+                except FileNotFoundError:
+                    pass
     except IOError as e:
         raise FailToWrite(f"Cannot clear directory: {e}")
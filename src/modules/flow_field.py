@@ -2,7 +2,13 @@
 Turbulent Flow Field Module
 """
 
+import os
+import copy
+import shutil
+import threading
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+import hashlib
 # import time
 from tqdm import tqdm
 import numpy as np
@@ -10,13 +16,28 @@ from modules import utils
 from modules import file_io
 from modules import shape_function
 from modules import eddy
+from modules import cell_list
+from modules import parallel
+from modules import neighbors
+from modules import stretching
 from modules.eddy_profile import EddyProfile
 from modules import x_velocity
 
 WRAP_ITER = [-1, 0, 1]  # Iterations to wrap around the flow field, do not change
 CUTOFF = 1.2 * shape_function.get_cutoff()  # has to be greater than 1
 CACHE_DIR = ".cache"
-CACHE_FORMAT = "npy"
+AUTO_CHUNK_CANDIDATES = 24  # Number of chunk sizes tried along each axis by `FlowField.auto_chunk_size`
+MEMORY_LIMIT = 256  # Default memory budget of each kernel call in MB, for automatic chunk sizes
+BACKENDS = ["thread", "process"]
+SHIFT_TOLERANCE = 1e-6  # Tolerance in grid steps to shift a time step instead of calculating it
+POINTS_BATCH_SIZE = 4096  # Default number of points evaluated together by `sum_vel_points`
+FIELD_FORMAT = 1  # Version of the field directory format, see `FlowField.save`
+GENERATE_BLOCK_SIZE = 2**20  # Default number of eddies generated at once by `FlowField.generate`
+STREAM_SIZE = 2**16  # Eddies drawn from each random stream (`FlowField.generate` and `get_eddy_yz`), do not change
+YZ_CACHE_SIZE = 256  # Memory of the random flow iterations kept by each field in MB, see `FlowField.get_eddy_yz`
+YZ_LOCK = threading.Lock()  # Guards the caches of random flow iterations across threads
+BRICK_SIZE = 1.0  # Length along x of the bricks that saved eddies are sorted into, see `FlowField.sort_bricks`
+INFLOW_POINT_BYTES = 64  # Approximate memory of each point and time evaluated together by `sum_vel_inflow`
 
 
 class FlowField:
@@ -34,6 +55,7 @@ class FlowField:
         dimensions: np.ndarray | list,
         avg_vel: float | int = 0,
         x_vel_prof: str = "",
+        seed: int = None,
     ):
         """
         Generate a new flow field.
@@ -63,7 +85,55 @@ class FlowField:
             Average flow velocity to move the eddies
         `x_vel_prof` : str, optional (default: `""`)
             Name of the x-velocity profile to use, must already be defined in the `x_velocity.py`
+        `seed` : int, optional (default: random)
+            Seed of the random eddies, the same field as `generate` for a seed
         """
+        self.init_settings(profile, name, dimensions, avg_vel, seed)
+        # if avg_vel is not zero and velocity profile defined, use calculate individual x-velocity for each eddy
+        if self.avg_vel != 0 and x_vel_prof != "":
+            self.x_vel_func = x_velocity.get_func(x_vel_prof)
+            print("Using x-velocity profile: ", x_vel_prof)
+
+        # Eddies drawn brick by brick from the same random streams as `generate`, so both give the same field
+        layout = self.init_layout()
+        n = int(self.N)
+        self.init_x = np.empty(n)
+        self.alpha = np.empty((n, 3))
+        self.sigma_index = np.empty(n, dtype=np.min_scalar_type(max(len(layout["length_scales"]) - 1, 0)))
+        # if avg_vel is zero, wrap around in x will be the same method as in y and z (exact coordinates),
+        # otherwise wrap around in x will have random y and z to avoid periodicity
+        self.y = {stored: np.empty(n) for stored in layout["stored"]}
+        self.z = {stored: np.empty(n) for stored in layout["stored"]}
+        if hasattr(self, "x_vel_func"):
+            self.x_vel = np.empty(n)
+        self.generate_block(0, n, layout)
+        for fi, stored in layout["iterations"].items():
+            self.y[int(fi)] = self.y[stored]
+            self.z[int(fi)] = self.z[stored]
+
+        # Length scales of each eddy
+        self.sigma = layout["length_scales"][self.sigma_index]
+        del self.sigma_index
+
+        if hasattr(self, "x_vel"):
+            print("Max eddy center x-velocity: ", np.max(self.x_vel, initial=0))
+            print("Min eddy center x-velocity: ", np.min(self.x_vel, initial=0))
+        else:
+            # Eddies sorted by brick from the start, so they keep their order (and derived flow iterations) when saved
+            self.bricks = {
+                "offsets": layout["offsets"],
+                "max_sigma": float(np.max(self.sigma, initial=0)),
+                "arrays": (self.init_x, self.sigma),
+            }
+
+        # self.save()
+
+        self.print("Total eddies: ", self.N)
+
+    def init_settings(
+        self, profile: EddyProfile, name: str, dimensions: np.ndarray | list, avg_vel: float | int, seed: int = None
+    ):
+        """Check and set the settings of a new flow field, everything but the eddies (see `__init__`)."""
         if isinstance(dimensions, list):
             dimensions = np.array(dimensions)
 
@@ -76,6 +146,9 @@ class FlowField:
             raise ValueError("Dimensions must be positive")
         if not utils.is_not_negative(avg_vel):
             raise ValueError("Average velocity must be a non-negative number")
+        if seed is not None and not (isinstance(seed, (int, np.integer)) and seed >= 0):
+            raise ValueError("Seed must be a non-negative integer")
+        self.seed = np.random.SeedSequence().entropy if seed is None else int(seed)
         self.profile = profile
         self.name = str(name)
         self.dimensions = dimensions
@@ -91,62 +164,93 @@ class FlowField:
                 "Eddy length scales are too large compared to field dimensions"
             )
 
-        # Total volume of the flow field
-        volume = np.prod(self.dimensions)
+        # Boundaries of the flow field
+        self.low_bounds = -self.dimensions / 2
+        self.high_bounds = self.dimensions / 2
 
-        # Number of eddies of each variant due to density
-        self.variant_quantity = utils.stoch_round(self.variant_density * volume)
+    def __getattr__(self, name: str):
+        """Expand the length scales of a loaded field the first time all of them are needed, see `load`."""
+        if name == "sigma" and "sigma_index" in self.__dict__:
+            self.sigma = self.sigma_values[self.sigma_index]
+            return self.sigma
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
-        # Total number of eddies
-        self.N = np.sum(self.variant_quantity)
+    def get_eddy_centers(self, fi: int, part: slice = slice(None)):
+        """Get the x, y, and z coordinates of the eddies in a flow iteration, or of a range of them."""
+        y, z = self.get_eddy_yz(fi, part)
+        return np.stack((self.init_x[part], y, z), axis=-1)
 
-        # Length scales of each eddy
-        self.sigma = np.repeat(self.variant_length_scale, self.variant_quantity)
+    def get_eddy_yz(self, fi: int, part: slice = slice(None)):
+        """
+        Get the y and z coordinates of the eddies in a flow iteration, or of a range of them.
 
-        # Boundaries of the flow field
-        self.low_bounds = -self.dimensions / 2
-        self.high_bounds = self.dimensions / 2
+        Flow iterations stored with the field are read as they are. Others are random, but the same for a field seed
+        and iteration, in any process: each block of `STREAM_SIZE` eddies is drawn from its own stream
+        seeded by `(seed, iteration, block)`, so only the blocks in the range are drawn.
+        Recently used blocks are kept up to `YZ_CACHE_SIZE`, instead of every flow iteration ever used.
+        """
+        if fi in self.y:
+            return self.y[fi][part], self.z[fi][part]
+        start, stop, _ = part.indices(int(self.N))
+        if start >= stop:
+            return np.empty(0), np.empty(0)
+        first = start // STREAM_SIZE
+        yz = np.concatenate([self.get_yz_block(fi, b) for b in range(first, (stop - 1) // STREAM_SIZE + 1)], axis=1)
+        yz = yz[:, start - first * STREAM_SIZE : stop - first * STREAM_SIZE]
+        return yz[0], yz[1]
 
-        # Random center positions of the eddies
-        self.init_x = np.random.uniform(self.low_bounds[0], self.high_bounds[0], self.N)
-        self.y = {}
-        self.z = {}
-        self.set_rand_eddy_yz(0)
+    def get_yz_block(self, fi: int, b: int):
+        """Get the y and z coordinates of a block of eddies in a flow iteration not stored with the field."""
+        cache = self.__dict__.setdefault("yz_blocks", OrderedDict())
+        with YZ_LOCK:
+            if (fi, b) in cache:
+                cache.move_to_end((fi, b))
+                return cache[(fi, b)]
 
-        # if avg_vel is zero, wrap around in x will be the same method as in y and z (exact coordinates)
-        if self.avg_vel == 0:
-            self.y[1] = self.y[0]
-            self.z[1] = self.z[0]
-            self.y[2] = self.y[0]
-            self.z[2] = self.z[0]
-        # if avg_vel is not zero and velocity profile defined, use calculate individual x-velocity for each eddy
-        elif x_vel_prof != "":
-            self.x_vel_func = x_velocity.get_func(x_vel_prof)
-            print("Using x-velocity profile: ", x_vel_prof)
-            ny: np.ndarray = self.y[0] / self.high_bounds[1]
-            nz: np.ndarray = self.z[0] / self.high_bounds[2]
-            self.x_vel: np.ndarray = self.x_vel_func(ny, nz) * self.avg_vel
-            print("Max eddy center x-velocity: ", np.max(self.x_vel))
-            print("Min eddy center x-velocity: ", np.min(self.x_vel))
-        # if avg_vel is not zero and not velocity profile defined (constant avg_vel across entire field),
-        # wrap around in x will have random y and z to avoid periodicity
-        else:
-            self.set_rand_eddy_yz(1)
-            self.set_rand_eddy_yz(2)
+        # Keyed apart from the streams spawned by `generate`, negative flow iterations wrapped to non-negative keys
+        rng = np.random.default_rng(np.random.SeedSequence(self.get_seed(), spawn_key=(2, fi % 2**64, b)))
+        size = min(STREAM_SIZE, int(self.N) - b * STREAM_SIZE)
+        block = rng.uniform(self.low_bounds[1:, None], self.high_bounds[1:, None], (2, size))
 
-        self.alpha = utils.random_unit_vectors(self.N) * np.repeat(
-            self.variant_intensity, self.variant_quantity
-        ).reshape(-1, 1)
+        with YZ_LOCK:
+            cache[(fi, b)] = block
+            while len(cache) > 1 and sum(a.nbytes for a in cache.values()) > YZ_CACHE_SIZE * 2**20:
+                cache.popitem(last=False)
+        return block
 
-        # self.save()
+    def get_seed(self):
+        """
+        Get the seed of the field. Fields pickled before seeds were stored get one drawn for this process only,
+        stored by `convert`, see `seed_stored`.
+        """
+        if getattr(self, "seed", None) is not None:
+            return self.seed
+        with YZ_LOCK:
+            if getattr(self, "drawn_seed", None) is None:
+                self.drawn_seed = np.random.SeedSequence().entropy
+            return self.drawn_seed
 
-        self.print("Total eddies: ", self.N)
+    def seed_stored(self):
+        """Check if the seed of the field is kept with it, so derived flow iterations are the same in every process."""
+        return getattr(self, "seed", None) is not None
+
+    def derived_iterations(self, times: list):
+        """Check if the eddies at any of the times are in flow iterations not stored, see `get_eddy_yz`."""
+        if hasattr(self, "x_vel"):
+            return False
+        return any(self.get_iter(t) + i not in self.y for t in times for i in WRAP_ITER)
 
-    def get_eddy_centers(self, fi: int):
-        """Get the x, y, and z coordinates of the eddies in a flow iteration."""
-        if fi not in self.y:
-            self.set_rand_eddy_yz(fi)
-        return np.stack((self.init_x, self.y[fi], self.z[fi]), axis=-1)
+    def get_sigma(self, part: slice = slice(None)):
+        """Get the length scales of a range of eddies, without expanding those of a loaded field."""
+        if "sigma" in self.__dict__:
+            return self.sigma[part]
+        return self.sigma_values[self.sigma_index[part]]
+
+    def length_scales(self):
+        """Get the distinct length scales of the eddies."""
+        if "sigma" in self.__dict__:
+            return np.unique(self.sigma)
+        return self.sigma_values
 
     def get_eddy_center_x_vel(self, t):
         """Get the x, y, and z coordinates of the eddies when x_vel of each eddy is defined."""
@@ -154,9 +258,10 @@ class FlowField:
         return np.stack((x, self.y[0], self.z[0]), axis=-1)
 
     def set_rand_eddy_yz(self, fi: int):
-        """Set random y and z coordinates for eddies in a new flow iteration."""
-        self.y[fi] = np.random.uniform(self.low_bounds[1], self.high_bounds[1], self.N)
-        self.z[fi] = np.random.uniform(self.low_bounds[2], self.high_bounds[2], self.N)
+        """Set random y and z coordinates for eddies in a new flow iteration, stored with the field."""
+        y, z = self.get_eddy_yz(fi)
+        self.y[fi] = y.copy()
+        self.z[fi] = z.copy()
 
     def set_avg_vel(self, avg_vel: float):
         """Set the average velocity of the flow field."""
@@ -165,17 +270,318 @@ class FlowField:
         self.avg_vel = avg_vel
 
     def save(self):
-        """Save the flow field to a file."""
-        file_io.write("fields", self.name, self, "obj")
+        """
+        Save the flow field to a directory in `fields`, with its metadata in `field.json`
+        and each per-eddy array in its own `.npy` file, to be memory-mapped by `load`.
+
+        Length scales are stored as the index of each eddy into the distinct length scales,
+        and flow iterations sharing the same eddy positions (zero average velocity) are stored once.
+        Without a mean velocity profile, the eddies are sorted by brick (see `sort_bricks`), those of fields
+        created before or with eddies replaced since are sorted in a copy, the field itself keeps its eddy order.
+        """
+        directory = os.path.join("fields", self.name)
+        field = self
+        if not hasattr(self, "x_vel") and self.get_bricks() is None:
+            field = copy.copy(self)
+            field.y, field.z = dict(self.y), dict(self.z)
+            field.sort_bricks()
+        length_scales, variant = np.unique(field.sigma, return_inverse=True)
+        arrays = {
+            "init_x": field.init_x,
+            "alpha": field.alpha,
+            "variant": variant.astype(np.min_scalar_type(max(len(length_scales) - 1, 0))),
+        }
+        if hasattr(field, "x_vel"):
+            arrays["x_vel"] = field.x_vel
+        else:
+            arrays["bricks"] = field.bricks["offsets"]
+
+        iterations = {}
+        stored = {}
+        for fi in sorted(field.y):
+            key = (id(field.y[fi]), id(field.z[fi]))
+            if key not in stored:
+                stored[key] = fi
+                arrays[f"y_{fi}"] = field.y[fi]
+                arrays[f"z_{fi}"] = field.z[fi]
+            iterations[str(fi)] = stored[key]
+
+        for name, array in arrays.items():
+            file_io.write(directory, name, np.asarray(array), "npy")
+        # Metadata last, a field is only loaded once all its arrays are written
+        field.write_meta(directory, length_scales, iterations)
+
+    def write_meta(self, directory: str, length_scales: np.ndarray, iterations: dict):
+        """Write the metadata of a field directory, see `save`."""
+        file_io.write(directory, "field", {
+            "format": FIELD_FORMAT,
+            "name": self.name,
+            "dimensions": self.dimensions.tolist(),
+            "avg_vel": float(self.avg_vel),
+            "N": int(self.N),
+            "profile": {
+                "name": self.profile.name,
+                "settings": self.profile.settings,
+                "variants": self.profile.variants,
+            },
+            "variant_quantity": np.asarray(self.variant_quantity).tolist(),
+            "length_scales": length_scales.tolist(),
+            "x_vel_prof": self.x_vel_func.__name__ if hasattr(self, "x_vel_func") else "",
+            "iterations": iterations,
+            "seed": self.get_seed(),
+            "fingerprint": self.get_digest(),
+        }, "json", indent=4)
+
+    def sort_bricks(self, size: float = BRICK_SIZE):
+        """
+        Sort the eddies by brick, slabs of the field along x of about `size`, and index where each brick starts.
+
+        Without a mean velocity profile, all eddies of a flow iteration move along x together,
+        so only the bricks (and their periodic images) within reach of a region hold eddies around it,
+        and only those are read from a loaded field, see `get_wrap_arounds`.
+        """
+        count = max(1, int(np.ceil(self.dimensions[0] / size)))
+        cells = ((self.init_x - self.low_bounds[0]) / self.dimensions[0] * count).astype(int)
+        cells = np.clip(cells, 0, count - 1)
+        if np.any(np.diff(cells) < 0):
+            order = np.argsort(cells, kind="stable")
+            cells = cells[order]
+            self.init_x = self.init_x[order]
+            self.alpha = self.alpha[order]
+            self.sigma = self.sigma[order]
+            # Flow iterations sharing the same arrays keep sharing them
+            sorted_arrays = {}
+            for coords in (self.y, self.z):
+                for fi, array in coords.items():
+                    coords[fi] = sorted_arrays.setdefault(id(array), array[order])
+            self.digest = None
+        self.bricks = {
+            "offsets": np.searchsorted(cells, np.arange(count + 1)),
+            "max_sigma": float(np.max(self.sigma, initial=0)),
+            "arrays": (self.init_x, self.sigma),
+        }
+
+    def get_bricks(self):
+        """
+        Get the brick index of the eddies (see `sort_bricks`), None if the field is not sorted by brick
+        or its eddies were replaced since the index was built.
+        """
+        bricks = getattr(self, "bricks", None)
+        if bricks is None or bricks["offsets"][-1] != len(self.init_x):
+            return None
+        # Arrays of a field created in memory may be replaced, those of a loaded field are read-only
+        if "arrays" in bricks and (bricks["arrays"][0] is not self.init_x or bricks["arrays"][1] is not self.sigma):
+            return None
+        return bricks
+
+    def brick_slice(self, low: float, high: float):
+        """
+        Get the range of eddies in the bricks with initial x coordinates from `low` to `high` (plus margins),
+        all eddies if the field is not sorted by brick.
+        """
+        bricks = self.get_bricks()
+        if bricks is None:
+            return slice(None)
+        offsets = bricks["offsets"]
+        count = len(offsets) - 1
+        margin = bricks["max_sigma"] * CUTOFF
+        cells = (np.array([low - margin, high + margin]) - self.low_bounds[0]) / self.dimensions[0] * count
+        first = int(np.clip(np.floor(cells[0]), 0, count))
+        last = int(np.clip(np.floor(cells[1]) + 1, first, count))
+        return slice(int(offsets[first]), int(offsets[last]))
+
+    @classmethod
+    def generate(
+        cls,
+        profile: EddyProfile,
+        name: str,
+        dimensions: np.ndarray | list,
+        avg_vel: float | int = 0,
+        x_vel_prof: str = "",
+        block_size: int = GENERATE_BLOCK_SIZE,
+        seed: int = None,
+        workers: int = None,
+    ):
+        """
+        Generate a new flow field straight into its directory in `fields` (see `save`), a block of eddies at a time,
+        so fields with more eddies than fit in memory can be created. Takes the same settings as `__init__`,
+        and gives the same field for a seed.
+
+        The eddies are generated brick by brick, see `sort_bricks` and `init_layout`.
+        Each `STREAM_SIZE` eddies are drawn from their own random stream spawned from the seed,
+        so blocks are generated in parallel and the field is the same for a seed whatever the workers and block size.
+
+        Parameters
+        ----------
+        block_size : int, optional
+            Number of eddies generated and written at once by each worker, by default `GENERATE_BLOCK_SIZE`.
+            Rounded down to whole random streams.
+        seed : int, optional
+            Seed of the field, by default a random one.
+        workers : int, optional
+            Number of worker threads, by default the number of CPUs.
+
+        Returns
+        -------
+        FlowField
+            The new field, loaded from its directory.
+        """
+        field = cls.__new__(cls)
+        field.init_settings(profile, name, dimensions, avg_vel, seed)
+        if not isinstance(block_size, int) or block_size <= 0:
+            raise ValueError("Block size must be a positive integer")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("Number of workers must be a positive integer")
+        if avg_vel != 0 and x_vel_prof != "":
+            field.x_vel_func = x_velocity.get_func(x_vel_prof)
+
+        layout = field.init_layout()
+        n = int(field.N)
+        length_scales = layout["length_scales"]
+        iterations = layout["iterations"]
+
+        # Written to a temporary directory first, so memory maps of a previous field stay valid
+        directory = os.path.join("fields", f".{field.name}.{os.getpid()}.tmp")
+        try:
+            field.init_x = file_io.open_memmap(directory, "init_x", (n,))
+            field.alpha = file_io.open_memmap(directory, "alpha", (n, 3))
+            field.sigma_values = length_scales
+            field.sigma_index = file_io.open_memmap(
+                directory, "variant", (n,), np.min_scalar_type(max(len(length_scales) - 1, 0))
+            )
+            field.y = {}
+            field.z = {}
+            for fi, stored in iterations.items():
+                if stored not in field.y:
+                    field.y[stored] = file_io.open_memmap(directory, f"y_{stored}", (n,))
+                    field.z[stored] = file_io.open_memmap(directory, f"z_{stored}", (n,))
+                field.y[int(fi)] = field.y[stored]
+                field.z[int(fi)] = field.z[stored]
+            if hasattr(field, "x_vel_func"):
+                field.x_vel = file_io.open_memmap(directory, "x_vel", (n,))
+            else:
+                file_io.write(directory, "bricks", layout["offsets"], "npy")
+
+            # Blocks of whole streams, filled by the workers straight into the memory maps
+            step = max(1, block_size // STREAM_SIZE) * STREAM_SIZE
+            if cls.verbose:
+                pbar = tqdm(total=n, desc="Eddies")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(field.generate_block, start, min(start + step, n), layout)
+                    for start in range(0, n, step)
+                ]
+                for future in futures:
+                    size = future.result()
+                    if cls.verbose:
+                        pbar.update(size)
+            if cls.verbose:
+                pbar.close()
+
+            for array in [field.init_x, field.alpha, field.sigma_index, *field.y.values(), *field.z.values()]:
+                array.flush()
+            if hasattr(field, "x_vel"):
+                field.x_vel.flush()
+            field.write_meta(directory, length_scales, iterations)
+        except BaseException:
+            # Leave no partly generated field behind
+            shutil.rmtree(os.path.join(file_io.DIR, directory), ignore_errors=True)
+            raise
+
+        # Replace a previous field of the same name
+        path = os.path.join(file_io.DIR, "fields", field.name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(os.path.join(file_io.DIR, directory), path)
+        cls.print("Total eddies: ", field.N)
+        return cls.load(field.name)
+
+    def init_layout(self):
+        """
+        Set the number of eddies of a new field and get their layout for `generate_block`:
+        runs of eddies of the same brick and variant in the order they are stored, where each brick starts,
+        the flow iterations stored and the random stream of each `STREAM_SIZE` eddies.
+
+        The eddies of each variant are spread over the bricks at random, as if their x coordinates were drawn
+        over the whole field.
+        """
+        count = max(1, int(np.ceil(self.dimensions[0] / BRICK_SIZE)))
+        num_variants = len(self.variant_density)
+        # Random streams of the counts and of each block of eddies, see `get_yz_block` for the flow iterations
+        counts_seq, eddies_seq = np.random.SeedSequence(self.seed).spawn(2)
+        rng = np.random.default_rng(counts_seq)
+        self.variant_quantity = utils.stoch_round(self.variant_density * np.prod(self.dimensions), rng)
+        quantity = rng.multinomial(self.variant_quantity, np.full(count, 1 / count)).reshape(-1, count).T
+        self.N = np.int64(quantity.sum())
+        run_ends = np.cumsum(quantity.ravel())
+
+        # One flow iteration with a mean velocity profile, and the same eddy positions in all of them at zero velocity
+        if self.avg_vel == 0:
+            iterations = {"0": 0, "1": 0, "2": 0}
+        elif hasattr(self, "x_vel_func"):
+            iterations = {"0": 0}
+        else:
+            iterations = {"0": 0, "1": 1, "2": 2}
+
+        return {
+            "run_ends": run_ends,
+            "run_starts": run_ends - quantity.ravel(),
+            "run_brick": np.repeat(np.arange(count), num_variants),
+            "run_variant": np.tile(np.arange(num_variants), count),
+            "width": self.dimensions[0] / count,
+            "length_scales": np.unique(self.variant_length_scale[self.variant_quantity > 0]),
+            "offsets": np.concatenate(([0], run_ends[num_variants - 1 :: num_variants])),
+            "iterations": iterations,
+            "stored": sorted(set(iterations.values())),
+            "streams": eddies_seq.spawn(-(-int(self.N) // STREAM_SIZE)),
+        }
+
+    def generate_block(self, start: int, stop: int, layout: dict):
+        """
+        Generate the eddies from `start` to `stop` of a new field, see `init_layout`.
+        Each `STREAM_SIZE` eddies are drawn from their own stream, in the same order whatever the block.
+        Returns the number of eddies generated.
+        """
+        for s in range(start // STREAM_SIZE, -(-stop // STREAM_SIZE)):
+            first = s * STREAM_SIZE
+            last = min(first + STREAM_SIZE, stop)
+            rng = np.random.default_rng(layout["streams"][s])
+            # Runs of eddies of the same brick and variant in the stream
+            runs = slice(*np.searchsorted(layout["run_ends"], [first, last - 1], side="right") + [0, 1])
+            lengths = np.minimum(layout["run_ends"][runs], last) - np.maximum(layout["run_starts"][runs], first)
+            brick = np.repeat(layout["run_brick"][runs], lengths)
+            variant = np.repeat(layout["run_variant"][runs], lengths)
+
+            low_x = self.low_bounds[0] + brick * layout["width"]
+            self.init_x[first:last] = rng.uniform(low_x, low_x + layout["width"])
+            self.sigma_index[first:last] = np.searchsorted(layout["length_scales"], self.variant_length_scale[variant])
+            for fi in layout["stored"]:
+                self.y[fi][first:last] = rng.uniform(self.low_bounds[1], self.high_bounds[1], last - first)
+                self.z[fi][first:last] = rng.uniform(self.low_bounds[2], self.high_bounds[2], last - first)
+            if hasattr(self, "x_vel_func"):
+                ny = self.y[0][first:last] / self.high_bounds[1]
+                nz = self.z[0][first:last] / self.high_bounds[2]
+                self.x_vel[first:last] = self.x_vel_func(ny, nz) * self.avg_vel
+            intensity = self.variant_intensity[variant].reshape(-1, 1)
+            self.alpha[first:last] = utils.random_unit_vectors(last - first, rng) * intensity
+        return stop - start
 
     def sum_vel_mesh(
         self,
         low_bounds: np.ndarray | list = None,
         high_bounds: np.ndarray | list = None,
         step_size: float = 0.2,
-        chunk_size: int = 5,
+        chunk_size: int | str = 5,
         time: float = 0,
         threads: int = 1,
+        kernel: str = "chunk",
+        backend: str = "thread",
+        out_file: str = None,
+        memory_limit: float = MEMORY_LIMIT,
+        axes: dict = None,
+        tag: str = "",
     ):
         """
         Calculate the velocity field for a meshgrid.
@@ -188,17 +594,257 @@ class FlowField:
             Upper bounds of the meshgrid, by default high bounds of the whole field
         `step_size` : float, optional
             Step size of the meshgrid, by default 0.2
-        `chunk_size` : int, optional
-            Size of chunks to split the meshgrid into, by default 5
+        `chunk_size` : int or str, optional
+            Size of chunks to split the meshgrid into, by default 5.
+            Use "auto" to choose the largest chunks along each axis that fit in `memory_limit`
         `t` : float, optional
             Time passed, by default 0
         `threads` : int, optional
-            Number of threads to use, by default 1
+            Number of threads (or processes, see `backend`) to use, by default 1
+        `kernel` : str, optional
+            Kernel used to sum eddy contributions, by default "chunk"
+            - "chunk": evaluate every eddy on every point of each chunk
+            - "splat": evaluate each eddy only on the grid points within its margin (x-slabs only)
+            - "separable": factor the gaussian shape function per axis (gaussian only)
+        `backend` : str, optional
+            Execution backend when `threads` is not 1, by default "thread"
+            - "thread": x-slabs are computed by a pool of threads
+            - "process": x-slabs are computed by a pool of processes, with eddies shared in memory
+        `out_file` : str, optional
+            Name of a `.npy` file in `results` to create as a memory map and fill slab by slab,
+            instead of holding the velocity field in memory, by default None
+        `memory_limit` : float, optional
+            Memory budget of each kernel call in MB, used when `chunk_size` is "auto", by default `MEMORY_LIMIT`
+        `axes` : dict, optional
+            Non-uniform coordinates of some axes by name ("x", "y", "z"), see `mesh_coords`.
+            Other axes are evenly spaced by `step_size`, by default None
+        `tag` : str, optional
+            Appended to the name of the chunk information file in `.cache`, by default "".
+            Without a tag `.cache` is cleared first, concurrent meshgrids each use their own tag
+            and leave clearing to the caller
 
         Returns
         -------
         `vel`: np.ndarray
-            Velocity field for the meshgrid. This will only return if `threads` is 1.
+            Velocity field for the meshgrid, a `np.memmap` of the file if `out_file` is set.
+        """
+        if not utils.is_not_negative(time):
+            raise ValueError("Time must be non-negative number, by default 0.0")
+
+        plan = self.plan_mesh(
+            low_bounds, high_bounds, step_size, chunk_size, threads, kernel, backend, memory_limit, axes, tag
+        )
+        vel = self.alloc_vel(plan["shape"], out_file)
+
+        if self.verbose:
+            pbar = tqdm(total=np.prod(plan["shape"][:3]) * plan["num_variants"], desc="Grid points")
+        self.sum_vel_frame(plan, time, vel, progress=pbar.update if self.verbose else None)
+        if self.verbose:
+            pbar.close()
+
+        if out_file is not None:
+            vel.flush()
+        return vel
+
+    def sum_vel_mesh_series(
+        self,
+        times: np.ndarray | list,
+        low_bounds: np.ndarray | list = None,
+        high_bounds: np.ndarray | list = None,
+        step_size: float = 0.2,
+        chunk_size: int | str = 5,
+        threads: int = 1,
+        kernel: str = "chunk",
+        backend: str = "thread",
+        out_file: str = None,
+        memory_limit: float = MEMORY_LIMIT,
+        reuse: bool = True,
+        axes: dict = None,
+        tag: str = "",
+    ):
+        """
+        Calculate the velocity field for a meshgrid at a series of times.
+
+        The meshgrid is set up once (validation, coordinates, mean velocity profile and chunks of each
+        eddy variant) and reused by every time step, only the eddies are culled and indexed again.
+        See `sum_vel_mesh` for the other parameters.
+
+        Without a mean velocity profile, the eddies only move along x at `avg_vel` (frozen turbulence),
+        so the field of a time step is the field of the previous one moved downstream. If the distance
+        moved between consecutive times is a multiple of the x step, the previous field is shifted along x
+        and only the newly exposed slab upstream is calculated (see `can_shift`).
+        This needs evenly spaced x coordinates.
+
+        Parameters
+        ----------
+        `times` : np.ndarray or list
+            Times to calculate, in any order, shifting only applies to consecutive increasing times
+        `out_file` : str, optional
+            Name of a `.npy` file in `results` to create as a memory map and fill time step by time step,
+            instead of holding all velocity fields in memory, by default None
+        `reuse` : bool, optional
+            Shift the previous time step when possible instead of calculating the whole field, by default True
+
+        Returns
+        -------
+        `vel`: np.ndarray
+            Velocity fields stacked by time step, shape `(len(times), Nx, Ny, Nz, 3)`,
+            a `np.memmap` of the file if `out_file` is set.
+        """
+        try:
+            times = np.asarray(times, dtype=float)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Times must be numbers: {e}") from e
+
+        if times.ndim != 1 or len(times) == 0 or np.any(times < 0):
+            raise ValueError("Times must be a non-empty list of non-negative numbers")
+
+        plan = self.plan_mesh(
+            low_bounds, high_bounds, step_size, chunk_size, threads, kernel, backend, memory_limit, axes, tag
+        )
+        vel = self.alloc_vel((len(times), *plan["shape"]), out_file)
+
+        nx = plan["shape"][0]
+        reuse = reuse and self.can_shift() and plan["x_step"] is not None
+
+        if self.verbose:
+            pbar = tqdm(total=len(times), desc="Time steps")
+        for frame, time in enumerate(times):
+            # Number of grid steps the eddies moved since the previous time step, if a whole number
+            shift = None
+            if reuse and frame > 0:
+                steps = self.avg_vel * (time - times[frame - 1]) / plan["x_step"]
+                if abs(steps - round(steps)) < SHIFT_TOLERANCE and 0 <= round(steps) < nx:
+                    shift = int(round(steps))
+
+            if shift is None:
+                self.sum_vel_frame(plan, float(time), vel, frame)
+            else:
+                vel[frame, shift:] = vel[frame - 1, : nx - shift]
+                if shift > 0:
+                    self.sum_vel_frame(plan, float(time), vel, frame, x_range=(0, shift))
+            if self.verbose:
+                pbar.update(1)
+        if self.verbose:
+            pbar.close()
+
+        if out_file is not None:
+            vel.flush()
+        return vel
+
+    def can_shift(self):
+        """
+        Check if the field at a later time is the field at an earlier time moved downstream by `avg_vel * dt`.
+
+        This holds without a mean velocity profile, as long as the eddies of the flow iterations
+        dropped and added by `get_iter` are always out of reach of the field (margins up to half the x dimension).
+        """
+        max_margin = np.max(self.length_scales(), initial=0) * CUTOFF
+        return not hasattr(self, "x_vel_func") and max_margin <= self.dimensions[0] / 2
+
+    def plan_mesh(
+        self,
+        low_bounds: np.ndarray | list,
+        high_bounds: np.ndarray | list,
+        step_size: float,
+        chunk_size: int | str,
+        threads: int,
+        kernel: str,
+        backend: str,
+        memory_limit: float,
+        axes: dict = None,
+        tag: str = "",
+    ):
+        """
+        Validate the parameters of a meshgrid and set up everything that does not depend on time.
+        See `sum_vel_mesh` for the parameters.
+
+        Returns
+        -------
+        dict
+            Meshgrid plan for `sum_vel_frame`. Chunks of each eddy variant are added to `chunks`
+            (by length scale) the first time the variant is computed, and culled eddies to `yz_cache`
+            (see `get_wrap_arounds`).
+        """
+        low_bounds, high_bounds = self.check_bounds(low_bounds, high_bounds, step_size)
+
+        if chunk_size != "auto" and not utils.is_not_negative(chunk_size):
+            raise ValueError(
+                "Chunk size not be negative. Use zero for no chunking (Potentially SLOW and HIGH memory usage!!!)"
+            )
+
+        if not utils.is_positive(memory_limit):
+            raise ValueError("Memory limit must be a positive number (MB)")
+
+        if kernel not in eddy.KERNELS:
+            raise ValueError(f"Kernel must be one of {eddy.KERNELS}")
+
+        if kernel == "separable" and shape_function.active is not shape_function.gaussian:
+            raise ValueError("Separable kernel only supports the gaussian shape function")
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend must be one of {BACKENDS}")
+
+        # Generate arrays of x, y, and z coordinates, the bounds are those of non-uniform axes
+        x_coords, y_coords, z_coords = self.mesh_coords(low_bounds, high_bounds, step_size, axes)
+        low_bounds = np.array([x_coords[0], y_coords[0], z_coords[0]])
+        high_bounds = np.array([x_coords[-1], y_coords[-1], z_coords[-1]])
+
+        # Step of evenly spaced x coordinates, to shift time steps
+        x_steps = np.diff(x_coords)
+        if axes is None or "x" not in axes:
+            x_step = step_size
+        elif len(x_steps) > 0 and np.allclose(x_steps, x_steps[0], rtol=SHIFT_TOLERANCE, atol=0):
+            x_step = float(x_steps[0])
+        else:
+            x_step = None
+
+        # Initialize the x-velocity profile cross-section if needed
+        if hasattr(self, "x_vel_func"):
+            # Generate a plane of y and z coordinates
+            ny_coords = y_coords / self.high_bounds[1]
+            nz_coords = z_coords / self.high_bounds[2]
+            nynz = np.stack(
+                np.meshgrid(ny_coords, nz_coords, indexing="ij"), axis=-1
+            )[np.newaxis, ...]
+            ny = nynz[..., 0]
+            nz = nynz[..., 1]
+            # Calculate the x-velocity profile for each point on the plane
+            x_vel_plane = self.x_vel_func(ny, nz) * self.avg_vel
+            print("Max mean x-velocity: ", np.max(x_vel_plane))
+            print("Min mean x-velocity: ", np.min(x_vel_plane))
+        else:
+            x_vel_plane = None
+
+        # Clear previous chunk cache, unless other meshgrids may be running
+        if not tag:
+            file_io.clear(CACHE_DIR)
+
+        self.print("Threads: ", threads)
+        return {
+            "low_bounds": low_bounds,
+            "high_bounds": high_bounds,
+            "step_size": step_size,
+            "x_step": x_step,
+            "spacing": np.array([np.max(np.diff(c), initial=step_size) for c in (x_coords, y_coords, z_coords)]),
+            "chunk_size": chunk_size,
+            "memory_limit": memory_limit,
+            "threads": threads,
+            "kernel": kernel,
+            "backend": backend,
+            "coords": (x_coords, y_coords, z_coords),
+            "shape": (len(x_coords), len(y_coords), len(z_coords), 3),
+            "x_vel_plane": x_vel_plane,
+            "num_variants": len(self.length_scales()),
+            "chunks": {},
+            "yz_cache": {},
+            "info": f"__info__{tag}",
+        }
+
+    def check_bounds(self, low_bounds, high_bounds, step_size: float):
+        """
+        Validate the bounds and step size of a meshgrid, by default the whole field.
+        Returns the low and high bounds as numpy arrays.
         """
         if low_bounds is None:
             low_bounds = self.low_bounds
@@ -225,158 +871,626 @@ class FlowField:
         if not utils.is_positive(step_size):
             raise ValueError("Step size must be a positive number")
 
-        if not utils.is_not_negative(chunk_size):
-            raise ValueError(
-                "Chunk size not be negative. Use zero for no chunking (Potentially SLOW and HIGH memory usage!!!)"
-            )
+        return low_bounds, high_bounds
+
+    def sum_vel_section(
+        self,
+        low_bounds: np.ndarray | list,
+        high_bounds: np.ndarray | list,
+        step_size: float = 0.2,
+        time: float = 0,
+    ):
+        """
+        Calculate the velocity field on a plane or a line,
+        a meshgrid with equal low and high bounds along one or two axes.
+
+        Instead of chunks, each eddy is only evaluated on the grid points within its margin,
+        culled by its distance to the plane or line (see `eddy.sum_vel_section`).
 
+        Parameters
+        ----------
+        `low_bounds` : np.ndarray or list
+            Lower bounds of the meshgrid
+        `high_bounds` : np.ndarray or list
+            Upper bounds of the meshgrid
+        `step_size` : float, optional
+            Step size of the meshgrid, by default 0.2
+        `time` : float, optional
+            Time passed, by default 0
+
+        Returns
+        -------
+        `vel`: np.ndarray
+            Velocity field for the meshgrid, shape `(Nx, Ny, Nz, 3)` as `sum_vel_mesh`.
+        """
+        low_bounds, high_bounds = self.check_bounds(low_bounds, high_bounds, step_size)
+        if not np.any(low_bounds == high_bounds):
+            raise ValueError("A plane or line must have equal low and high bounds along at least one axis")
         if not utils.is_not_negative(time):
             raise ValueError("Time must be non-negative number, by default 0.0")
 
-        # Generate arrays of x, y, and z coordinates
-        x_coords = self.step_coords(low_bounds[0], high_bounds[0], step_size)
-        y_coords = self.step_coords(low_bounds[1], high_bounds[1], step_size)
-        z_coords = self.step_coords(low_bounds[2], high_bounds[2], step_size)
+        coords = [self.step_coords(low_bounds[a], high_bounds[a], step_size) for a in range(3)]
+        shape = tuple(len(c) for c in coords)
 
-        # Check the handling of multiple threads
-        if threads == 1:
-            do_return = True
-            do_cache = False
+        # Mean velocity, constant along x
+        vel = np.zeros((*shape, 3))
+        if hasattr(self, "x_vel_func"):
+            ny, nz = np.meshgrid(coords[1] / self.high_bounds[1], coords[2] / self.high_bounds[2], indexing="ij")
+            vel[..., 0] = self.x_vel_func(ny, nz) * self.avg_vel
         else:
-            do_return = False
-            do_cache = True
+            vel[..., 0] = self.avg_vel
 
-        # Initialize the velocity field if a return is needed
-        if do_return:
-            try:
-                vel = np.zeros((len(x_coords), len(y_coords), len(z_coords), 3))
-            except MemoryError as e:  # pragma: no cover
-                raise MemoryError(
-                    f"{e}\nNot enough memory to allocate velocity field. "
-                    "Consider using a larger step size or focus on a smaller region."
-                ) from e
-            if not hasattr(self, "x_vel_func"):
-                vel[..., 0] = self.avg_vel
+        # Eddies around the grid points, a variant at a time
+        culling = ([c[-1] for c in coords], [c[0] for c in coords])
+        centers, alpha, sigma = self.get_wrap_arounds(time, *[np.array(b) for b in culling])
+        order = np.argsort(sigma, kind="stable")
+        centers, alpha, sigma = centers[order], alpha[order], sigma[order]
+        for start, stop in self.variant_ranges(sigma):
+            vel += eddy.sum_vel_section(
+                centers[start:stop], sigma[start], alpha[start:stop], sigma[start] * CUTOFF, *coords
+            )
+        return vel
+
+    def sum_vel_inflow(
+        self,
+        times: np.ndarray | list,
+        x: float = None,
+        low_bounds: np.ndarray | list = None,
+        high_bounds: np.ndarray | list = None,
+        step_size: float = 0.2,
+        axes: dict = None,
+        out_file: str = None,
+        memory_limit: float = MEMORY_LIMIT,
+    ):
+        """
+        Calculate the velocity on an inflow plane (y-z plane at a fixed x) for a series of times,
+        to feed into the inlet of a CFD simulation.
+
+        Without a mean velocity profile, the eddies of a flow iteration only move along x (frozen turbulence),
+        so the plane at time `t` sees the eddies at the time of the first frame in the same flow iteration,
+        at `x` moved upstream by the distance travelled in between. The frames of a flow iteration are
+        evaluated together as one grid of these x positions by the y-z plane, in blocks of frames
+        within `memory_limit`, with the eddies culled once per block (see `eddy.sum_vel_splat`).
+        With a mean velocity profile, eddies move at different velocities and the frames are evaluated one by one.
+
+        Parameters
+        ----------
+        `times` : np.ndarray or list
+            Times of the frames, in any order
+        `x` : float, optional
+            Position of the plane along x, by default the low x bound of the field
+        `low_bounds` : np.ndarray or list, optional
+            Lower bounds of the plane along y and z, by default those of the field
+        `high_bounds` : np.ndarray or list, optional
+            Upper bounds of the plane along y and z, by default those of the field
+        `step_size` : float, optional
+            Step size of the plane, by default 0.2
+        `axes` : dict, optional
+            Non-uniform coordinates of the y or z axis, see `mesh_coords`, by default None
+        `out_file` : str, optional
+            Name of a `.npy` file in `results` to create as a memory map and fill block by block,
+            with an index `.json` file of the same name describing the frames, by default None
+        `memory_limit` : float, optional
+            Memory budget of each block of frames in MB, by default `MEMORY_LIMIT`
+
+        Returns
+        -------
+        `vel`: np.ndarray
+            Velocity on the plane stacked by frame, shape `(len(times), Ny, Nz, 3)`,
+            a `np.memmap` of the file if `out_file` is set.
+        """
+        try:
+            times = np.asarray(times, dtype=float)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Times must be numbers: {e}") from e
+        if times.ndim != 1 or len(times) == 0 or np.any(times < 0):
+            raise ValueError("Times must be a non-empty list of non-negative numbers")
+
+        x = self.low_bounds[0] if x is None else x
+        if not isinstance(x, (int, float)):
+            raise ValueError("Plane position must be a number")
+        low_bounds = self.low_bounds[1:] if low_bounds is None else low_bounds
+        high_bounds = self.high_bounds[1:] if high_bounds is None else high_bounds
+        if not (np.shape(low_bounds) == (2,) and np.shape(high_bounds) == (2,)):
+            raise ValueError("Bounds of the plane must contain 2 elements (y, z) each")
+        if axes is not None and "x" in axes:
+            raise ValueError("The x axis of an inflow plane is fixed at its position")
+        if not utils.is_positive(memory_limit):
+            raise ValueError("Memory limit must be a positive number (MB)")
+        low_bounds, high_bounds = self.check_bounds(
+            np.array([x, *low_bounds], dtype=float), np.array([x, *high_bounds], dtype=float), step_size
+        )
+        _, y_coords, z_coords = self.mesh_coords(low_bounds, high_bounds, step_size, axes)
+        low_bounds[1:] = y_coords[0], z_coords[0]
+        high_bounds[1:] = y_coords[-1], z_coords[-1]
 
-        # Initialize the x-velocity profile cross-section if needed
         if hasattr(self, "x_vel_func"):
-            # Generate a plane of y and z coordinates
-            ny_coords = y_coords / self.high_bounds[1]
-            nz_coords = z_coords / self.high_bounds[2]
-            nynz = np.stack(
-                np.meshgrid(ny_coords, nz_coords, indexing="ij"), axis=-1
-            )[np.newaxis, ...]
-            ny = nynz[..., 0]
-            nz = nynz[..., 1]
-            # Calculate the x-velocity profile for each point on the plane
-            x_vel_plane = self.x_vel_func(ny, nz) * self.avg_vel
-            print("Max mean x-velocity: ", np.max(x_vel_plane))
-            print("Min mean x-velocity: ", np.min(x_vel_plane))
+            # Eddies move at their own velocities, each frame is a block of its own
+            blocks = [(np.array([frame]), float(time)) for frame, time in enumerate(times)]
+            ny, nz = np.meshgrid(y_coords / self.high_bounds[1], z_coords / self.high_bounds[2], indexing="ij")
+            mean_vel = self.x_vel_func(ny, nz) * self.avg_vel
         else:
-            x_vel_plane = None
+            # Frames of each flow iteration, in blocks within the memory limit
+            block_size = max(1, int(memory_limit * 2**20 / (len(y_coords) * len(z_coords) * INFLOW_POINT_BYTES)))
+            iters = np.array([self.get_iter(time) for time in times])
+            blocks = []
+            for fi in np.unique(iters):
+                frames = np.flatnonzero(iters == fi)
+                ref = float(times[frames[0]])
+                blocks += [(frames[b : b + block_size], ref) for b in range(0, len(frames), block_size)]
+            mean_vel = self.avg_vel
 
-        # Divide the coordinates into chunks
-        if chunk_size == 0:     # pragma: no cover
-            chunk_size = np.max([len(x_coords), len(y_coords), len(z_coords)])
-            # chunk_size = 1
-        x_chunks = self.chunk_split(np.arange(len(x_coords)), chunk_size)
-        y_chunks = self.chunk_split(np.arange(len(y_coords)), chunk_size)
-        z_chunks = self.chunk_split(np.arange(len(z_coords)), chunk_size)
-
-        # Clear previous chunk cache
-        file_io.clear(CACHE_DIR)
-
-        # Get all eddies and their wrapped-around copies
-        centers, alpha, sigma = self.get_wrap_arounds(time, high_bounds, low_bounds)
-        self.print("Included eddies: ", centers.shape[0])
-        # Save chunk information for future loading
-        chunk_info = {
-            "low_bounds": low_bounds.tolist(),
-            "high_bounds": high_bounds.tolist(),
-            "step_size": step_size,
-            "indices": {
-                "x": [[int(part[0]), int(part[-1])] for part in x_chunks],
-                "y": [[int(part[0]), int(part[-1])] for part in y_chunks],
-                "z": [[int(part[0]), int(part[-1])] for part in z_chunks],
-            },
-        }
+        vel = self.alloc_vel((len(times), len(y_coords), len(z_coords), 3), out_file)
+        if self.verbose:
+            pbar = tqdm(total=len(times), desc="Frames")
+        for block, ref in blocks:
+            # Positions of the plane relative to the eddies at the reference time, in increasing order
+            rel_x = x - np.array([self.get_offset(time) for time in times[block]]) + self.get_offset(ref)
+            order = np.argsort(rel_x, kind="stable")
+            coords = (rel_x[order], y_coords, z_coords)
 
-        file_io.write(CACHE_DIR, "__info__", chunk_info, "json")
+            culling = np.array([c[-1] for c in coords]), np.array([c[0] for c in coords])
+            centers, alpha, sigma = self.get_wrap_arounds(ref, *culling)
+            block_vel = eddy.sum_vel_splat(centers, sigma, alpha, sigma * CUTOFF, *coords)
+            block_vel[..., 0] += mean_vel
+            vel[block[order]] = block_vel
+            if self.verbose:
+                pbar.update(len(block))
+        if self.verbose:
+            pbar.close()
 
-        # Function to compute chunks looping through Y and Z for parallel processing of X
-        def calc_x_chunks(i, xc):
-            vel_i = np.zeros((len(xc), len(y_coords), len(z_coords), 3))
-            if x_vel_plane is None:
-                vel_i[..., 0] = self.avg_vel
-            mask = self.within_margin(
-                centers[:, 0], margins, x_coords[xc[0]], x_coords[xc[-1]]
-            )
-            centers_i = centers[mask]
-            sigma_i = sigma[mask]
-            alpha_i = alpha[mask]
-            margins_i = margins[mask]
-            for _, yc in enumerate(y_chunks):
-                mask = self.within_margin(
-                    centers_i[:, 1], margins_i, y_coords[yc[0]], y_coords[yc[-1]]
-                )
-                centers_j = centers_i[mask]
-                sigma_j = sigma_i[mask]
-                alpha_j = alpha_i[mask]
-                margins_j = margins_i[mask]
-                for _, zc in enumerate(z_chunks):
-                    mask = self.within_margin(
-                        centers_j[:, 2], margins_j, z_coords[zc[0]], z_coords[zc[-1]]
-                    )
-                    centers_k = centers_j[mask]
-                    sigma_k = sigma_j[mask]
-                    alpha_k = alpha_j[mask]
-                    vel_i[
-                        :,
-                        yc[0] : yc[-1] + 1,
-                        zc[0] : zc[-1] + 1,
-                        :,
-                    ] += eddy.sum_vel_chunk(
-                        centers_k,
-                        sigma_k,
-                        alpha_k,
-                        x_coords[xc],
-                        y_coords[yc],
-                        z_coords[zc],
+        if out_file is not None:
+            vel.flush()
+            file_io.write("results", out_file, {
+                "field": self.name,
+                "file": f"{out_file}.npy",
+                "shape": list(vel.shape),
+                "dtype": vel.dtype.str,
+                "x": float(x),
+                "times": times.tolist(),
+                "y_coords": y_coords.tolist(),
+                "z_coords": z_coords.tolist(),
+            })
+        return vel
+
+    def alloc_vel(self, shape: tuple, out_file: str = None):
+        """
+        Allocate a zero velocity array, or create it as a memory-mapped `.npy` file in `results` if `out_file` is set.
+        """
+        if out_file is not None:
+            return file_io.open_memmap("results", out_file, shape)
+        try:
+            return np.zeros(shape)
+        except MemoryError as e:  # pragma: no cover
+            raise MemoryError(
+                f"{e}\nNot enough memory to allocate velocity field. "
+                "Consider using a larger step size, focus on a smaller region, or use an output file."
+            ) from e
+
+    def sum_vel_frame(
+        self,
+        plan: dict,
+        time: float,
+        vel: np.ndarray,
+        frame: int = None,
+        progress=None,
+        x_range: tuple = None,
+    ):
+        """
+        Calculate the velocity field of a meshgrid at one time, in place.
+
+        Parameters
+        ----------
+        plan : dict
+            Meshgrid plan from `plan_mesh`.
+        time : float
+            Time passed.
+        vel : np.ndarray
+            Zero velocity array to compute into, of the shape of the meshgrid,
+            or stacked velocity fields if `frame` is set.
+        frame : int, optional
+            Index of the velocity field in `vel` to compute, by default None
+        progress : Callable, optional
+            Called with the number of grid points done after each chunk of each eddy variant.
+        x_range : tuple, optional
+            Range `[start, stop)` of x indices to calculate, by default the whole meshgrid
+        """
+        x_coords, y_coords, z_coords = plan["coords"]
+        low_bounds, high_bounds = plan["low_bounds"], plan["high_bounds"]
+        kernel = plan["kernel"]
+        threads = plan["threads"]
+        out = vel if frame is None else vel[frame]
+
+        # Only cull eddies around the x range
+        x0, x1 = (0, len(x_coords)) if x_range is None else x_range
+        if x_range is not None:
+            low_bounds = np.array([x_coords[x0], *low_bounds[1:]])
+            high_bounds = np.array([x_coords[x1 - 1], *high_bounds[1:]])
+
+        # Get all eddies and their wrapped-around copies, grouped by length scale
+        centers, alpha, sigma = self.get_wrap_arounds(time, high_bounds, low_bounds, plan["yz_cache"])
+        order = np.argsort(sigma, kind="stable")
+        centers, alpha, sigma = centers[order], alpha[order], sigma[order]
+        if not plan["chunks"]:
+            self.print("Included eddies: ", centers.shape[0])
+        new_chunks = False
+
+        # Each eddy variant (length scale) is a separate pass with a scalar length scale and margin,
+        # and chunks sized for that length scale
+        num_points = [len(x_coords), len(y_coords), len(z_coords)]
+        range_points = (x1 - x0) * len(y_coords) * len(z_coords)
+        variants = []
+        for start, stop in self.variant_ranges(sigma):
+            margin = sigma[start] * CUTOFF
+            if sigma[start] not in plan["chunks"]:
+                if plan["chunk_size"] == "auto":
+                    chunk_sizes = self.auto_chunk_size(
+                        np.full(stop - start, margin),
+                        num_points,
+                        plan["spacing"],
+                        plan["memory_limit"],
+                        kernel,
+                        plan["high_bounds"] - plan["low_bounds"],
                     )
-                    if self.verbose:
-                        pbar.update(1)
-            if x_vel_plane is not None:
-                vel_i[..., 0] += x_vel_plane
-            if do_return:
-                vel[xc[0] : xc[-1] + 1, :, :, :] = vel_i
-            if do_cache:
-                file_io.write(CACHE_DIR, f"x_{i}", vel_i, CACHE_FORMAT)
-
-        # Calculate the velocity field for each chunk, slicing by x, y, and z
-        margins = sigma * CUTOFF
-        self.print("Chunks [x, y, z]: ", [len(x_chunks), len(y_chunks), len(z_chunks)])
-        self.print("Threads: ", threads)
-        if self.verbose:
-            pbar = tqdm(total=len(x_coords) * len(y_coords) * len(z_coords), desc="Grid points")
-            plock = pbar.get_lock()
+                elif plan["chunk_size"] == 0:     # pragma: no cover
+                    chunk_sizes = [np.max(num_points)] * 3
+                else:
+                    chunk_sizes = [plan["chunk_size"]] * 3
+                plan["chunks"][sigma[start]] = (
+                    self.chunk_split(np.arange(len(x_coords)), chunk_sizes[0]),
+                    self.chunk_split(np.arange(len(y_coords)), chunk_sizes[1]),
+                    self.chunk_split(np.arange(len(z_coords)), chunk_sizes[2]),
+                )
+                new_chunks = True
+                self.print(
+                    f"Length scale {sigma[start]}: ",
+                    f"{stop - start} eddies, chunks [x, y, z] ",
+                    [len(c) for c in plan["chunks"][sigma[start]]],
+                )
+            x_chunks, y_chunks, z_chunks = plan["chunks"][sigma[start]]
+            if x_range is not None:
+                x_chunks = [c[(c >= x0) & (c < x1)] for c in x_chunks]
+                x_chunks = [c for c in x_chunks if len(c) > 0]
+
+            # Index eddies by chunk once, so each chunk fetches its eddies directly
+            index = cell_list.CellList(
+                centers[start:stop],
+                np.full(stop - start, margin),
+                [
+                    [[coords[c[0]], coords[c[-1]]] for c in chunks]
+                    for coords, chunks in [(x_coords, x_chunks), (y_coords, y_chunks), (z_coords, z_chunks)]
+                ],
+            )
+            variants.append(
+                {
+                    "sigma": float(sigma[start]),
+                    "margin": float(margin),
+                    "eddies": (start, stop),
+                    "index": index,
+                    "x_chunks": x_chunks,
+                    "y_chunks": y_chunks,
+                    "z_chunks": z_chunks,
+                }
+            )
+
+        if new_chunks:
+            # Save chunk information for future loading
+            chunk_info = {
+                "low_bounds": low_bounds.tolist(),
+                "high_bounds": high_bounds.tolist(),
+                "step_size": plan["step_size"],
+                "variants": [
+                    {
+                        "length_scale": float(length_scale),
+                        "indices": {
+                            axis: [[int(part[0]), int(part[-1])] for part in chunks]
+                            for axis, chunks in zip(["x", "y", "z"], plan["chunks"][length_scale])
+                        },
+                    }
+                    for length_scale in sorted(plan["chunks"])
+                ],
+            }
+            file_io.write(CACHE_DIR, plan["info"], chunk_info, "json")
+
+        # Function to compute chunks of a variant looping through Y and Z for parallel processing of X
+        def calc_x_chunks(var, i, xc):
+            # Slabs of a variant do not overlap, so each thread writes to its own view of the velocity field
+            start, stop = var["eddies"]
+            eddy.sum_vel_slab(
+                out[xc[0] : xc[-1] + 1],
+                i,
+                var["index"],
+                centers[start:stop],
+                var["sigma"],
+                alpha[start:stop],
+                var["margin"],
+                x_coords[xc],
+                y_coords,
+                z_coords,
+                var["y_chunks"],
+                var["z_chunks"],
+                kernel,
+                progress,
+            )
+
+        # Variants without any eddies around the meshgrid are done already
+        if progress is not None:
+            progress(range_points * (plan["num_variants"] - len(variants)))
 
+        if plan["x_vel_plane"] is None:
+            out[x0:x1, ..., 0] = self.avg_vel
+
+        # Calculate the velocity fluctuations variant by variant, slicing by x, y, and z
         if threads == 1:
-            for i, xc in enumerate(x_chunks):
-                calc_x_chunks(i, xc)
+            for var in variants:
+                for i, xc in enumerate(var["x_chunks"]):
+                    calc_x_chunks(var, i, xc)
+        elif plan["backend"] == "process":
+            parallel.run(
+                vel,
+                {"centers": centers, "alpha": alpha},
+                {
+                    "variants": variants,
+                    "x_coords": x_coords,
+                    "y_coords": y_coords,
+                    "z_coords": z_coords,
+                    "kernel": kernel,
+                },
+                threads,
+                progress,
+                frame,
+            )
         else:
             with ThreadPoolExecutor(max_workers=threads) as executor:
-                futures = [
-                    executor.submit(calc_x_chunks, i, xc)
-                    for i, xc in enumerate(x_chunks)
-                ]
-                for future in futures:
-                    future.result()
+                # Variants are computed one after another, as their slabs overlap
+                for var in variants:
+                    futures = [
+                        executor.submit(calc_x_chunks, var, i, xc)
+                        for i, xc in enumerate(var["x_chunks"])
+                    ]
+                    for future in futures:
+                        future.result()
+
+        if plan["x_vel_plane"] is not None:
+            out[x0:x1, ..., 0] += plan["x_vel_plane"]
+
+    def sum_vel_points(
+        self,
+        coords: np.ndarray | list,
+        time: float = 0,
+        batch_size: int = POINTS_BATCH_SIZE,
+        out_file: str = None,
+    ):
+        """
+        Calculate the velocity at scattered points.
+
+        Eddies are culled once for the bounding box of all points, and indexed by variant
+        for a neighbor search within the margin (see `neighbors.NeighborIndex`).
+        Only the eddy-point pairs within the margin of each other are evaluated, a batch of points at a time.
+        Apart from the eddies, memory use is bounded by the batch size if `coords` is a memory-mapped array
+        and `out_file` is set.
+
+        Parameters
+        ----------
+        `coords` : np.ndarray or list
+            Coordinates of the points, shape `(M, 3)`, may be a memory-mapped array (see `file_io.read_points`)
+        `time` : float, optional
+            Time passed, by default 0
+        `batch_size` : int, optional
+            Number of points evaluated together, by default `POINTS_BATCH_SIZE`
+        `out_file` : str, optional
+            Name of a `.npy` file in `results` to create as a memory map and fill batch by batch,
+            instead of holding the velocities in memory, by default None
+
+        Returns
+        -------
+        `vel`: np.ndarray
+            Velocity at each point, shape `(M, 3)`, in the order of `coords`.
+            A `np.memmap` of the file if `out_file` is set.
+        """
+        if isinstance(coords, np.ndarray) and np.issubdtype(coords.dtype, np.number):
+            points = coords
+        else:
+            try:
+                points = np.asarray(coords, dtype=float)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Coordinates must be numbers: {e}") from e
+
+        if points.ndim != 2 or points.shape[1] != 3 or len(points) == 0:
+            raise ValueError("Coordinates must be a list of 3D points (x, y, z)")
+
+        # Reductions instead of comparisons, so a memory-mapped array is scanned without temporary copies
+        low_bounds = np.min(points, axis=0).astype(float)
+        high_bounds = np.max(points, axis=0).astype(float)
+        if np.any(low_bounds < self.low_bounds) or np.any(high_bounds > self.high_bounds):
+            raise ValueError("Points must be within the flow field")
+
+        if not utils.is_not_negative(time):
+            raise ValueError("Time must be non-negative number, by default 0.0")
+
+        if not (isinstance(batch_size, int) and batch_size > 0):
+            raise ValueError("Batch size must be a positive integer")
+
+        if out_file is not None:
+            vel = file_io.open_memmap("results", out_file, (len(points), 3))
+        else:
+            vel = np.zeros((len(points), 3))
+
+        # Get all eddies around the points once, grouped by length scale,
+        # and index the eddies of each variant for a neighbor search within its margin
+        entry = self.get_prefetched(time, high_bounds, low_bounds)
+        if entry is not None and "variants" in entry:
+            centers, alpha, sigma, variants = entry["centers"], entry["alpha"], entry["sigma"], entry["variants"]
+        else:
+            centers, alpha, sigma = self.get_wrap_arounds(time, high_bounds, low_bounds)
+            order = np.argsort(sigma, kind="stable")
+            centers, alpha, sigma = centers[order], alpha[order], sigma[order]
+            variants = self.index_variants(centers, sigma)
+
+        if self.verbose:
+            pbar = tqdm(total=len(points), desc="Points")
+
+        # Evaluate only the eddy-point pairs within the margin, a batch of points at a time
+        for b in range(0, len(points), batch_size):
+            batch_points = np.asarray(points[b : b + batch_size], dtype=float)
+
+            # Mean velocity at each point
+            vel_batch = np.zeros((len(batch_points), 3))
+            if hasattr(self, "x_vel_func"):
+                ny = batch_points[:, 1] / self.high_bounds[1]
+                nz = batch_points[:, 2] / self.high_bounds[2]
+                vel_batch[:, 0] = self.x_vel_func(ny, nz) * self.avg_vel
+            else:
+                vel_batch[:, 0] = self.avg_vel
+
+            for start, stop, index in variants:
+                eddy_idx, point_idx = index.query(batch_points)
+                vel_batch += eddy.sum_vel_pairs(
+                    centers[start:stop],
+                    sigma[start],
+                    alpha[start:stop],
+                    batch_points,
+                    eddy_idx,
+                    point_idx,
+                )
+            vel[b : b + batch_size] = vel_batch
+            if self.verbose:
+                pbar.update(len(batch_points))
 
         if self.verbose:
             pbar.close()
 
-        if do_return:
-            return vel
+        if out_file is not None:
+            vel.flush()
+
+        return vel
+
+    def index_variants(self, centers: np.ndarray, sigma: np.ndarray):
+        """
+        Index the eddies of each variant in arrays sorted by length scale, for a neighbor search within the margin.
+        Returns the range `[start, stop)` and the `neighbors.NeighborIndex` of each variant.
+        """
+        return [
+            (start, stop, neighbors.NeighborIndex(centers[start:stop], sigma[start] * CUTOFF))
+            for start, stop in self.variant_ranges(sigma)
+        ]
+
+    def prefetch(self, t: float, high_bounds: np.ndarray, low_bounds: np.ndarray, index: bool = False):
+        """
+        Get the eddies around a region at time `t` once, for all queries within the region at that time.
+
+        Until `clear_prefetched`, `get_wrap_arounds` culls the eddies of queries within the region
+        from the prefetched ones, and `sum_vel_points` also reuses their neighbor index if built.
+        The flow iterations around `t` are set, so concurrent queries do not set them at the same time.
+
+        Parameters
+        ----------
+        `t` : float
+            Time passed
+        `high_bounds` : np.ndarray
+            Upper bounds of the region
+        `low_bounds` : np.ndarray
+            Lower bounds of the region
+        `index` : bool, optional
+            Build the neighbor index of each variant for point queries, by default False
+        """
+        high_bounds = np.asarray(high_bounds, dtype=float)
+        low_bounds = np.asarray(low_bounds, dtype=float)
+        entry = {"high_bounds": high_bounds, "low_bounds": low_bounds}
+        centers, alpha, sigma = self.get_wrap_arounds(t, high_bounds, low_bounds)
+        order = np.argsort(sigma, kind="stable")
+        entry["centers"], entry["alpha"], entry["sigma"] = centers[order], alpha[order], sigma[order]
+        if index:
+            entry["variants"] = self.index_variants(entry["centers"], entry["sigma"])
+        if not hasattr(self, "prefetched"):
+            self.prefetched = {}
+        self.prefetched[t] = entry
+
+    def get_prefetched(self, t: float, high_bounds: np.ndarray, low_bounds: np.ndarray):
+        """Get the eddies prefetched at time `t` around a region containing the bounds, None if there are none."""
+        entry = getattr(self, "prefetched", {}).get(t, None)
+        if entry is None or np.any(entry["high_bounds"] < high_bounds) or np.any(entry["low_bounds"] > low_bounds):
+            return None
+        return entry
+
+    def clear_prefetched(self):
+        """Clear the prefetched eddies."""
+        self.prefetched = {}
+
+    def variant_ranges(self, sigma: np.ndarray):
+        """
+        Get the range `[start, stop)` of each eddy variant (length scale) in an array of sorted length scales.
+        """
+        bounds = np.searchsorted(sigma, np.unique(sigma), side="right")
+        return list(zip(np.concatenate(([0], bounds[:-1])).astype(int).tolist(), bounds.tolist()))
+
+    def auto_chunk_size(
+        self,
+        margins: np.ndarray,
+        num_points: list,
+        step_size: float | np.ndarray,
+        memory_limit: float,
+        kernel: str = "chunk",
+        extent: np.ndarray = None,
+    ):
+        """
+        Choose chunk sizes along x, y and z that keep each kernel call within the memory limit.
+
+        The number of eddies affecting a chunk is estimated from the density of the culled eddies
+        of each margin (eddy variant), with headroom for random fluctuations.
+        The memory of a kernel call is about `eddies * points * eddy.PAIR_BYTES[kernel]`.
+        Sizes along each axis are searched separately, among `AUTO_CHUNK_CANDIDATES` sizes spaced geometrically
+        up to the whole axis. Among the combinations that fit, the one with the least estimated time is chosen:
+        larger chunks have fewer kernel calls (see `eddy.CALL_PAIRS`), but more eddies reaching into each chunk.
+
+        Parameters
+        ----------
+        margins : np.ndarray
+            Margins of the eddies included in the meshgrid, as returned by culling.
+        num_points : list
+            Number of grid points along x, y and z.
+        step_size : float or np.ndarray
+            Step size of the meshgrid, or the largest step along each axis of a non-uniform meshgrid.
+        memory_limit : float
+            Memory budget of each kernel call in MB.
+        kernel : str, optional
+            Kernel used to sum eddy contributions, by default "chunk".
+        extent : np.ndarray, optional
+            Size of the meshgrid along x, y and z, by default the number of steps times the step size.
+
+        Returns
+        -------
+        np.ndarray
+            Chunk sizes along x, y and z.
+        """
+        num_points = np.array(num_points)
+        budget = memory_limit * 2**20 / eddy.PAIR_BYTES[kernel]
+
+        # Eddy density of each variant in the region they were culled from (bounds plus margin)
+        values, counts = np.unique(margins, return_counts=True)
+        if extent is None:
+            extent = (num_points - 1) * step_size
+        density = counts / np.prod(extent + 2 * values[:, np.newaxis], axis=1)
+
+        # Candidate sizes along each axis, up to the whole axis, and all their combinations
+        candidates = [np.unique(np.round(np.geomspace(1, n, AUTO_CHUNK_CANDIDATES)).astype(int)) for n in num_points]
+        sizes = np.stack(np.meshgrid(*candidates, indexing="ij"), axis=-1).reshape(-1, 3)
+
+        # Chunks can be one point larger after merging the remainder, see `chunk_split`
+        points = np.minimum(sizes + 1, num_points)
+        chunk_extent = (points[:, np.newaxis, :] - 1) * step_size + 2 * values[:, np.newaxis]
+        eddies = np.sum(density * np.prod(chunk_extent, axis=2), axis=1)
+        pairs = eddies * np.prod(points, axis=1)
+        peak_pairs = (eddies + 3 * np.sqrt(eddies)) * np.prod(points, axis=1)
+
+        # Estimated time of the whole meshgrid, in eddy-point pairs
+        num_chunks = np.prod(np.ceil(num_points / sizes), axis=1)
+        cost = num_chunks * (pairs + eddy.CALL_PAIRS[kernel])
+
+        fit = np.flatnonzero(peak_pairs <= budget)
+        if len(fit) == 0:
+            return np.ones(3, dtype=int)
+        return sizes[fit[np.argmin(cost[fit])]]
 
     def get_iter(self, t: float):
         """Get the current flow iteration based on the time passed."""
@@ -390,12 +1504,27 @@ class FlowField:
         return offset
 
     def get_wrap_arounds(
-        self, t: float, high_bounds: np.ndarray, low_bounds: np.ndarray
+        self, t: float, high_bounds: np.ndarray, low_bounds: np.ndarray, yz_cache: dict = None
     ):
         """
         Get all eddies and their wrapped-around copies if any.
         Returns the centers, alpha, and sigma of the eddies that are within the bounds (including margins).
+
+        The y and z coordinates of the eddies only change between flow iterations, so the eddies within
+        the y and z bounds of each wrap-around can be kept in `yz_cache` and reused for other times
+        with the same bounds and bricks (see `brick_slice`).
+
+        If eddies around a larger region were prefetched for time `t` (see `prefetch`),
+        they are culled from those instead, sorted by length scale.
         """
+        entry = self.get_prefetched(t, high_bounds, low_bounds)
+        if entry is not None:
+            centers, margin = entry["centers"], entry["sigma"] * CUTOFF
+            mask = np.ones(len(centers), dtype=bool)
+            for a in range(3):
+                mask &= self.within_margin(centers[:, a], margin, low_bounds[a], high_bounds[a])
+            return centers[mask], entry["alpha"][mask], entry["sigma"][mask]
+
         # Current flow iteration and x-offset
         flow_iter = self.get_iter(t)
         offset = self.get_offset(t)
@@ -406,38 +1535,57 @@ class FlowField:
         wrapped_sigma = [np.empty(0)] * 27
         w = 0
         # Wrap around for the x coordinates
-        margin = self.sigma * CUTOFF
-        for i in WRAP_ITER:
+        iters = [0 if hasattr(self, "x_vel") else flow_iter + i for i in WRAP_ITER]
+        if yz_cache is not None:
+            # Only keep the flow iterations still in use
+            for key in [key for key in yz_cache if key[0] not in iters]:
+                del yz_cache[key]
+        for i, fi in zip(WRAP_ITER, iters):
             if hasattr(self, "x_vel"):
+                part = slice(None)
                 centers = self.get_eddy_center_x_vel(t)
                 centers[:, 0] += i * self.dimensions[0]
             else:
-                centers = self.get_eddy_centers(flow_iter + i)
-                centers[:, 0] += offset - i * self.dimensions[0]
+                # Eddies sorted by brick are culled from the bricks around the bounds instead of all eddies
+                shift_x = offset - i * self.dimensions[0]
+                part = self.brick_slice(low_bounds[0] - shift_x, high_bounds[0] - shift_x)
+                centers = self.get_eddy_centers(fi, part)
+                centers[:, 0] += shift_x
+            first = part.start or 0
+            sigma = self.get_sigma(part)
+            margin = sigma * CUTOFF
             # Wrap around for the y and z coordinates
             for j in WRAP_ITER:
                 for k in WRAP_ITER:
-                    centers_wrap = centers + np.array(
-                        [0, j * self.dimensions[1], k * self.dimensions[2]]
-                    )
-                    mask = self.within_margin(
-                        centers_wrap[:, 1], margin, low_bounds[1], high_bounds[1]
-                    )
-                    mask[mask] = self.within_margin(
-                        centers_wrap[:, 2][mask],
-                        margin[mask],
-                        low_bounds[2],
-                        high_bounds[2],
-                    )
-                    mask[mask] = self.within_margin(
-                        centers_wrap[:, 0][mask],
-                        margin[mask],
-                        low_bounds[0],
-                        high_bounds[0],
-                    )
-                    wrapped_centers[w] = centers_wrap[mask]
-                    wrapped_alpha[w] = self.alpha[mask]
-                    wrapped_sigma[w] = self.sigma[mask]
+                    shift = np.array([0, j * self.dimensions[1], k * self.dimensions[2]])
+                    # Selections index into the bricks read, kept apart by brick range
+                    key = (fi, part.start, part.stop, j, k)
+                    if yz_cache is not None and key in yz_cache:
+                        selected = yz_cache[key]
+                    else:
+                        mask = self.within_margin(
+                            centers[:, 1] + shift[1], margin, low_bounds[1], high_bounds[1]
+                        )
+                        mask[mask] = self.within_margin(
+                            centers[:, 2][mask] + shift[2],
+                            margin[mask],
+                            low_bounds[2],
+                            high_bounds[2],
+                        )
+                        selected = np.flatnonzero(mask)
+                        if yz_cache is not None:
+                            yz_cache[key] = selected
+                    selected = selected[
+                        self.within_margin(
+                            centers[selected, 0],
+                            margin[selected],
+                            low_bounds[0],
+                            high_bounds[0],
+                        )
+                    ]
+                    wrapped_centers[w] = centers[selected] + shift
+                    wrapped_alpha[w] = self.alpha[selected + first]
+                    wrapped_sigma[w] = sigma[selected]
                     w += 1
 
         wrapped_centers = np.concatenate(wrapped_centers)
@@ -464,6 +1612,43 @@ class FlowField:
         coords = np.arange(low_bounds, high_bounds + step_size, step_size)
         return coords[:-1] if coords[-1] > high_bounds else coords
 
+    def mesh_coords(self, low_bounds: np.ndarray, high_bounds: np.ndarray, step_size: float, axes: dict = None):
+        """
+        Generate the x, y and z coordinates of a meshgrid.
+
+        Axes named in `axes` are non-uniform, given either as
+        - a list or array of increasing coordinates within the flow field, or
+        - a stretching spec `{"num", "stretch", "factor", "cluster"}` from the low to the high bound of the axis,
+          see `stretching.axis_coords`.
+
+        Other axes are evenly spaced by `step_size` from the low to the high bound.
+        """
+        if axes is None:
+            axes = {}
+        if not isinstance(axes, dict) or not set(axes) <= {"x", "y", "z"}:
+            raise ValueError("Axes must be a dict of coordinates by axis name (x, y, z)")
+
+        coords = []
+        for a, name in enumerate(["x", "y", "z"]):
+            spec = axes.get(name, None)
+            if spec is None:
+                coords.append(self.step_coords(low_bounds[a], high_bounds[a], step_size))
+            elif isinstance(spec, dict):
+                if not set(spec) <= {"num", "stretch", "factor", "cluster"}:
+                    raise ValueError(f"Stretching of axis {name} only takes num, stretch, factor and cluster")
+                coords.append(stretching.axis_coords(low_bounds[a], high_bounds[a], **spec))
+            else:
+                try:
+                    values = np.asarray(spec, dtype=float)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Coordinates of axis {name} must be numbers")
+                if values.ndim != 1 or len(values) == 0 or np.any(np.diff(values) <= 0):
+                    raise ValueError(f"Coordinates of axis {name} must be a non-empty list of increasing numbers")
+                if values[0] < self.low_bounds[a] or values[-1] > self.high_bounds[a]:
+                    raise ValueError("Bounds must be within the flow field")
+                coords.append(values)
+        return coords
+
     def chunk_split(self, array: np.ndarray, chunk_size):
         """Split an array into chunks of a given size."""
         if len(array) == 1:
@@ -474,10 +1659,129 @@ class FlowField:
             chunks.pop(-1)
         return chunks
 
+    def nbytes(self):
+        """
+        Get the memory footprint of the eddy arrays in bytes.
+        Memory-mapped arrays of a loaded field are left out, their pages belong to the page cache.
+        """
+        arrays = [value for value in vars(self).values() if isinstance(value, np.ndarray)]
+        arrays += [*self.y.values(), *self.z.values(), *getattr(self, "yz_blocks", {}).values()]
+        # Iterations sharing the same arrays (zero average velocity) are counted once
+        arrays = {id(a): a for a in arrays if not isinstance(a, np.memmap)}
+        return sum(a.nbytes for a in arrays.values())
+
+    def fingerprint(self):
+        """
+        Get a hash of the field eddies and seed, identifying the field across saves and loads.
+        The seed is left out until it is stored with the field (see `seed_stored`),
+        so results using derived flow iterations must not be shared before.
+        """
+        if not self.seed_stored():
+            return self.get_digest()
+        return hashlib.sha256(f"{self.get_digest()}:{self.seed}".encode()).hexdigest()
+
+    def get_digest(self):
+        """
+        Get a hash of the field dimensions and eddies, stored with the field.
+        Flow iterations set after the field was created are not included.
+        """
+        if getattr(self, "digest", None) is None:
+            h = hashlib.sha256()
+            h.update(np.ascontiguousarray(self.dimensions, dtype=np.float64).data)
+            arrays = [self.init_x, None, self.alpha, getattr(self, "x_vel", np.empty(0))]
+            arrays += [a[fi] for a in (self.y, self.z) for fi in range(3) if fi in a]
+            # A batch of eddies at a time, the same hash as the whole arrays without holding them in memory
+            for a in arrays:
+                size = self.N if a is None else len(a)
+                for start in range(0, size, GENERATE_BLOCK_SIZE):
+                    part = slice(start, start + GENERATE_BLOCK_SIZE)
+                    values = self.get_sigma(part) if a is None else a[part]
+                    h.update(np.ascontiguousarray(values, dtype=np.float64).data)
+            self.digest = h.hexdigest()
+        return self.digest
+
     @classmethod
     def load(cls, name: str):
-        """Load a flow field from a file."""
-        return file_io.read("fields", name, "obj")
+        """
+        Load a flow field from its directory in `fields` (see `save`), with the eddy arrays memory-mapped (read-only),
+        so loading is fast and concurrent processes share the arrays through the page cache.
+        Queries only read the eddies in the bricks around them, see `sort_bricks`.
+        Fields saved as `.pkl` files by earlier versions are read as they are, see `convert`.
+        """
+        directory = os.path.join("fields", name)
+        if not os.path.exists(os.path.join(file_io.DIR, directory, "field.json")):
+            return file_io.read("fields", name, "obj")
+
+        meta = file_io.read(directory, "field", "json")
+        if meta.get("format", None) != FIELD_FORMAT:
+            raise file_io.FailToRead(f"Cannot read fields file '{name}': unknown format {meta.get('format', None)}")
+        if meta.get("seed", None) is None:
+            raise file_io.FailToRead(f"Cannot read fields file '{name}': no seed")
+
+        field = cls.__new__(cls)
+        field.profile = EddyProfile.__new__(EddyProfile)
+        field.profile.name = meta["profile"]["name"]
+        field.profile.settings = meta["profile"]["settings"]
+        field.profile.variants = meta["profile"]["variants"]
+        field.name = meta["name"]
+        field.dimensions = np.array(meta["dimensions"])
+        field.avg_vel = meta["avg_vel"]
+        field.variant_density = field.profile.get_density_array()
+        field.variant_length_scale = field.profile.get_length_scale_array()
+        field.variant_intensity = field.profile.get_intensity_array()
+        field.variant_quantity = np.array(meta["variant_quantity"])
+        field.N = np.int64(meta["N"])
+        field.low_bounds = -field.dimensions / 2
+        field.high_bounds = field.dimensions / 2
+
+        field.init_x = file_io.read(directory, "init_x", "mmap")
+        field.alpha = file_io.read(directory, "alpha", "mmap")
+        # Length scales are expanded only if all of them are needed, see `__getattr__`
+        field.sigma_values = np.array(meta["length_scales"], dtype=float)
+        field.sigma_index = file_io.read(directory, "variant", "mmap")
+        field.digest = meta["fingerprint"]
+        field.seed = meta["seed"]
+        field.y = {}
+        field.z = {}
+        for fi, stored in meta["iterations"].items():
+            if stored not in field.y:
+                field.y[stored] = file_io.read(directory, f"y_{stored}", "mmap")
+                field.z[stored] = file_io.read(directory, f"z_{stored}", "mmap")
+            field.y[int(fi)] = field.y[stored]
+            field.z[int(fi)] = field.z[stored]
+        if meta["x_vel_prof"] != "":
+            field.x_vel_func = x_velocity.get_func(meta["x_vel_prof"])
+            field.x_vel = file_io.read(directory, "x_vel", "mmap")
+        else:
+            max_sigma = float(np.max(field.sigma_values, initial=0))
+            field.bricks = {"offsets": file_io.read(directory, "bricks", "npy"), "max_sigma": max_sigma}
+        return field
+
+    @classmethod
+    def convert(cls, name: str, keep: bool = False):
+        """
+        Convert a field saved as a `.pkl` file by earlier versions to a field directory, see `save`.
+        A field pickled before seeds were stored keeps the seed drawn for it in this process.
+
+        Parameters
+        ----------
+        name : str
+            Name of the field.
+        keep : bool, optional
+            Keep the `.pkl` file, by default False.
+
+        Returns
+        -------
+        FlowField
+            The converted field.
+        """
+        field: FlowField = file_io.read("fields", name, "obj")
+        field.name = str(name)
+        field.seed = field.get_seed()
+        field.save()
+        if not keep:
+            os.remove(os.path.join(file_io.DIR, "fields", f"{name}.pkl"))
+        return field
 
     @classmethod
     def print(cls, *content):
@@ -0,0 +1,96 @@
+"""
+Fixed-radius neighbor search between scattered points and eddy centers.
+
+Uses a KD-tree from SciPy (`scipy.spatial.cKDTree`) if it is installed,
+otherwise a built-in grid of cells the size of the search radius.
+Either way, only the eddy-point pairs within the radius are listed,
+so the cost follows the number of interactions instead of points times eddies.
+"""
+import itertools
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # pragma: no cover
+    cKDTree = None
+
+
+class NeighborIndex:
+    """
+    Index of eddy centers to find the eddies within a radius of query points.
+    """
+
+    def __init__(self, centers: np.ndarray, radius: float, use_tree: bool = True):
+        """
+        Build the index.
+
+        Parameters
+        ----------
+        centers : np.ndarray
+            Array of eddy centers, shape `(N, 3)`.
+        radius : float
+            Search radius, usually the margin of the eddies.
+        use_tree : bool, optional
+            Use the SciPy KD-tree if available, by default True.
+            Otherwise, or if SciPy is not installed, the built-in cell grid is used.
+        """
+        self.centers = centers
+        self.radius = radius
+        self.tree = cKDTree(centers) if use_tree and cKDTree is not None else None
+        if self.tree is not None:
+            return
+
+        # Sort the eddies by the cell they are in, cells being cubes of the search radius
+        self.origin = np.min(centers, axis=0) if len(centers) > 0 else np.zeros(3)
+        cells = np.floor((centers - self.origin) / radius).astype(np.int64)
+        self.shape = np.max(cells, axis=0) + 1 if len(centers) > 0 else np.ones(3, dtype=np.int64)
+        keys = self.cell_keys(cells)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def cell_keys(self, cells: np.ndarray):
+        """Get the flat index of cells `(i, j, k)` in the grid."""
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+    def query(self, points: np.ndarray):
+        """
+        Find all pairs of eddies and points within the search radius of each other.
+
+        Parameters
+        ----------
+        points : np.ndarray
+            Array of point coordinates, shape `(M, 3)`.
+
+        Returns
+        -------
+        eddy_idx : np.ndarray
+            Index into the `centers` of the eddy of each pair.
+        point_idx : np.ndarray
+            Index into `points` of the point of each pair.
+        """
+        if self.tree is not None:
+            pairs = self.tree.sparse_distance_matrix(cKDTree(points), self.radius, output_type="ndarray")
+            return pairs["i"].astype(np.int64), pairs["j"].astype(np.int64)
+
+        eddy_parts = [np.empty(0, dtype=np.int64)]
+        point_parts = [np.empty(0, dtype=np.int64)]
+        cells = np.floor((points - self.origin) / self.radius).astype(np.int64)
+        # Eddies within the radius of a point are in the cell of the point or one of its neighbors
+        for offset in itertools.product([-1, 0, 1], repeat=3):
+            neighbor = cells + offset
+            valid = np.flatnonzero(np.all((neighbor >= 0) & (neighbor < self.shape), axis=1))
+            keys = self.cell_keys(neighbor[valid])
+            low = np.searchsorted(self.keys, keys, side="left")
+            counts = np.searchsorted(self.keys, keys, side="right") - low
+
+            # Expand the eddies of each cell into candidate pairs
+            point_idx = np.repeat(valid, counts)
+            position = np.arange(len(point_idx)) - np.repeat(np.cumsum(counts) - counts - low, counts)
+            eddy_idx = self.order[position]
+
+            dist_sq = np.sum((points[point_idx] - self.centers[eddy_idx]) ** 2, axis=1)
+            within = dist_sq <= self.radius**2
+            eddy_parts.append(eddy_idx[within])
+            point_parts.append(point_idx[within])
+
+        return np.concatenate(eddy_parts), np.concatenate(point_parts)
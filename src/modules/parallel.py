@@ -0,0 +1,207 @@
+"""
+Process pool backend for meshgrid queries.
+
+Eddy arrays, the cell list index of each variant and the output velocity volume are published
+through shared memory, so worker processes read and write them without pickling or copying.
+An output that is already a memory-mapped `.npy` file is shared through the file instead.
+Each task adds the fluctuations of one eddy variant into one x-slab of chunks with `eddy.sum_vel_slab`.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from modules import eddy
+from modules import shape_function
+
+worker_state = {}  # Shared arrays and query parameters of a worker process, set by `init_worker`
+
+
+def share_array(shape: tuple, dtype=np.float64):
+    """
+    Create an array in a new shared memory block.
+
+    Returns
+    -------
+    shm : SharedMemory
+        Shared memory block, to be closed and unlinked by the creator.
+    array : np.ndarray
+        Array using the shared memory block as buffer.
+    """
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def init_worker(specs: dict, params: dict, active, cutoff: float):
+    """
+    Attach the shared arrays and set the shape function in a worker process.
+
+    Parameters
+    ----------
+    specs : dict
+        Name, shape, dtype and frame of each array: the shared memory block, shape and dtype,
+        or the path of a memory-mapped `.npy` file with `None` shape and dtype.
+        The frame is the index of the array in the file (or `None` for the whole file).
+    params : dict
+        Other query parameters, see `calc_x_slab`, with the arrays of the cell list indices left out.
+    active : Callable
+        Active shape function of the parent process.
+    cutoff : float
+        Cutoff of the shape function in the parent process.
+    """
+    shape_function.set_active(active)
+    shape_function.set_cutoff(cutoff)
+    worker_state.clear()
+    worker_state["blocks"] = []
+    for key, (name, shape, dtype, frame) in specs.items():
+        if shape is None:
+            array = np.lib.format.open_memmap(name, mode="r+")
+            worker_state[key] = array if frame is None else array[frame]
+            continue
+        shm = shared_memory.SharedMemory(name=name)
+        worker_state["blocks"].append(shm)
+        worker_state[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    worker_state.update(params)
+    for v, var in enumerate(worker_state["variants"]):
+        join_index(var["index"], worker_state, f"index_{v}")
+
+
+def split_index(index, prefix: str):
+    """
+    Split the arrays out of a cell list index, see `cell_list.CellList`.
+
+    Returns
+    -------
+    light : CellList
+        Copy of the index without its arrays, to be pickled.
+    arrays : dict
+        Arrays of the index by key, starting with `prefix`.
+    """
+    light = copy.copy(index)
+    arrays = {f"{prefix}_start": index.start, f"{prefix}_stop": index.stop}
+    for g, (members, first, _) in enumerate(index.groups):
+        arrays[f"{prefix}_members_{g}"] = members
+        arrays[f"{prefix}_first_{g}"] = first
+    light.start = light.stop = None
+    light.groups = [(None, None, span) for _, _, span in index.groups]
+    return light, arrays
+
+
+def join_index(light, arrays: dict, prefix: str):
+    """Put the arrays back into a cell list index split by `split_index`."""
+    light.start = arrays[f"{prefix}_start"]
+    light.stop = arrays[f"{prefix}_stop"]
+    light.groups = [
+        (arrays[f"{prefix}_members_{g}"], arrays[f"{prefix}_first_{g}"], span)
+        for g, (_, _, span) in enumerate(light.groups)
+    ]
+
+
+def calc_x_slab(v: int, i: int):
+    """
+    Add the velocity fluctuations of variant `v` into its x-slab `i` of the shared output volume.
+    Returns the number of grid points done.
+    """
+    w = worker_state
+    var = w["variants"][v]
+    xc = var["x_chunks"][i]
+    start, stop = var["eddies"]
+    vel_i = w["vel"][xc[0] : xc[-1] + 1]
+    eddy.sum_vel_slab(
+        vel_i,
+        i,
+        var["index"],
+        w["centers"][start:stop],
+        var["sigma"],
+        w["alpha"][start:stop],
+        var["margin"],
+        w["x_coords"][xc],
+        w["y_coords"],
+        w["z_coords"],
+        var["y_chunks"],
+        var["z_chunks"],
+        w["kernel"],
+    )
+    return vel_i.shape[0] * vel_i.shape[1] * vel_i.shape[2]
+
+
+def run(
+    vel: np.ndarray,
+    arrays: dict,
+    params: dict,
+    workers: int,
+    progress=None,
+    frame: int = None,
+):
+    """
+    Add the velocity fluctuations of all variants into a meshgrid across a pool of worker processes.
+
+    Variants are computed one after another, the x-slabs of each variant in parallel.
+
+    Parameters
+    ----------
+    vel : np.ndarray
+        Output velocity volume, already holding the mean velocity, or stacked volumes if `frame` is set.
+        If it is a memory-mapped `.npy` file, workers add into the file,
+        otherwise into a shared memory copy that is copied back into `vel`.
+    arrays : dict
+        Eddy arrays `centers` and `alpha` to publish in shared memory, grouped by variant.
+    params : dict
+        Other query parameters, must be picklable.
+        `variants` lists the eddy range, length scale, margin, chunks and cell list of each variant.
+        The arrays of the cell lists are published in shared memory too, see `split_index`.
+    workers : int
+        Number of worker processes.
+    progress : Callable, optional
+        Called with the number of grid points done after each slab.
+    frame : int, optional
+        Index of the output volume in `vel`, by default None
+    """
+    blocks = []
+    shared = {}
+    in_file = isinstance(vel, np.memmap) and vel.filename is not None
+    out = vel if frame is None else vel[frame]
+    try:
+        specs = {}
+        if in_file:
+            vel.flush()
+            specs["vel"] = (vel.filename, None, None, frame)
+        else:
+            shm, shared["vel"] = share_array(out.shape, out.dtype)
+            blocks.append(shm)
+            shared["vel"][...] = out
+            specs["vel"] = (shm.name, out.shape, out.dtype.str, None)
+
+        # Cell list indices travel without their arrays, which are shared like the eddy arrays
+        arrays = dict(arrays)
+        variants = []
+        for v, var in enumerate(params["variants"]):
+            light, index_arrays = split_index(var["index"], f"index_{v}")
+            arrays.update(index_arrays)
+            variants.append({**var, "index": light})
+
+        for key, array in arrays.items():
+            shm, shared[key] = share_array(array.shape, array.dtype)
+            blocks.append(shm)
+            shared[key][...] = array
+            specs[key] = (shm.name, array.shape, array.dtype.str, None)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(specs, {**params, "variants": variants}, shape_function.active, shape_function.get_cutoff()),
+        ) as executor:
+            # Slabs of different variants overlap, so a variant starts after the previous one is done
+            for v, var in enumerate(params["variants"]):
+                futures = [executor.submit(calc_x_slab, v, i) for i in range(len(var["x_chunks"]))]
+                for future in as_completed(futures):
+                    done = future.result()
+                    if progress is not None:
+                        progress(done)
+        if not in_file:
+            out[...] = shared["vel"]
+    finally:
+        shared.clear()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
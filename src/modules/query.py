@@ -1,25 +1,29 @@
+import os
 import json
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from modules import file_io
+from modules import result_cache
+from modules import shape_function
+from modules import flow_field
 from modules.flow_field import FlowField
 from modules import visualize
 from modules import utils
 
+AXES = ["x", "y", "z"]
+
 
 class Query:
     """
-    Singleton class to handle query requests on a flow field.
+    Class to handle query requests on a flow field.
     Currently only save results to disk in numpy format.
+    Each instance keeps its own field, see `Session` to query several fields.
     """
-    _instance = None
 
     save_results = True
-
-    def __new__(cls, *args, **kwargs):
-        if not isinstance(cls._instance, cls):
-            cls._instance = super(Query, cls).__new__(cls)
-        return cls._instance
+    cache_dir = result_cache.CACHE_DIR  # Directory of cached results
+    cache_limit = result_cache.CACHE_LIMIT  # Size limit of cached results in MB, 0 to disable caching
 
     def __init__(self, field: FlowField):
         self.field = field
@@ -27,8 +31,10 @@ class Query:
     def handle_request(self, request: str, format="string"):
         """
         Handle query request on flow field.
-        Supports two modes: meshgrid and points.
-        For points, it currrently uses single point meshgrid calculation.
+        Supports four modes: meshgrid, points, plane and line.
+        Planes and lines are meshgrids with fixed axes, see `section_bounds` and `FlowField.sum_vel_section`.
+        Points are evaluated together in batches, see `FlowField.sum_vel_points`.
+        A batch of requests can be given as a list under `"requests"`, see `run_batch`.
 
         Parameters
         ----------
@@ -43,14 +49,170 @@ class Query:
             Response message.
 
         """
-        # Parse request
+        return self.respond(self.parse_request(request, format))
+
+    @staticmethod
+    def parse_request(request: str, format="string"):
+        """
+        Parse a query request string, or read it from a file in `queries` if `format` is "file".
+        Returns the request as a dict.
+        """
         if format == "file":
-            request = file_io.read("queries", request, format="json")
-        else:
-            try:
-                request: dict = json.loads(request)
-            except Exception as e:
-                raise Exception(f"Invalid query request string: {e}")
+            return file_io.read("queries", request, format="json")
+        try:
+            request: dict = json.loads(request)
+        except Exception as e:
+            raise Exception(f"Invalid query request string: {e}")
+        if not isinstance(request, dict):
+            raise TypeError("Invalid query request string: not a JSON object")
+        return request
+
+    def respond(self, request: dict):
+        """
+        Run a parsed query request, or a batch of requests under `"requests"`, and get the response message.
+        """
+        if "requests" in request:
+            results = self.run_batch(request["requests"], workers=request.get("workers", None))
+            return "\n".join(f"Request {i}: {response}" for i, (response, _, _) in enumerate(results))
+        response, _, _ = self.run(request)
+        return response
+
+    def run_batch(self, requests: list, save: bool = None, workers: int = None):
+        """
+        Run a batch of parsed query requests on flow field, see `run`.
+
+        The eddies around all requests at the same time are fetched once for all of them
+        (see `FlowField.prefetch`), with the neighbor index for points. Series of times and points
+        in files are not prefetched. The requests then run concurrently in threads.
+
+        Parameters
+        ----------
+        requests : list
+            Query requests.
+        save : bool, optional
+            Save the results to disk, by default `save_results`.
+        workers : int, optional
+            Number of requests run at the same time, by default the number of CPUs.
+
+        Returns
+        -------
+        list
+            Response, result and path of each request, as returned by `run`.
+            The response of a failed request is its error message, without result and path.
+        """
+        if not isinstance(requests, list) or not all(isinstance(request, dict) for request in requests):
+            raise TypeError("Invalid batch request, requests must be a list of query requests")
+        if workers is None:
+            workers = max(min(len(requests), os.cpu_count() or 1), 1)
+        if not (isinstance(workers, int) and workers > 0):
+            raise ValueError("Invalid batch request, workers must be a positive integer")
+
+        # Region around all requests at each time
+        regions = {}
+        for request in requests:
+            for time, low_bounds, high_bounds, points in self.get_regions(request):
+                region = regions.setdefault(time, {"count": 0, "points": False})
+                if low_bounds is None:
+                    continue
+                region["count"] += 1
+                region["points"] |= points
+                region["low_bounds"] = np.minimum(region.get("low_bounds", low_bounds), low_bounds)
+                region["high_bounds"] = np.maximum(region.get("high_bounds", high_bounds), high_bounds)
+
+        # Clear previous chunk cache once, requests running together keep their files apart by tag
+        file_io.clear(flow_field.CACHE_DIR)
+
+        try:
+            # Share eddies of the same time
+            for time, region in regions.items():
+                if region["count"] > 1:
+                    self.field.prefetch(time, region["high_bounds"], region["low_bounds"], index=region["points"])
+
+            results = []
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self.run, request, save, f"_{i}") for i, request in enumerate(requests)]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append((str(e), None, None))
+        finally:
+            self.field.clear_prefetched()
+        return results
+
+    def get_regions(self, request: dict):
+        """
+        Get the regions queried by a request, to share eddies across a batch.
+
+        Returns
+        -------
+        list
+            Time, low and high bounds, and whether the region is for points, of each region.
+            Bounds are None for the times of a series or points in a file, which are not prefetched.
+            Invalid requests have no regions, their errors are raised when they run.
+        """
+        params = request.get("params", None)
+        if not isinstance(params, dict):
+            return []
+        try:
+            mode = request.get("mode", None)
+            times = params.get("times", None)
+            if mode == "meshgrid" and isinstance(times, (list, dict)):
+                if isinstance(times, dict):
+                    times = self.field.step_coords(times["start"], times["stop"], times["step"])
+                return [(float(time), None, None, False) for time in times if utils.is_not_negative(time)]
+
+            time = params.get("time", 0)
+            if not utils.is_not_negative(time):
+                return []
+            coords = params.get("coords", [[0, 0, 0]])
+            if mode == "meshgrid":
+                low_bounds = np.asarray(params["low_bounds"], dtype=float)
+                high_bounds = np.asarray(params["high_bounds"], dtype=float)
+                # Explicit coordinates of non-uniform axes replace the bounds
+                for name, spec in (params.get("axes", None) or {}).items():
+                    if isinstance(spec, list):
+                        low_bounds[AXES.index(name)], high_bounds[AXES.index(name)] = min(spec), max(spec)
+            elif mode in ["plane", "line"]:
+                low_bounds, high_bounds, _ = self.section_bounds(mode, params)
+            elif mode == "points" and isinstance(coords, list):
+                coords = np.asarray(coords, dtype=float)
+                low_bounds, high_bounds = np.min(coords, axis=0), np.max(coords, axis=0)
+            elif mode == "points":
+                return [(float(time), None, None, True)]
+            else:
+                return []
+            if low_bounds.shape != (3,) or high_bounds.shape != (3,):
+                return []
+        except (KeyError, TypeError, ValueError, AttributeError, IndexError):
+            return []
+        return [(float(time), low_bounds, high_bounds, mode == "points")]
+
+    def run(self, request: dict, save: bool = None, tag: str = ""):
+        """
+        Run a parsed query request on flow field, see `handle_request`.
+
+        Parameters
+        ----------
+        request : dict
+            Query request with `mode`, `params` and optionally `plot`.
+        save : bool, optional
+            Save the results to disk, by default `save_results`.
+        tag : str, optional
+            Appended to the name of the result file and of the meshgrid chunk information, by default "".
+            Requests with a tag do not clear `.cache`, see `run_batch`.
+
+        Returns
+        -------
+        response : str
+            Response message.
+        result : np.ndarray
+            Calculated velocities.
+        path : str
+            Path of the saved result file, None if not saved.
+        """
+        if save is None:
+            save = self.save_results
 
         mode: str = request.get("mode", "INVALID")
         params: dict = request.get("params", None)
@@ -58,8 +220,9 @@ class Query:
             raise TypeError("Invalid request parameters")
 
         # File name for saving results
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.field.name}_{mode}_{current_time}"
+        current_time = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        filename = f"{self.field.name}_{mode}_{current_time}{tag}"
+        path = os.path.abspath(os.path.join(file_io.DIR, "results", f"{filename}.npy")) if save else None
 
         # Response message
         response = f"Velocity calculation complete (mode: {mode})."
@@ -75,30 +238,66 @@ class Query:
                 "high_bounds",
                 "step_size",
                 "chunk_size",
+                "memory_limit",
                 "time",
-                "threads"
+                "threads",
+                "kernel",
+                "backend",
+                "axes",
             ])
 
-            # Calculate velocity in meshgrid
-            try:
-                vel = self.field.sum_vel_mesh(**kwargs)
-            except Exception as e:
-                raise Exception(f"Error calculating velocity in meshgrid: {e}")
+            # A series of times instead of a single time, as a list or a range {"start", "stop", "step"}
+            times = params.get("times", None)
+            if isinstance(times, dict):
+                if not all(utils.is_not_negative(times.get(key, None)) for key in ["start", "stop"]) or (
+                    not utils.is_positive(times.get("step", None)) or times["stop"] < times["start"]
+                ):
+                    raise TypeError(
+                        "Invalid request parameters, times must be a non-empty list or a start, stop and step"
+                    )
+                times = self.field.step_coords(times["start"], times["stop"], times["step"]).tolist()
+            elif times is not None and (not isinstance(times, list) or len(times) == 0):
+                raise TypeError("Invalid request parameters, times must be a non-empty list or a start, stop and step")
 
-            # Save raw results to disk
-            if isinstance(vel, np.ndarray) and self.save_results:
+            # Write the velocity field straight to the result file instead of holding it in memory
+            out_of_core = params.get("out_of_core", False)
+            if out_of_core and save:
+                kwargs["out_file"] = filename
+            if tag:
+                kwargs["tag"] = tag
+
+            # Serve the same query from the cache
+            key = self.cache_key(mode, {
+                "low_bounds": low_bounds,
+                "high_bounds": high_bounds,
+                "step_size": params.get("step_size", None),
+                "time": params.get("time", 0) if times is None else None,
+                "times": times,
+                "axes": params.get("axes", None),
+            })
+            vel = None if key is None else result_cache.load(key, self.cache_dir)
+            cached = vel is not None
+
+            # Calculate velocity in meshgrid, stacked by time step for a series of times
+            if not cached:
                 try:
-                    file_io.write("results", filename, vel, format="npy")
-                    response += f"\nRaw result saved to results/{filename}.npy"
+                    if times is None:
+                        vel = self.field.sum_vel_mesh(**kwargs)
+                    else:
+                        kwargs.pop("time", None)
+                        vel = self.field.sum_vel_mesh_series(times, **kwargs)
                 except Exception as e:
-                    raise Exception(f"Error saving raw result: {e}")
+                    raise Exception(f"Error calculating velocity in meshgrid: {e}")
+
+            # Save raw results to disk
+            response += self.save_result(vel, filename, key, save, out_of_core and save, cached)
 
-            # Plot meshgrid if requested
+            # Plot meshgrid if requested, the first time step of a series
             plot: dict = request.get("plot", None)
             if plot is not None and isinstance(vel, np.ndarray):
                 try:
                     fig = visualize.plot_mesh(
-                        vel,
+                        vel if times is None else vel[0],
                         low_bounds,
                         high_bounds,
                         **plot,
@@ -112,36 +311,228 @@ class Query:
                     response += f"\nPlot saved to plots/{filename}.png"
                 except Exception as e:
                     raise Exception(f"Error saving plot: {e}")
-            return response
+            return response, vel, path
+
+        # Handle plane or line request, a meshgrid with one or two axes fixed
+        elif mode in ["plane", "line"]:
+            low_bounds, high_bounds, axis = self.section_bounds(mode, params)
+            step_size = params.get("step_size", 0.2)
+            time = params.get("time", 0)
+
+            # Serve the same query from the cache
+            key = self.cache_key(mode, {
+                "low_bounds": low_bounds,
+                "high_bounds": high_bounds,
+                "step_size": step_size,
+                "time": time,
+            })
+            vel = None if key is None else result_cache.load(key, self.cache_dir)
+            cached = vel is not None
+
+            # Calculate velocity on the section, dropping the fixed axes
+            if not cached:
+                try:
+                    vel = self.field.sum_vel_section(low_bounds, high_bounds, step_size, time)
+                except Exception as e:
+                    raise Exception(f"Error calculating velocity in {mode}: {e}")
+                vel = np.take(vel, 0, axis=AXES.index(axis)) if mode == "plane" else vel.reshape(-1, 3)
+
+            # Save raw results to disk
+            response += self.save_result(vel, filename, key, save, False, cached)
+
+            # Plot plane if requested, as the only layer of a meshgrid
+            plot: dict = request.get("plot", None)
+            if plot is not None and mode == "plane":
+                try:
+                    fig = visualize.plot_mesh(
+                        np.expand_dims(vel, AXES.index(axis)),
+                        low_bounds,
+                        high_bounds,
+                        **{**plot, "axis": axis, "index": 0},
+                    )
+                except Exception as e:
+                    raise Exception(f"Error plotting plane: {e}")
+
+                # Save plot to disk
+                try:
+                    file_io.write("plots", filename, fig, format="png")
+                    response += f"\nPlot saved to plots/{filename}.png"
+                except Exception as e:
+                    raise Exception(f"Error saving plot: {e}")
+            return response, vel, path
 
         # Handle points request
         elif mode == "points":
-            # Extract points coordinates
-            coords: list = params.get("coords", None)
+            # Extract points coordinates, either a list or a .npy/.csv file in queries (or an absolute path)
+            coords: list | str = params.get("coords", None)
             if coords is None:
                 coords = [[0, 0, 0]]
-            if not isinstance(coords, list) or len(coords) == 0:
-                raise TypeError("Invalid request parameters, coords must be a list of 3D points")
-
-            # Calculate velocity at each point
-            velocities = np.zeros((len(coords), 3))
-            try:
-                for i, coord in enumerate(coords):
-                    velocities[i] = self.field.sum_vel_mesh(
-                        low_bounds=coord, high_bounds=coord, time=params.get("time", 0)
-                    )
-            except Exception as e:
-                raise Exception(f"Error calculating velocity at points: {e}")
+            from_file = isinstance(coords, str) and coords.endswith((".npy", ".csv"))
+            if not from_file and (not isinstance(coords, list) or len(coords) == 0):
+                raise TypeError("Invalid request parameters, coords must be a list of 3D points or a file name")
 
-            # Save results to disk
-            if isinstance(velocities, np.ndarray):
+            # Serve the same query from the cache
+            key = self.cache_key(mode, {"coords": coords, "time": params.get("time", 0)})
+            velocities = None if key is None else result_cache.load(key, self.cache_dir)
+            cached = velocities is not None
+
+            if not cached:
+                if from_file:
+                    coords = file_io.read_points("queries", coords)
+
+                # Points from a file are written straight to the result file, batch by batch
+                kwargs = utils.filter_keys(params, ["time", "batch_size"])
+                if from_file and save:
+                    kwargs["out_file"] = filename
+
+                # Calculate velocity at all points
                 try:
-                    file_io.write("results", filename, velocities, format="npy")
-                    response += f"\nRaw result saved to results/{filename}.npy"
+                    velocities = self.field.sum_vel_points(coords, **kwargs)
                 except Exception as e:
-                    raise Exception(f"Error saving result: {e}")
-            return response
+                    raise Exception(f"Error calculating velocity at points: {e}")
+
+            # Save results to disk
+            response += self.save_result(velocities, filename, key, save, from_file and save, cached)
+            return response, velocities, path
 
         # No valid mode found
         else:
             raise Exception("Invalid request mode")
+
+    def section_bounds(self, mode: str, params: dict):
+        """
+        Get the meshgrid bounds of a plane or line request.
+
+        A plane is normal to `axis` at `position`, with `low_bounds` and `high_bounds`
+        along the two other axes (in x, y, z order), by default those of the field.
+        A line is along `axis` at `position` on the two other axes,
+        from `low_bound` to `high_bound`, by default those of the field.
+
+        Returns
+        -------
+        low_bounds : np.ndarray
+            Lower bounds of the meshgrid in [x, y, z].
+        high_bounds : np.ndarray
+            Upper bounds of the meshgrid in [x, y, z].
+        axis : str
+            Axis normal to the plane, or along the line.
+        """
+        axis = params.get("axis", None)
+        if axis not in AXES:
+            raise TypeError(f"Invalid request parameters, axis must be one of {AXES}")
+        a = AXES.index(axis)
+        others = [i for i in range(3) if i != a]
+        low_bounds = np.array(self.field.low_bounds, dtype=float)
+        high_bounds = np.array(self.field.high_bounds, dtype=float)
+        try:
+            if mode == "plane":
+                position = float(params["position"])
+                low_bounds[a] = high_bounds[a] = position
+                low = np.asarray(params.get("low_bounds", low_bounds[others]), dtype=float)
+                high = np.asarray(params.get("high_bounds", high_bounds[others]), dtype=float)
+                if low.shape != (2,) or high.shape != (2,):
+                    raise ValueError
+                low_bounds[others], high_bounds[others] = low, high
+            else:
+                position = np.asarray(params["position"], dtype=float)
+                if position.shape != (2,):
+                    raise ValueError
+                low_bounds[others] = high_bounds[others] = position
+                low_bounds[a] = float(params.get("low_bound", low_bounds[a]))
+                high_bounds[a] = float(params.get("high_bound", high_bounds[a]))
+        except (KeyError, TypeError, ValueError):
+            if mode == "plane":
+                raise TypeError(
+                    "Invalid request parameters, a plane needs a position and two low and high bounds"
+                )
+            raise TypeError("Invalid request parameters, a line needs a position on the two other axes")
+        return low_bounds, high_bounds, axis
+
+    def cache_key(self, mode: str, params: dict):
+        """
+        Get the cache key of a query result.
+
+        The key hashes the field, the query mode and the parameters the result depends on,
+        normalized so that e.g. `0` and `0.0` give the same key, and the active shape function and cutoff.
+        Points in a file are identified by the path, size and modification time of the file,
+        and coordinates of non-uniform axes by their hash.
+        Results using flow iterations derived from a seed not yet stored with the field are not cached.
+
+        Returns
+        -------
+        str | None
+            Cache key, None if caching is disabled or the parameters are invalid.
+        """
+        if not self.cache_limit:
+            return None
+        normalized = {}
+        try:
+            # Flow iterations derived from a seed not stored with the field differ in other processes
+            times = params.get("times", None) or [params.get("time", None) or 0]
+            if not self.field.seed_stored() and self.field.derived_iterations([float(t) for t in times]):
+                return None
+            for name, value in params.items():
+                if value is None:
+                    continue
+                if name == "coords" and isinstance(value, str):
+                    file = os.path.abspath(os.path.join(file_io.DIR, "queries", value))
+                    stat = os.stat(file)
+                    normalized[name] = [file, stat.st_size, stat.st_mtime_ns]
+                elif name == "coords":
+                    normalized[name] = result_cache.hash_array(np.asarray(value, dtype=float))
+                elif name == "axes":
+                    normalized[name] = {
+                        axis: spec if isinstance(spec, dict) else result_cache.hash_array(np.asarray(spec, dtype=float))
+                        for axis, spec in value.items()
+                    }
+                else:
+                    normalized[name] = np.asarray(value, dtype=float).tolist()
+        except (OSError, ValueError, TypeError, AttributeError):
+            return None
+        return result_cache.make_key({
+            "field": self.field.fingerprint(),
+            "avg_vel": float(self.field.avg_vel),
+            "mode": mode,
+            "params": normalized,
+            "shape_function": shape_function.active.__name__,
+            "cutoff": shape_function.get_cutoff(),
+        })
+
+    def save_result(self, result: np.ndarray, filename: str, key: str, save: bool, in_file: bool, cached: bool):
+        """
+        Save a result to the results folder and to the cache.
+
+        Parameters
+        ----------
+        result : np.ndarray
+            Calculated or cached result.
+        filename : str
+            Name of the result file.
+        key : str
+            Cache key of the result, None to skip caching.
+        save : bool
+            Save the result to the results folder.
+        in_file : bool
+            The result was calculated straight into its result file.
+        cached : bool
+            The result was served from the cache.
+
+        Returns
+        -------
+        str
+            Response message about the result.
+        """
+        response = "\nResult served from cache" if cached else ""
+        path = result_cache.get_path("results", filename)
+        try:
+            if save and cached:
+                result_cache.copy(result_cache.get_path(self.cache_dir, key), path)
+            elif save and not in_file:
+                file_io.write("results", filename, result, format="npy")
+        except Exception as e:
+            raise Exception(f"Error saving raw result: {e}")
+        if save:
+            response += f"\nRaw result saved to results/{filename}.npy"
+        if key is not None and not cached:
+            result_cache.store(key, path if save else result, self.cache_dir, self.cache_limit)
+        return response
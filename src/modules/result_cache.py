@@ -0,0 +1,115 @@
+"""
+Content-addressed cache of query results.
+
+Each result is stored as `<key>.npy` in the cache directory, where the key is a hash
+of everything the result depends on (see `Query.cache_key`).
+Cached results are served memory-mapped. When the cache grows over its size limit,
+the least recently used results are removed.
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+from modules import file_io
+
+CACHE_DIR = os.path.join("results", "cache")
+CACHE_LIMIT = 1024  # Default size limit of the cache in MB
+
+
+def make_key(identity: dict):
+    """Hash a JSON serializable description of a result into a cache key."""
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def hash_array(array: np.ndarray):
+    """Hash the shape and values of an array, for large arrays in a cache key."""
+    h = hashlib.sha256(str(array.shape).encode())
+    h.update(np.ascontiguousarray(array).data)
+    return h.hexdigest()
+
+
+def get_path(sub_dir: str, name: str):
+    """Get the path of a `.npy` file in a sub-directory."""
+    return os.path.join(file_io.DIR, sub_dir, f"{name}.npy")
+
+
+def load(key: str, sub_dir: str = CACHE_DIR):
+    """
+    Load a cached result, marking it as recently used.
+
+    Returns
+    -------
+    np.ndarray | None
+        Memory-mapped result (read-only), None if not cached.
+    """
+    path = get_path(sub_dir, key)
+    try:
+        os.utime(path)
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def copy(src: str, dst: str):
+    """
+    Copy a file through a temporary file, so a partly written copy is never read.
+    Results are copied instead of linked, so writing into one of them never changes the other.
+    """
+    temp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(src, temp)
+    os.replace(temp, dst)
+
+
+def store(key: str, result: np.ndarray | str, sub_dir: str = CACHE_DIR, limit: float = CACHE_LIMIT):
+    """
+    Store a result in the cache, then remove the least recently used results over the size limit.
+    The cache is best effort, results that cannot be stored are skipped.
+
+    Parameters
+    ----------
+    key : str
+        Cache key of the result.
+    result : np.ndarray | str
+        Result array, or path of a `.npy` file holding it.
+    sub_dir : str, optional
+        Cache directory, by default `CACHE_DIR`.
+    limit : float, optional
+        Size limit of the cache in MB, by default `CACHE_LIMIT`.
+    """
+    path = get_path(sub_dir, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(result, str):
+            copy(result, path)
+        else:
+            # Write to a temporary file first, so a partly written result is never served
+            temp = get_path(sub_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+            np.save(temp, result)
+            os.replace(temp, path)
+    except OSError:
+        return
+    evict(sub_dir, limit)
+
+
+def evict(sub_dir: str = CACHE_DIR, limit: float = CACHE_LIMIT):
+    """Remove the least recently used results until the cache is within its size limit in MB."""
+    directory = os.path.join(file_io.DIR, sub_dir)
+    entries = []
+    # Other processes may remove files in the meantime
+    for name in os.listdir(directory):
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit * 1024**2:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,169 @@
+"""
+Persistent query server keeping flow fields loaded in memory.
+
+Requests are the same JSON objects as query files (see `Query.handle_request`), one per line,
+read from a stream such as stdin, or from the connections of a local Unix socket.
+Each response is one line of JSON, followed by the raw result buffer if requested.
+
+Extra request keys for the server:
+- `"field"`: name of the field to query, by default the first one loaded.
+  Fields are kept in a `Session`, other fields are loaded on first use.
+- `"output"`: `"file"` (default) to save the result and respond with its path,
+  or `"binary"` to respond with the raw result buffer (C order) without saving.
+- `"command": "shutdown"` stops the server instead of querying.
+
+A batch of requests (see `Query.run_batch`) gets one response, with a header for each result under `"results"`
+and the raw buffers of all results one after another.
+"""
+import os
+import sys
+import json
+import contextlib
+import socketserver
+import numpy as np
+from modules.session import Session
+
+OUTPUTS = ["file", "binary"]
+
+
+def handle_line(session: Session, line: bytes | str):
+    """
+    Handle one request line.
+
+    Parameters
+    ----------
+    session : Session
+        Session of the loaded flow fields.
+    line : bytes | str
+        JSON request.
+
+    Returns
+    -------
+    header : dict
+        Response header, with `status` ("ok" or "error") and `message`.
+        A result also has its `field`, `shape`, `dtype`, and `path` or `nbytes` depending on the output.
+        A batch has the headers of its results under `results`, and the total `nbytes`.
+    payload : bytes
+        Raw result buffer for the binary output, empty otherwise.
+    """
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise TypeError("not a JSON object")
+    except Exception as e:
+        return {"status": "error", "message": f"Invalid query request string: {e}"}, b""
+
+    if request.get("command", None) == "shutdown":
+        return {"status": "ok", "message": "Server shutting down", "command": "shutdown"}, b""
+
+    output = request.get("output", "file")
+    if output not in OUTPUTS:
+        return {"status": "error", "message": f"Invalid output, must be one of {OUTPUTS}"}, b""
+    # Keep prints of lower level modules out of the response stream
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            query = session.get(request.get("field", None))
+    except Exception as e:
+        return {"status": "error", "message": f"Error loading field: {e}"}, b""
+
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            if "requests" in request:
+                workers = request.get("workers", None)
+                results = query.run_batch(request["requests"], save=output == "file", workers=workers)
+            else:
+                results = [query.run(request, save=output == "file")]
+    except Exception as e:
+        return {"status": "error", "message": f"Error handling query: {e}"}, b""
+
+    # Describe each result, with the raw buffers one after another
+    headers = []
+    buffers = []
+    for response, result, path in results:
+        header = {"status": "ok" if result is not None else "error", "message": response}
+        if result is not None:
+            header.update({"shape": list(result.shape), "dtype": result.dtype.str})
+        if result is not None and output == "file":
+            header["path"] = path
+        elif result is not None:
+            data = np.ascontiguousarray(result).tobytes()
+            header["nbytes"] = len(data)
+            buffers.append(data)
+        headers.append(header)
+    payload = b"".join(buffers)
+    if "requests" not in request:
+        return {**headers[0], "field": query.field.name}, payload
+    header = {"status": "ok", "message": "Batch complete", "field": query.field.name, "results": headers}
+    header["nbytes"] = len(payload)
+    return header, payload
+
+
+def respond(session: Session, line: bytes, outstream) -> bool:
+    """
+    Handle one request line and write the response to a binary stream.
+    Returns False if the server should shut down.
+    """
+    header, payload = handle_line(session, line)
+    outstream.write(json.dumps(header).encode() + b"\n")
+    outstream.write(payload)
+    outstream.flush()
+    return header.get("command", None) != "shutdown"
+
+
+def serve_stream(session: Session, instream=None, outstream=None):
+    """
+    Serve line-delimited requests from a binary stream until it ends or a shutdown command.
+
+    Parameters
+    ----------
+    session : Session
+        Session of the loaded flow fields.
+    instream : BinaryIO, optional
+        Stream of requests, by default stdin.
+    outstream : BinaryIO, optional
+        Stream of responses, by default stdout.
+    """
+    instream = sys.stdin.buffer if instream is None else instream
+    outstream = sys.stdout.buffer if outstream is None else outstream
+    for line in instream:
+        if not line.strip():
+            continue
+        if not respond(session, line, outstream):
+            break
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Serve the line-delimited requests of one socket connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            if not respond(self.server.session, line, self.wfile):
+                self.server.running = False
+                break
+
+
+def serve_socket(session: Session, path: str):
+    """
+    Serve line-delimited requests on a Unix socket until a shutdown command.
+    Connections are served one after another.
+
+    Parameters
+    ----------
+    session : Session
+        Session of the loaded flow fields.
+    path : str
+        Path of the socket file, replaced if it exists.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    server = socketserver.UnixStreamServer(path, RequestHandler)
+    server.session = session
+    server.running = True
+    try:
+        while server.running:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(path)
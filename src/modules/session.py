@@ -0,0 +1,100 @@
+"""
+Session of flow fields kept loaded in memory, to query several fields from one process.
+
+Fields are loaded by name on first use and routed to by the `"field"` key of a request.
+When the loaded fields take more memory than the session budget,
+the least recently used ones are unloaded.
+"""
+import threading
+from collections import OrderedDict
+from modules.flow_field import FlowField
+from modules.query import Query
+
+MEMORY_LIMIT = 4096  # Default memory budget of the loaded fields in MB
+
+
+class Session:
+    """
+    Registry of loaded flow fields, each with its own `Query`, evicting the least recently used.
+    """
+
+    def __init__(self, memory_limit: float = MEMORY_LIMIT):
+        """
+        Start an empty session.
+
+        Parameters
+        ----------
+        memory_limit : float, optional
+            Memory budget of the loaded fields in MB, by default `MEMORY_LIMIT`.
+            The most recently used field is kept loaded even if it alone exceeds the budget.
+        """
+        if not isinstance(memory_limit, (int, float)) or memory_limit <= 0:
+            raise ValueError("Memory limit must be a positive number")
+        self.memory_limit = memory_limit
+        self.queries = OrderedDict()  # Query of each loaded field by name, least recently used first
+        self.default = None  # Name of the field queried if a request does not name one
+        self.lock = threading.Lock()
+
+    def add(self, field: FlowField):
+        """Add a loaded field to the session, replacing a field of the same name."""
+        query = Query(field)
+        with self.lock:
+            self.queries[field.name] = query
+            self.queries.move_to_end(field.name)
+            if self.default is None:
+                self.default = field.name
+            self.evict()
+        return query
+
+    def get(self, name: str = None):
+        """
+        Get the query handler of a field, loading the field if needed.
+
+        Parameters
+        ----------
+        name : str, optional
+            Name of the field, by default the first field added.
+
+        Returns
+        -------
+        Query
+            Query handler of the field.
+        """
+        name = self.default if name is None else name
+        if name is None:
+            raise ValueError("No field is loaded")
+        with self.lock:
+            if name in self.queries:
+                self.queries.move_to_end(name)
+                return self.queries[name]
+        return self.add(FlowField.load(name))
+
+    def nbytes(self):
+        """Get the memory footprint of the loaded fields in bytes."""
+        return sum(query.field.nbytes() for query in self.queries.values())
+
+    def evict(self):
+        """Unload the least recently used fields until the session is within its memory budget."""
+        while len(self.queries) > 1 and self.nbytes() > self.memory_limit * 1024**2:
+            name, _ = self.queries.popitem(last=False)
+            FlowField.print(f"Unloaded field '{name}'")
+
+    def handle_request(self, request: str, format="string"):
+        """
+        Handle a query request, or a batch of requests, on the field named by its `"field"` key,
+        see `Query.handle_request`.
+
+        Parameters
+        ----------
+        request : str
+            Query request string or file name.
+        format : str, optional
+            Format of request, by default "string"
+
+        Returns
+        -------
+        response : str
+            Response message.
+        """
+        request = Query.parse_request(request, format)
+        return self.get(request.get("field", None)).respond(request)
@@ -0,0 +1,101 @@
+"""
+Stretching functions of non-uniform meshgrid axes, clustering grid points near the bounds
+like CFD meshes do near walls.
+
+A stretching function maps evenly spaced values `s` in [0, 1] to [0, 1], clustering points near 0.
+It takes the values, a stretching factor, and the number of cells it spans,
+and must map 0 to 0 and 1 to 1. Points are clustered near the high bound, or both bounds,
+by mirroring the function (see `axis_coords`).
+
+You can define your own stretching function here, as long as it takes these arguments.
+"""
+
+import numpy as np
+
+CLUSTERS = ["low", "high", "both"]
+
+
+def get_func(func_name):
+    """
+    Get the function object by its name.
+    Don't change this function unless you know what you're doing.
+    """
+    func = globals().get(func_name, None)
+    if func_name in ["get_func", "axis_coords"] or not callable(func):
+        raise ValueError(f"Stretching function \"{func_name}\" is not defined.")
+    return func
+
+
+def axis_coords(low: float, high: float, num: int, stretch: str = "tanh", factor: float = 2.0, cluster: str = "both"):
+    """
+    Generate the coordinates of a stretched axis.
+
+    Parameters
+    ----------
+    low : float
+        Lower bound of the axis.
+    high : float
+        Upper bound of the axis.
+    num : int
+        Number of grid points, at least 2.
+    stretch : str, optional
+        Name of the stretching function, by default "tanh".
+    factor : float, optional
+        Stretching factor, larger values cluster more points near the bounds, by default 2.0.
+    cluster : str, optional
+        Where to cluster points, "low", "high" or "both" bounds, by default "both".
+
+    Returns
+    -------
+    np.ndarray
+        Increasing coordinates from `low` to `high`.
+    """
+    func = get_func(stretch)
+    if not isinstance(num, int) or num < 2:
+        raise ValueError("Number of grid points of a stretched axis must be an integer of at least 2")
+    if not isinstance(factor, (int, float)) or factor <= 0:
+        raise ValueError("Stretching factor must be a positive number")
+    if cluster not in CLUSTERS:
+        raise ValueError(f"Cluster must be one of {CLUSTERS}")
+    if not low < high:
+        raise ValueError("Low bound of a stretched axis must be less than its high bound")
+
+    s = np.linspace(0, 1, num)
+    if cluster == "low":
+        mapped = func(s, factor, num - 1)
+    elif cluster == "high":
+        mapped = 1 - func(1 - s, factor, num - 1)
+    else:
+        # Mirrored halves, each spanning half of the cells
+        half = np.minimum(s, 1 - s) * 2
+        mapped = func(half, factor, (num - 1) / 2) / 2
+        mapped = np.where(s <= 0.5, mapped, 1 - mapped)
+
+    coords = low + (high - low) * mapped
+    coords[0], coords[-1] = low, high
+    return coords
+
+
+# Put your custom stretching functions below
+
+def uniform(s, factor, cells):
+    """
+    Evenly spaced points, without stretching.
+    """
+    return s
+
+
+def tanh(s, factor, cells):
+    """
+    Hyperbolic tangent stretching, common for wall-bounded flows.
+    """
+    return 1 + np.tanh(factor * (s - 1)) / np.tanh(factor)
+
+
+def geometric(s, factor, cells):
+    """
+    Cell sizes growing by a constant ratio `factor` from one cell to the next.
+    """
+    if factor == 1:
+        return s
+    return (factor ** (s * cells) - 1) / (factor**cells - 1)
@@ -15,16 +15,18 @@ def is_not_negative(number):
     return isinstance(number, (int, float)) and number >= 0
 
 
-def stoch_round(numbers):
+def stoch_round(numbers, rng=None):
     """
     Stochastic rounding
     Round numbers to the nearest integer with a probability equal to the fractional part.
+    Random numbers are drawn from `rng` (a `np.random.Generator`), by default the global random state.
     """
+    rng = np.random if rng is None else rng
     fractional, whole = np.modf(numbers)
-    return whole.astype(int) + (np.random.rand(*numbers.shape) < fractional)
+    return whole.astype(int) + (rng.random(numbers.shape) < fractional)
 
 
-def random_unit_vectors(n):
+def random_unit_vectors(n, rng=None):
     """
     Generate evently distributed random unit vectors on the sphere.
 
@@ -32,6 +34,8 @@ def random_unit_vectors(n):
     ----------
     n : int
         Number of vectors to generate.
+    rng : np.random.Generator, optional
+        Generator to draw from, by default the global random state.
 
     Returns
     -------
@@ -39,8 +43,9 @@ def random_unit_vectors(n):
         Array of shape (n, 3) containing the unit vectors.
     """
     # Generate random directions.
-    phi = 2 * np.pi * np.random.rand(n)  # Azimuthal angles
-    theta = np.arccos(2 * np.random.rand(n) - 1)  # Polar angles
+    rng = np.random if rng is None else rng
+    phi = 2 * np.pi * rng.random(n)  # Azimuthal angles
+    theta = np.arccos(2 * rng.random(n) - 1)  # Polar angles
 
     # Convert to Cartesian coordinates.
     x = np.sin(theta) * np.cos(phi)
@@ -1,4 +1,5 @@
 import os
+import shutil
 import glob
 import pytest
 import numpy as np
@@ -6,6 +7,8 @@ from modules.eddy_profile import EddyProfile
 from modules.flow_field import FlowField
 from modules import file_io
 from modules import shape_function
+from modules import result_cache
+from modules.query import Query
 import main
 
 RTOL = 1e-5
@@ -43,12 +46,16 @@ def setup_module():
     # Save field
     field.save()
 
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
+
     yield
 
     # Clean up
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
     shape_function.set_cutoff(2.0)
     os.remove("src/profiles/test_system_eddy_profile.json")
-    os.remove("src/fields/test_system_eddy_field.pkl")
+    shutil.rmtree("src/fields/test_system_eddy_field")
     os.remove("src/queries/test_system_eddy_query.json")
     for file in glob.glob("src/results/test_system_eddy_*"):
         os.remove(file)
@@ -1,8 +1,11 @@
 import os
+import shutil
 import glob
 import pytest
 import numpy as np
 from modules import file_io
+from modules import result_cache
+from modules.query import Query
 import main
 
 AVG_VEL = 2.5
@@ -52,10 +55,14 @@ def setup_module():
     }
     file_io.write("queries", "test_system_field_query", query_content, "json")
 
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
+
     yield
 
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
     os.remove("src/profiles/test_system_field_profile.json")
-    os.remove("src/fields/test_system_field_field.pkl")
+    shutil.rmtree("src/fields/test_system_field_field")
     os.remove("src/queries/test_system_field_query.json")
     for file in glob.glob("src/results/test_system_field_*"):
         os.remove(file)
@@ -1,6 +1,9 @@
 import os
+import shutil
 import pytest
 from modules import file_io
+from modules import result_cache
+from modules.query import Query
 import main
 
 
@@ -31,10 +34,14 @@ def setup_module():
         ]
     )
 
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
+
     yield
 
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
     os.remove("src/profiles/test_system_input_profile.json")
-    os.remove("src/fields/test_system_input_field.pkl")
+    shutil.rmtree("src/fields/test_system_input_field")
 
 
 @pytest.mark.system
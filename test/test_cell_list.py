@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+import pickle
+from modules.cell_list import CellList
+from modules import parallel
+
+
+def within_box(centers, margins, low, high):
+    """Brute force culling, same as FlowField.within_margin on each axis"""
+    margins = margins[:, np.newaxis]
+    return np.flatnonzero(np.all((centers < high + margins) & (centers > low - margins), axis=1))
+
+
+@pytest.mark.unit
+def test_cell_list():
+    """Test the cell list returns the same eddies as masking all eddies"""
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-5, 5, (5000, 3))
+    margins = rng.choice([0.05, 0.3, 2.0], 5000)
+
+    # Uneven chunks along each axis, the last one is longer as in FlowField.chunk_split
+    coords = np.arange(-4, 4.001, 0.1)
+    bounds = [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, len(coords)]
+    edges = [[coords[bounds[c]], coords[bounds[c + 1] - 1]] for c in range(len(bounds) - 1)]
+    index = CellList(centers, margins, [edges, edges, edges])
+
+    for i, j, k in [(0, 0, 0), (3, 7, 11), (15, 15, 15), (8, 0, 15)]:
+        low = np.array([edges[i][0], edges[j][0], edges[k][0]])
+        high = np.array([edges[i][1], edges[j][1], edges[k][1]])
+        expected = within_box(centers, margins, low, high)
+        assert np.array_equal(index.slab(i).query(j, k), expected)
+
+    # Slab query spans the whole y-z plane
+    low = np.array([edges[4][0], -np.inf, -np.inf])
+    high = np.array([edges[4][1], np.inf, np.inf])
+    assert np.array_equal(index.query_slab(4), within_box(centers, margins, low, high))
+
+
+@pytest.mark.unit
+def test_cell_list_empty():
+    """Test the cell list without any eddies"""
+    index = CellList(np.empty((0, 3)), np.empty(0), [[[0, 1]], [[0, 1]], [[0, 1]]])
+    assert len(index.query_slab(0)) == 0
+    assert len(index.slab(0).query(0, 0)) == 0
+
+
+@pytest.mark.unit
+def test_cell_list_split():
+    """Test a cell list split for the process backend pickles without its arrays and joins back the same"""
+    rng = np.random.default_rng(1)
+    centers = rng.uniform(-5, 5, (5000, 3))
+    margins = rng.choice([0.3, 2.0], 5000)
+    edges = [[c, c + 0.9] for c in np.arange(-4, 4, 1.0)]
+    index = CellList(centers, margins, [edges, edges, edges])
+
+    light, arrays = parallel.split_index(index, "index_0")
+    assert len(pickle.dumps(light)) < index.start.nbytes / 10
+    assert index.start is not None and len(arrays) == 2 + 2 * len(index.groups)
+    parallel.join_index(light, {key: array.copy() for key, array in arrays.items()}, "index_0")
+    for i in range(len(edges)):
+        assert np.array_equal(light.query_slab(i), index.query_slab(i))
+        assert np.array_equal(light.slab(i).query(3, 4), index.slab(i).query(3, 4))
@@ -1,5 +1,7 @@
 import pytest
 import os
+import glob
+import numpy as np
 from unittest.mock import patch, mock_open
 import modules.file_io as file_io
 
@@ -84,3 +86,71 @@ def test_file_io_clear_fail():
         mock_remove.side_effect = OSError
         with pytest.raises(file_io.FailToWrite):
             file_io.clear(sub_dir)
+
+
+@pytest.mark.unit
+def test_file_io_read_points():
+    """Test opening point coordinates from .npy and .csv files"""
+    sub_dir = "queries"
+    points = np.arange(30, dtype=float).reshape(10, 3) / 7
+
+    # .npy file is memory-mapped
+    np.save(f"./src/{sub_dir}/__points__.npy", points)
+    points_read = file_io.read_points(sub_dir, "__points__.npy")
+    assert isinstance(points_read, np.memmap)
+    assert np.array_equal(points_read, points)
+    del points_read
+
+    # .csv file is converted in batches, comments and blank lines are skipped
+    with open(f"./src/{sub_dir}/__points__.csv", "w") as file:
+        file.write("# x,y,z\n")
+        file.writelines(f"{x!r},{y!r},{z!r}\n" for x, y, z in points.tolist())
+        file.write("\n")
+    points_read = file_io.read_points(sub_dir, "__points__.csv", batch_size=3)
+    assert np.array_equal(points_read, points)
+    converted = points_read.filename
+    del points_read
+
+    # Converted once, again only if the file changes
+    mtime = os.stat(converted).st_mtime_ns
+    assert file_io.read_points(sub_dir, "__points__.csv").filename == converted
+    assert os.stat(converted).st_mtime_ns == mtime
+    with open(f"./src/{sub_dir}/__points__.csv", "a") as file:
+        file.write("1,2,3\n")
+    points_read = file_io.read_points(sub_dir, "__points__.csv")
+    assert points_read.filename != converted and np.array_equal(points_read[-1], [1, 2, 3])
+    del points_read
+
+    # File changed between counting and parsing the points
+    real_open = open
+
+    def changing_open(file, *args, **kwargs):
+        stream = real_open(file, *args, **kwargs)
+        if str(file).endswith("__changed__.csv"):
+            if changing_open.calls == 1:
+                stream.readline()
+            changing_open.calls += 1
+        return stream
+
+    changing_open.calls = 0
+    with open(f"./src/{sub_dir}/__changed__.csv", "w") as file:
+        file.write("0,0,0\n1,1,1\n")
+    with patch("builtins.open", changing_open), pytest.raises(file_io.FailToRead, match="changed"):
+        file_io.read_points(sub_dir, "__changed__.csv")
+    os.remove(f"./src/{sub_dir}/__changed__.csv")
+
+    # Wrong number of columns
+    np.save(f"./src/{sub_dir}/__points__.npy", points.reshape(15, 2))
+    with pytest.raises(file_io.FailToRead):
+        file_io.read_points(sub_dir, "__points__.npy")
+
+    # Unsupported format
+    with pytest.raises(file_io.FailToRead):
+        file_io.read_points(sub_dir, "__points__.txt")
+
+    # Clean up
+    os.remove(f"./src/{sub_dir}/__points__.npy")
+    os.remove(f"./src/{sub_dir}/__points__.csv")
+    for file in glob.glob("./src/.cache/__points___*.npy"):
+        os.remove(file)
+    assert not glob.glob("./src/.cache/__changed___*")
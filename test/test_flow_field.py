@@ -1,6 +1,11 @@
 import os
+import shutil
 import numpy as np
+import modules.eddy as eddy
+import modules.flow_field as flow_field
 import modules.file_io as file_io
+import modules.shape_function as shape_function
+import modules.stretching as stretching
 from modules.eddy_profile import EddyProfile
 from modules.flow_field import FlowField
 import pytest
@@ -19,7 +24,7 @@ def setup_module():
 
     # Clean up
     os.remove("src/profiles/__test__.json")
-    os.remove("src/fields/test_field.pkl")
+    shutil.rmtree("src/fields/test_field")
 
 
 @pytest.mark.slow
@@ -221,9 +226,9 @@ def test_flow_field():
         rtol=RTOL,
     )
 
-    # Correct variant intensities
+    # Correct variant intensities, saved eddies are sorted by brick instead of variant
     assert np.isclose(
-        np.linalg.norm(field.alpha[variant_quantity[0] - 1]),
+        np.linalg.norm(field.alpha[field.sigma == profile.get_length_scale(0)][-1]),
         profile.get_intensity(0),
         rtol=RTOL,
     )
@@ -274,19 +279,635 @@ def test_flow_field():
 
 @pytest.mark.unit
 def test_flow_field_parallel():
+    """Test multiple threads return the same velocity field as a single thread"""
     field: FlowField = FlowField.load("test_field")
-    field.sum_vel_mesh(
+    kwargs = dict(
         step_size=0.2,
         chunk_size=5,
         low_bounds=[-10, -10, -10],
         high_bounds=[10, 10, 10],
         time=0,
-        threads=4,
     )
+    vel_single = field.sum_vel_mesh(threads=1, **kwargs)
+    vel_threads = field.sum_vel_mesh(threads=4, **kwargs)
+    assert np.array_equal(vel_single, vel_threads)
 
-    # Check for number of chunk cache files created
-    expected_files = 20 / 0.2 // 5
-    assert len([f for f in os.listdir("src/.cache") if "x_" in f]) == expected_files
+    # No chunk cache files are written
+    assert len([f for f in os.listdir("src/.cache") if "x_" in f]) == 0
+
+
+@pytest.mark.unit
+def test_flow_field_process():
+    """Test the process backend gives the same velocity field as the thread backend"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.2,
+        chunk_size=5,
+        low_bounds=[-10, -10, -3],
+        high_bounds=[10, 10, 3],
+        time=1.5,
+        threads=2,
+    )
+    vel_thread = field.sum_vel_mesh(backend="thread", **kwargs)
+    vel_process = field.sum_vel_mesh(backend="process", **kwargs)
+    assert np.array_equal(vel_thread, vel_process)
+
+    # Invalid backend
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh(backend="invalid", **kwargs)
+
+
+@pytest.mark.unit
+def test_flow_field_out_file():
+    """Test writing the velocity field to a memory-mapped file, with threads and processes"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.2,
+        chunk_size=5,
+        low_bounds=[-10, -10, -3],
+        high_bounds=[10, 10, 3],
+        time=1.5,
+    )
+    vel = field.sum_vel_mesh(**kwargs)
+    for threads, backend in [(1, "thread"), (2, "thread"), (2, "process")]:
+        vel_file = field.sum_vel_mesh(threads=threads, backend=backend, out_file="__test_memmap__", **kwargs)
+        assert isinstance(vel_file, np.memmap)
+        assert np.array_equal(vel, file_io.read("results", "__test_memmap__", "npy"))
+        del vel_file
+
+    os.remove("src/results/__test_memmap__.npy")
+
+
+@pytest.mark.unit
+def test_flow_field_auto_chunk():
+    """Test automatic chunk sizes give the same velocities and follow the memory limit"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.2,
+        low_bounds=[-10, -10, -3],
+        high_bounds=[10, 10, 3],
+        time=1.5,
+    )
+    vel = field.sum_vel_mesh(chunk_size=5, **kwargs)
+    vel_auto = field.sum_vel_mesh(chunk_size="auto", **kwargs)
+    assert np.allclose(vel, vel_auto, rtol=RTOL, atol=RTOL)
+
+    margins = field.sigma * 2.4
+    # Tiny memory limit gives the smallest chunks
+    assert np.all(field.auto_chunk_size(margins, [101, 101, 31], 0.2, 1e-6) == 1)
+    # A flat axis is never chunked beyond its single point
+    sizes = field.auto_chunk_size(margins, [101, 101, 1], 0.2, 256)
+    assert sizes[2] == 1 and sizes[0] > 1
+    # Sizes are chosen along each axis, up to the whole axis
+    sizes = field.auto_chunk_size(margins, [101, 101, 31], 0.2, 256)
+    assert np.all(sizes <= [101, 101, 31])
+    # The separable kernel prefers larger chunks
+    separable = field.auto_chunk_size(margins, [101, 101, 31], 0.2, 256, "separable")
+    assert np.prod(separable) >= np.prod(sizes)
+
+
+@pytest.mark.unit
+def test_flow_field_variants():
+    """Test computing each eddy variant in its own pass gives the velocities of all eddies at once"""
+    field: FlowField = FlowField.load("test_field")
+    low_bounds = np.array([-3.0, -3.0, -1.0])
+    high_bounds = np.array([3.0, 3.0, 1.0])
+    vel = field.sum_vel_mesh(low_bounds, high_bounds, step_size=0.5, chunk_size="auto", time=1.5)
+
+    centers, alpha, sigma = field.get_wrap_arounds(1.5, high_bounds, low_bounds)
+    assert len(np.unique(sigma)) > 1
+    coords = [np.arange(low, high + 0.25, 0.5) for low, high in zip(low_bounds, high_bounds)]
+    expected = eddy.sum_vel_chunk(centers, sigma, alpha, *coords)
+    expected[..., 0] += field.avg_vel
+    assert np.allclose(vel, expected, rtol=RTOL, atol=RTOL)
+
+
+@pytest.mark.unit
+def test_flow_field_series():
+    """Test a series of times gives the same velocities as querying each time separately"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.25,
+        chunk_size="auto",
+        low_bounds=[-3, -3, -1],
+        high_bounds=[3, 3, 1],
+    )
+    times = [0, 1.5, 0.5, 7.25]
+    expected = np.stack([field.sum_vel_mesh(time=t, **kwargs) for t in times])
+    assert np.array_equal(field.sum_vel_mesh_series(times, **kwargs), expected)
+
+    # Process backend writing into a memory-mapped file, one frame at a time
+    vel = field.sum_vel_mesh_series(times, threads=2, backend="process", out_file="__test_series__", **kwargs)
+    assert vel.shape == (len(times), 25, 25, 9, 3)
+    assert np.array_equal(vel, expected)
+    del vel
+    os.remove("src/results/__test_series__.npy")
+
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh_series([], **kwargs)
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh_series([0, -1], **kwargs)
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh_series([["a"]], **kwargs)
+
+
+@pytest.mark.unit
+def test_flow_field_series_shift():
+    """Test shifting the previous time step gives the same velocities as calculating the whole field"""
+    field: FlowField = FlowField.load("test_field")
+    field.set_avg_vel(2.0)
+    assert field.can_shift()
+    kwargs = dict(
+        step_size=0.25,
+        chunk_size="auto",
+        low_bounds=[-10, -3, -1],
+        high_bounds=[10, 3, 1],
+    )
+    # Steps of one and two grid points, no movement, a step that is not a multiple of the step size,
+    # and the start of a new flow iteration (avg_vel * t = Lx / 2)
+    times = [4.5, 4.625, 4.875, 4.875, 4.9, 5.025, 5.15]
+    vel_shift = field.sum_vel_mesh_series(times, **kwargs)
+    vel_full = field.sum_vel_mesh_series(times, reuse=False, **kwargs)
+    assert np.allclose(vel_shift, vel_full, rtol=RTOL, atol=RTOL)
+
+    # The same with the process backend and a memory-mapped file
+    vel_file = field.sum_vel_mesh_series(times, threads=2, backend="process", out_file="__test_series__", **kwargs)
+    assert np.allclose(vel_file, vel_full, rtol=RTOL, atol=RTOL)
+    del vel_file
+    os.remove("src/results/__test_series__.npy")
+
+
+@pytest.mark.unit
+def test_flow_field_points():
+    """Test batched point queries give the same velocities as the meshgrid at the same points"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.5,
+        low_bounds=[-3, -3, -1],
+        high_bounds=[3, 3, 1],
+        time=1.5,
+    )
+    vel_mesh = field.sum_vel_mesh(**kwargs)
+    coords = np.stack(
+        np.meshgrid(*[np.arange(-3, 3.25, 0.5), np.arange(-3, 3.25, 0.5), np.arange(-1, 1.25, 0.5)], indexing="ij"),
+        axis=-1,
+    ).reshape(-1, 3)
+    # Shuffle the points and use small batches, results must come back in the order of the input
+    rng = np.random.default_rng(0)
+    shuffle = rng.permutation(len(coords))
+    vel_points = field.sum_vel_points(coords[shuffle], time=1.5, batch_size=50)
+    assert np.allclose(vel_points, vel_mesh.reshape(-1, 3)[shuffle], rtol=RTOL, atol=RTOL)
+
+    # Points from a memory-mapped array, written batch by batch into a memory-mapped result
+    np.save("src/results/__points__.npy", coords[shuffle])
+    points = np.load("src/results/__points__.npy", mmap_mode="r")
+    vel_file = field.sum_vel_points(points, time=1.5, batch_size=50, out_file="__test_points__")
+    assert isinstance(vel_file, np.memmap)
+    assert np.array_equal(vel_file, vel_points)
+    del points, vel_file
+    os.remove("src/results/__points__.npy")
+    os.remove("src/results/__test_points__.npy")
+
+    # A single point as list
+    vel_point = field.sum_vel_points([[2, 1.5, 2.1]], time=1.5)
+    vel_mesh = field.sum_vel_mesh([2, 1.5, 2.1], [2, 1.5, 2.1], time=1.5)
+    assert np.allclose(vel_point, vel_mesh.reshape(-1, 3), rtol=RTOL, atol=RTOL)
+
+    # Invalid coordinates, time and batch size
+    with pytest.raises(ValueError):
+        field.sum_vel_points([["a", 0, 0]])
+    with pytest.raises(ValueError):
+        field.sum_vel_points([0, 0, 0])
+    with pytest.raises(ValueError):
+        field.sum_vel_points([[0, 0, 100]])
+    with pytest.raises(ValueError):
+        field.sum_vel_points([[0, 0, 0]], time=-1)
+    with pytest.raises(ValueError):
+        field.sum_vel_points([[0, 0, 0]], batch_size=0)
+
+
+@pytest.mark.unit
+def test_flow_field_prefetch():
+    """Test queries within a prefetched region give the same velocities as without"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(step_size=0.5, low_bounds=[-3, -3, -1], high_bounds=[3, 3, 1], time=3.5)
+    coords = [[0, 1, 0], [2, 1.5, 0.5], [-2.5, -3, -1]]
+    vel_mesh = field.sum_vel_mesh(**kwargs)
+    vel_points = field.sum_vel_points(coords, time=3.5)
+    centers, alpha, sigma = field.get_wrap_arounds(3.5, np.array([3, 3, 1]), np.array([-3, -3, -1]))
+
+    field.prefetch(3.5, np.array([4, 4, 2]), np.array([-4, -4, -2]), index=True)
+    assert len(field.get_prefetched(3.5, np.array([4, 4, 2]), np.array([-4, -4, -2]))["variants"]) > 0
+
+    # The same eddies, sorted by length scale
+    order = np.argsort(sigma, kind="stable")
+    prefetched = field.get_wrap_arounds(3.5, np.array([3, 3, 1]), np.array([-3, -3, -1]))
+    for a, b in zip(prefetched, [centers[order], alpha[order], sigma[order]]):
+        assert np.array_equal(a, b)
+    assert np.array_equal(field.sum_vel_mesh(**kwargs), vel_mesh)
+    assert np.allclose(field.sum_vel_points(coords, time=3.5), vel_points, rtol=RTOL, atol=RTOL)
+
+    # Not within the region or at another time
+    assert field.get_prefetched(3.5, np.array([5, 4, 2]), np.array([-4, -4, -2])) is None
+    assert field.get_prefetched(3.0, np.array([3, 3, 1]), np.array([-3, -3, -1])) is None
+    field.clear_prefetched()
+    assert field.get_prefetched(3.5, np.array([3, 3, 1]), np.array([-3, -3, -1])) is None
+
+
+@pytest.mark.unit
+def test_flow_field_iterations():
+    """Test random flow iterations are reproducible from the field seed and kept in a bounded cache"""
+    field: FlowField = FlowField.load("test_field")
+    n = int(field.N)
+    y, z = field.get_eddy_yz(-4)
+    assert y.shape == z.shape == (n,) and np.all(np.abs(y) <= 10) and np.all(np.abs(z) <= 10)
+    assert not np.array_equal(y, field.get_eddy_yz(4)[0]) and -4 not in field.y
+
+    # Same coordinates in another process, or for a range of eddies
+    other: FlowField = FlowField.load("test_field")
+    assert np.array_equal(other.get_eddy_yz(-4)[1], z)
+    part = slice(flow_field.STREAM_SIZE - 10, n - 5)
+    assert np.array_equal(other.get_eddy_yz(-4, part)[0], y[part])
+    assert len(other.get_eddy_yz(7, slice(n - 3, n))[0]) == 3
+
+    # Memory stays bounded over many flow iterations
+    blocks_per_iter = -(-n // flow_field.STREAM_SIZE)
+    for fi in range(3, 200):
+        field.get_eddy_centers(fi)
+    assert 0 < len(field.yz_blocks) * 16 * n / blocks_per_iter <= flow_field.YZ_CACHE_SIZE * 2**20 + 16 * n
+    assert list(field.y) == [0, 1, 2]
+
+    # A field directory stores its seed
+    shutil.copytree("src/fields/test_field", "src/fields/__test_seedless__")
+    meta = file_io.read("fields/__test_seedless__", "field", "json")
+    del meta["seed"]
+    file_io.write("fields/__test_seedless__", "field", meta, "json")
+    with pytest.raises(file_io.FailToRead, match="no seed"):
+        FlowField.load("__test_seedless__")
+    shutil.rmtree("src/fields/__test_seedless__")
+
+    # A field pickled before seeds were stored keeps a drawn seed in memory, until it is converted
+    field = FlowField.load("test_field")
+    field.name = "__test_seedless__"
+    del field.seed
+    file_io.write("fields", "__test_seedless__", field, "obj")
+    field = FlowField.load("__test_seedless__")
+    y = field.get_eddy_yz(5)[0]
+    assert np.array_equal(field.get_eddy_yz(5)[0], y)
+    assert not field.seed_stored() and field.fingerprint() == meta["fingerprint"]
+    field.set_avg_vel(2.0)
+    assert field.derived_iterations([0, 50]) and not field.derived_iterations([0])
+    converted = FlowField.convert("__test_seedless__")
+    assert converted.seed_stored() and FlowField.load("__test_seedless__").seed == converted.seed
+    y = converted.get_eddy_yz(5)[0]
+    assert np.array_equal(FlowField.load("__test_seedless__").get_eddy_yz(5)[0], y)
+    shutil.rmtree("src/fields/__test_seedless__")
+
+
+@pytest.mark.unit
+def test_flow_field_axes():
+    """Test non-uniform axes give the same velocities as the points of the meshgrid"""
+    field: FlowField = FlowField.load("test_field")
+    y_coords = [-3, -2.5, -1, 0.2, 2, 3]
+    axes = {"y": y_coords, "z": {"num": 9, "stretch": "tanh", "factor": 2.0}}
+    kwargs = dict(low_bounds=[-2, -3, -1], high_bounds=[2, 3, 1], step_size=0.5, time=1.5, axes=axes)
+    vel = field.sum_vel_mesh(chunk_size="auto", **kwargs)
+    assert vel.shape == (9, 6, 9, 3)
+
+    z_coords = stretching.axis_coords(-1, 1, 9)
+    points = np.stack(np.meshgrid(np.arange(-2, 2.5, 0.5), y_coords, z_coords, indexing="ij"), axis=-1)
+    expected = field.sum_vel_points(points.reshape(-1, 3), time=1.5).reshape(vel.shape)
+    assert np.allclose(vel, expected, rtol=RTOL, atol=RTOL)
+    for kernel in ["splat", "separable"]:
+        assert np.allclose(field.sum_vel_mesh(kernel=kernel, **kwargs), vel, rtol=RTOL, atol=RTOL)
+
+    # Time steps of a series are only shifted along evenly spaced x coordinates
+    for x_coords in [np.arange(-2, 2.5, 0.5), [-2, -1, 0.5, 2]]:
+        series_kwargs = {**kwargs, "axes": {**axes, "x": x_coords}}
+        series_kwargs.pop("time")
+        series = field.sum_vel_mesh_series([1.0, 1.5], **series_kwargs)
+        assert np.allclose(series[1], field.sum_vel_mesh(**{**series_kwargs, "time": 1.5}), rtol=RTOL, atol=RTOL)
+
+    # Invalid axes
+    for axes in [{"w": [0]}, {"y": [1, 0]}, {"y": []}, {"y": ["a"]}, {"y": [-100, 0]}, {"y": {"size": 4}}]:
+        with pytest.raises(ValueError):
+            field.sum_vel_mesh(**{**kwargs, "axes": axes})
+
+
+@pytest.mark.unit
+def test_flow_field_storage():
+    """Test saving and loading a field directory, and converting a pickled field"""
+    field: FlowField = FlowField.load("test_field")
+    assert isinstance(field.init_x, np.memmap) and not field.init_x.flags.writeable
+    assert field.sigma.dtype == np.float64
+    assert np.load("src/fields/test_field/variant.npy").dtype == np.uint8
+    # Flow iterations sharing eddy positions (zero average velocity) are stored once
+    assert field.y[1] is field.y[0] and not os.path.exists("src/fields/test_field/y_1.npy")
+    # Memory-mapped arrays are not held in memory, derived flow iterations and expanded length scales are
+    held = field.nbytes()
+    assert field.sigma.nbytes <= held < field.sigma.nbytes + 1024
+    field.get_eddy_yz(5)
+    assert field.nbytes() == held + 16 * field.N
+
+    # Same eddies and velocities after a save and load under another name, new flow iterations included
+    field.name = "__test_storage__"
+    field.set_avg_vel(2.0)
+    field.get_eddy_centers(5)
+    field.save()
+    loaded: FlowField = FlowField.load("__test_storage__")
+    assert loaded.fingerprint() == FlowField.load("test_field").fingerprint()
+    assert np.array_equal(loaded.get_eddy_yz(5)[0], field.get_eddy_yz(5)[0]) and loaded.avg_vel == 2.0
+    assert not os.path.exists("src/fields/__test_storage__/y_5.npy")
+    kwargs = dict(low_bounds=[-2, -2, 0], high_bounds=[2, 2, 0], step_size=0.5, time=12)
+    assert np.array_equal(loaded.sum_vel_mesh(**kwargs), field.sum_vel_mesh(**kwargs))
+
+    # Saving over a loaded field keeps its memory maps valid
+    loaded.save()
+    assert np.array_equal(loaded.alpha, field.alpha)
+
+    # A pickled field is read as it is, and converted to a field directory
+    shutil.rmtree("src/fields/__test_storage__")
+    file_io.write("fields", "__test_storage__", field, "obj")
+    assert FlowField.load("__test_storage__").fingerprint() == field.fingerprint()
+    FlowField.convert("__test_storage__")
+    assert not os.path.exists("src/fields/__test_storage__.pkl")
+    assert isinstance(FlowField.load("__test_storage__").alpha, np.memmap)
+    shutil.rmtree("src/fields/__test_storage__")
+
+    # Same velocities before and after a save, derived flow iterations included
+    field = FlowField(EddyProfile("__test__"), "__test_storage__", [8, 4, 4], avg_vel=1, seed=7)
+    kwargs = dict(low_bounds=[-4, -2, 0], high_bounds=[4, 2, 0], step_size=0.5, time=40.2)
+    vel = field.sum_vel_mesh(**kwargs)
+    field.save()
+    assert np.array_equal(field.sum_vel_mesh(**kwargs), vel)
+    assert np.allclose(FlowField.load("__test_storage__").sum_vel_mesh(**kwargs), vel, rtol=RTOL, atol=RTOL)
+    # Eddies of a field created before bricks are sorted in a copy only
+    field.init_x = field.init_x[::-1].copy()
+    field.bricks = None
+    init_x = field.init_x.copy()
+    field.save()
+    assert np.array_equal(field.init_x, init_x) and field.bricks is None
+    assert np.all(np.diff(FlowField.load("__test_storage__").init_x) >= -flow_field.BRICK_SIZE)
+    shutil.rmtree("src/fields/__test_storage__")
+
+    # Unknown format
+    file_io.write("fields/__test_storage__", "field", {"format": 0})
+    with pytest.raises(file_io.FailToRead, match="unknown format"):
+        FlowField.load("__test_storage__")
+    shutil.rmtree("src/fields/__test_storage__")
+
+
+@pytest.mark.unit
+def test_flow_field_bricks():
+    """Test queries reading only the bricks of eddies around them match those reading all eddies"""
+    field: FlowField = FlowField.load("test_field")
+    assert np.all(np.diff(field.init_x) >= -flow_field.BRICK_SIZE) and field.bricks["offsets"][-1] == field.N
+    part = field.brick_slice(-1, 1)
+    assert 0 < part.stop - part.start < field.N
+    reach = 1 + field.bricks["max_sigma"] * flow_field.CUTOFF + flow_field.BRICK_SIZE
+    assert np.all(np.abs(field.init_x[part]) <= reach)
+    # Length scales of a loaded field are expanded only when all of them are needed
+    assert "sigma" not in field.__dict__
+
+    whole: FlowField = FlowField.load("test_field")
+    whole.bricks = None
+    field.set_avg_vel(2.0)
+    whole.set_avg_vel(2.0)
+    kwargs = dict(low_bounds=[-1, -2, 0], high_bounds=[1, 2, 0], step_size=0.25)
+    for time in [0, 3.7, 26]:
+        assert np.allclose(field.sum_vel_mesh(**kwargs, time=time), whole.sum_vel_mesh(**kwargs, time=time))
+    coords = [[-9.9, 0, 0], [0, 9.9, -9.9], [9.9, 1, 2]]
+    assert np.allclose(field.sum_vel_points(coords, time=14), whole.sum_vel_points(coords, time=14))
+    assert "sigma" not in field.__dict__
+
+    # Eddies culled along y and z are reused for the same bricks at other times
+    yz_cache = {}
+    high_bounds, low_bounds = np.array([1, 2, 0]), np.array([-1, -2, 0])
+    field.get_wrap_arounds(3.7, high_bounds, low_bounds, yz_cache)
+    assert yz_cache and all(key[1] is not None for key in yz_cache)
+    for time in [3.75, 26]:
+        cached = field.get_wrap_arounds(time, high_bounds, low_bounds, yz_cache)
+        for a, b in zip(cached, field.get_wrap_arounds(time, high_bounds, low_bounds)):
+            assert np.array_equal(a, b)
+    series = field.sum_vel_mesh_series([0, 3.7, 26], **kwargs, reuse=False)
+    assert np.allclose(series[2], whole.sum_vel_mesh(**kwargs, time=26))
+
+    # Eddies replaced after a field is created are all read, not only those of the outdated bricks
+    field = FlowField(EddyProfile("__test__"), "__test_bricks__", [8, 4, 4], avg_vel=1, seed=5)
+    assert field.get_bricks() is not None
+    field.N = 1
+    field.init_x, field.sigma, field.alpha = np.array([1.2]), np.array([0.5]), np.array([[0, 0, 1.0]])
+    for fi in range(3):
+        field.y[fi], field.z[fi] = np.zeros(1), np.zeros(1)
+    assert field.get_bricks() is None and field.brick_slice(-1, 1) == slice(None)
+    coords = [[1.2, 0.5, 0], [-1, 0, 0.5]]
+    vel = field.sum_vel_points(coords)
+    del field.bricks
+    assert np.array_equal(field.sum_vel_points(coords), vel) and np.any(vel[0] != [1, 0, 0])
+
+
+@pytest.mark.unit
+def test_flow_field_generate(monkeypatch):
+    """Test generating a field block by block straight to its directory"""
+    profile = EddyProfile("__test__")
+    dimensions = [6.5, 4, 4]
+    field = FlowField.generate(profile, "__test_generate__", dimensions, avg_vel=1.0, block_size=1000)
+    assert isinstance(field.alpha, np.memmap) and field.N > 1000
+    assert field.N == np.sum(field.variant_quantity) == len(field.init_x) == len(field.y[2])
+    assert not os.path.exists("src/fields/.__test_generate__.tmp")
+
+    # Eddies sorted by brick, within the field, with the intensity of their variant
+    offsets = field.bricks["offsets"]
+    assert len(offsets) == 8 and offsets[-1] == field.N
+    for b in range(7):
+        x = field.init_x[offsets[b] : offsets[b + 1]]
+        assert np.all((x >= -3.25 + b * 6.5 / 7) & (x <= -3.25 + (b + 1) * 6.5 / 7))
+    assert np.all(np.abs(field.y[1]) <= 2) and not np.array_equal(field.y[1], field.y[0])
+    for i, length_scale in enumerate(field.variant_length_scale):
+        norms = np.linalg.norm(field.alpha[field.sigma == length_scale], axis=-1)
+        assert np.allclose(norms, profile.get_intensity(i), rtol=RTOL)
+
+    # Fingerprint of the whole arrays, same velocities after a save and load
+    digest = field.fingerprint()
+    field.digest = None
+    assert field.fingerprint() == digest
+    kwargs = dict(low_bounds=[-2, -1, 0], high_bounds=[2, 1, 0], step_size=0.5, time=1.3)
+    vel = field.sum_vel_mesh(**kwargs)
+    field.save()
+    assert np.array_equal(FlowField.load("__test_generate__").sum_vel_mesh(**kwargs), vel)
+
+    # Eddies moving with a mean velocity profile
+    field = FlowField.generate(profile, "__test_generate__", dimensions, avg_vel=1.0, x_vel_prof="parabola_2d")
+    assert not hasattr(field, "bricks") and list(field.y) == [0]
+    assert np.allclose(field.x_vel, 1 - (field.y[0] / 2) ** 2)
+    shutil.rmtree("src/fields/__test_generate__")
+
+    with pytest.raises(ValueError):
+        FlowField.generate(profile, "__test_generate__", dimensions, block_size=0)
+
+    # No partly generated field is left behind
+    def fail(*args):
+        raise MemoryError("worker failed")
+
+    monkeypatch.setattr(FlowField, "generate_block", fail)
+    with pytest.raises(MemoryError):
+        FlowField.generate(profile, "__test_generate__", dimensions)
+    assert not os.path.exists("src/fields/__test_generate__")
+    assert not [name for name in os.listdir("src/fields") if name.startswith(".__test_generate__")]
+    with pytest.raises(ValueError):
+        FlowField.generate(profile, "__test_generate__", [-1, 4, 4])
+
+
+@pytest.mark.unit
+def test_flow_field_generate_seed():
+    """Test fields are the same for a seed whatever the workers and block size"""
+    profile = EddyProfile("__test__")
+    dimensions = [20, 20, 20]
+    field = FlowField.generate(profile, "__test_generate__", dimensions, 1.0, seed=7, workers=1, block_size=1)
+    assert field.N > 2 * flow_field.STREAM_SIZE
+    arrays = [np.array(a) for a in (field.init_x, field.alpha, field.sigma_index, field.y[2], field.bricks["offsets"])]
+    digest = field.fingerprint()
+
+    field = FlowField.generate(profile, "__test_generate__", dimensions, 1.0, seed=7, workers=4, block_size=10**6)
+    for a, b in zip(arrays, [field.init_x, field.alpha, field.sigma_index, field.y[2], field.bricks["offsets"]]):
+        assert np.array_equal(a, b)
+    assert field.fingerprint() == digest and field.seed == 7
+    field = FlowField.generate(profile, "__test_generate__", dimensions, 1.0, seed=8)
+    assert field.fingerprint() != digest
+    shutil.rmtree("src/fields/__test_generate__")
+
+    # Fields created in memory too, the same as those generated for a seed
+    fields = [FlowField(profile, "__test_seed__", [4, 4, 4], 1.0, seed=3) for _ in range(2)]
+    assert fields[0].fingerprint() == fields[1].fingerprint()
+    for avg_vel, x_vel_prof in [(1.0, ""), (0, ""), (1.0, "parabola_2d")]:
+        field = FlowField(profile, "__test_seed__", [4, 4, 4], avg_vel, x_vel_prof, seed=3)
+        generated = FlowField.generate(profile, "__test_generate__", [4, 4, 4], avg_vel, x_vel_prof, seed=3, workers=2)
+        assert field.fingerprint() == generated.fingerprint() and sorted(field.y) == sorted(generated.y)
+        fi = max(field.y)
+        assert np.array_equal(field.sigma, generated.sigma) and np.array_equal(field.y[fi], generated.y[fi])
+        if not x_vel_prof:
+            assert np.array_equal(field.get_bricks()["offsets"], generated.get_bricks()["offsets"])
+        kwargs = dict(low_bounds=[-2, -1, 0], high_bounds=[2, 1, 0], step_size=0.5, time=7.3)
+        assert np.array_equal(field.sum_vel_mesh(**kwargs), generated.sum_vel_mesh(**kwargs))
+    shutil.rmtree("src/fields/__test_generate__")
+
+    for kwargs in [{"seed": -1}, {"seed": 1.5}, {"workers": 0}]:
+        with pytest.raises(ValueError):
+            FlowField.generate(profile, "__test_generate__", dimensions, **kwargs)
+
+
+@pytest.mark.unit
+def test_flow_field_section():
+    """Test velocities on planes and lines match the same meshgrids"""
+    field: FlowField = FlowField.load("test_field")
+    for low_bounds, high_bounds in [
+        ([0.3, -10, -3], [0.3, 10, 3]),
+        ([-10, 2, -3], [10, 2, 3]),
+        ([-10, 2.5, 1], [10, 2.5, 1]),
+        ([0, 0, -10], [0, 0, 10]),
+    ]:
+        kwargs = dict(low_bounds=low_bounds, high_bounds=high_bounds, step_size=0.2, time=1.5)
+        vel = field.sum_vel_section(**kwargs)
+        assert vel.shape == field.sum_vel_mesh(**kwargs).shape
+        assert np.allclose(vel, field.sum_vel_mesh(**kwargs), rtol=RTOL, atol=RTOL)
+
+    # Eddy-point pairs added in place to the points they touch, the same as a count over every point
+    rng = np.random.default_rng(0)
+    centers, alpha, points = rng.uniform(-1, 1, (5, 3)), rng.uniform(-1, 1, (5, 3)), rng.uniform(-1, 1, (50, 3))
+    eddy_idx, point_idx = rng.integers(0, 5, 40), rng.integers(0, 50, 40)
+    out = np.ones((50, 3))
+    assert eddy.sum_vel_pairs(centers, 0.5, alpha, points, eddy_idx, point_idx, out=out) is out
+    expected = eddy.sum_vel_pairs(centers, 0.5, alpha, points, eddy_idx, point_idx) + 1
+    assert np.allclose(out, expected, rtol=1e-12, atol=1e-12)
+    sections = [eddy.sum_vel_section(centers, 0.5, alpha, 1.2, [0.1], np.linspace(-1, 1, 9), np.linspace(-1, 1, 7), b)
+                for b in [1, 1000]]
+    assert np.allclose(sections[0], sections[1], rtol=1e-12, atol=1e-12)
+
+    # Not a plane or line
+    with pytest.raises(ValueError, match="equal low and high bounds"):
+        field.sum_vel_section([-1, -1, -1], [1, 1, 1])
+    with pytest.raises(ValueError, match="within the flow field"):
+        field.sum_vel_section([0, -100, 0], [0, 1, 0])
+    with pytest.raises(ValueError, match="Time must be non-negative"):
+        field.sum_vel_section([0, -1, 0], [0, 1, 0], time=-1)
+
+
+@pytest.mark.unit
+def test_flow_field_inflow():
+    """Test inflow planes over time match the planes of each time"""
+    field: FlowField = FlowField.load("test_field")
+    field.set_avg_vel(2.0)
+    x = field.low_bounds[0]
+    times = np.concatenate([np.arange(0, 3, 0.25), [field.dimensions[0] / field.avg_vel + 0.1, 0.5]])
+    kwargs = dict(x=x, low_bounds=[-3, -1], high_bounds=[3, 1], step_size=0.25)
+    vel = field.sum_vel_inflow(times, **kwargs)
+    assert vel.shape == (len(times), 25, 9, 3)
+    for frame, time in enumerate(times):
+        expected = field.sum_vel_mesh([x, -3, -1], [x, 3, 1], 0.25, time=float(time))[0]
+        assert np.allclose(vel[frame], expected, rtol=RTOL, atol=RTOL)
+
+    # Blocks of a single frame, non-uniform axes, and an output file with its index
+    axes = {"y": [-3, -1, 0, 2.5]}
+    vel = field.sum_vel_inflow(times, **kwargs, axes=axes, memory_limit=1e-6, out_file="__test_inflow__")
+    index = file_io.read("results", "__test_inflow__", "json")
+    assert index["shape"] == [len(times), 4, 9, 3] and index["y_coords"] == axes["y"]
+    expected = field.sum_vel_mesh([x, -3, -1], [x, 3, 1], 0.25, time=float(times[-3]), axes=axes)[0]
+    assert np.allclose(np.load("src/results/__test_inflow__.npy")[-3], expected, rtol=RTOL, atol=RTOL)
+    del vel
+    os.remove("src/results/__test_inflow__.npy")
+    os.remove("src/results/__test_inflow__.json")
+
+    # Invalid parameters
+    for invalid in [
+        dict(times=[]),
+        dict(times=[-1]),
+        dict(times=["a"]),
+        dict(times=[0], x="a"),
+        dict(times=[0], low_bounds=[0, 0, 0]),
+        dict(times=[0], axes={"x": [0]}),
+        dict(times=[0], memory_limit=0),
+        dict(times=[0], x=100),
+    ]:
+        with pytest.raises(ValueError):
+            field.sum_vel_inflow(**invalid)
+
+
+@pytest.mark.unit
+def test_flow_field_splat():
+    """Test the splat kernel gives the same velocities as the chunk kernel"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.2,
+        chunk_size=5,
+        low_bounds=[-10, -10, -3],
+        high_bounds=[10, 10, 3],
+        time=1.5,
+    )
+    vel_chunk = field.sum_vel_mesh(kernel="chunk", **kwargs)
+    vel_splat = field.sum_vel_mesh(kernel="splat", **kwargs)
+    assert np.allclose(vel_chunk, vel_splat, rtol=RTOL, atol=RTOL)
+
+
+@pytest.mark.unit
+def test_flow_field_separable():
+    """Test the separable gaussian kernel gives the same velocities as the chunk kernel"""
+    field: FlowField = FlowField.load("test_field")
+    kwargs = dict(
+        step_size=0.2,
+        chunk_size=8,
+        low_bounds=[-10, -10, -3],
+        high_bounds=[10, 10, 3],
+        time=1.5,
+    )
+    vel_chunk = field.sum_vel_mesh(kernel="chunk", **kwargs)
+    vel_separable = field.sum_vel_mesh(kernel="separable", **kwargs)
+    assert np.allclose(vel_chunk, vel_separable, rtol=RTOL, atol=RTOL)
+
+    # Only the gaussian shape function can be separated
+    shape_function.set_active("quadratic")
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh(kernel="separable", **kwargs)
+    shape_function.set_active("gaussian")
 
 
 @pytest.mark.unit
@@ -388,9 +1009,15 @@ def test_non_uniform_x_vel():
     diff_sum = np.sum(np.linalg.norm(vel_t0_b - vel_t2_b, axis=-1))
     assert diff_sum < RTOL
 
+    # Point queries follow the same velocity profile as the meshgrid
+    coords = [[4, -5, 0], [-8, 5, 0], [-6, 6.4, 1]]
+    vel_points = field.sum_vel_points(coords, time=2)
+    for coord, vel_point in zip(coords, vel_points):
+        assert np.allclose(vel_point, field.sum_vel_mesh(coord, coord, time=2).reshape(3), rtol=RTOL, atol=RTOL)
+
     # Clean up
     os.remove(f"src/profiles/{profile_name}.json")
-    os.remove(f"src/fields/{field_name}.pkl")
+    shutil.rmtree(f"src/fields/{field_name}")
 
 
 @pytest.mark.unit
@@ -510,6 +1137,27 @@ def test_flow_field_mesh_exceptions():
             time=-1,
         )
 
+    # Test for invalid chunk_size and memory_limit
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh(
+            step_size=1,
+            chunk_size="invalid",
+        )
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh(
+            step_size=1,
+            chunk_size="auto",
+            memory_limit=0,
+        )
+
+    # Test for invalid kernel
+    with pytest.raises(ValueError):
+        field.sum_vel_mesh(
+            step_size=1,
+            chunk_size=5,
+            kernel="invalid",
+        )
+
 
 @pytest.mark.unit
 def test_flow_field_set_exceptions():
@@ -1,7 +1,15 @@
+import io
 import os
+import shutil
+import sys
+import json
 import glob
 import pytest
 from modules import file_io
+from modules import result_cache
+from modules import shape_function
+from modules.query import Query
+from modules.flow_field import FlowField
 import main
 
 
@@ -32,11 +40,15 @@ def setup_module():
         }
     }
     file_io.write("queries", "main_test_query", query_content, "json")
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
     yield
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
     os.remove("src/profiles/main_test_profile.json")
     os.remove("src/queries/main_test_query.json")
-    os.remove("src/fields/main_test_field.pkl")
-    for file in glob.glob("src/results/main_test_*.npy"):
+    shutil.rmtree("src/fields/main_test_field")
+    shutil.rmtree("src/fields/main_test_field_x_profile", ignore_errors=True)
+    for file in glob.glob("src/results/main_test_*.npy") + glob.glob("src/results/main_test_*.json"):
         os.remove(file)
     for file in glob.glob("src/plots/main_test_*.png"):
         os.remove(file)
@@ -57,9 +69,11 @@ def test_main_new():
         "10",
         "-v",
         "0",
+        "-b",
+        "500",
     ]
     main.main(args)
-    assert os.path.exists("src/fields/main_test_field.pkl")
+    assert os.path.exists("src/fields/main_test_field/field.json")
 
 
 @pytest.mark.unit
@@ -99,7 +113,7 @@ def test_main_new_x_profile():
         "parabola_2d",
     ]
     main.main(args)
-    assert os.path.exists("src/fields/main_test_field_x_profile.pkl")
+    assert os.path.exists("src/fields/main_test_field_x_profile/field.json")
 
 
 @pytest.mark.unit
@@ -192,3 +206,87 @@ def test_main_query_exception(capsys):
     main.main(args)
     captured = capsys.readouterr()
     assert "Error handling query: Cannot read queries file 'non_existent_query'" in captured.err
+
+
+@pytest.mark.unit
+def test_main_inflow(capsys):
+    """Test generating inflow planes with main module"""
+    args = ["inflow", "-n", "main_test_field", "-t", "0", "1", "0.5", "-x", "-5", "-l", "-2", "-1", "-u", "2", "1",
+            "-r", "0.5", "-o", "main_test_inflow", "-s", "gaussian", "-c", "2.0"]
+    main.main(args)
+    captured = capsys.readouterr()
+    assert "Inflow planes (3, 9, 5, 3) saved to results/main_test_inflow.npy" in captured.out
+    index = file_io.read("results", "main_test_inflow", "json")
+    assert index["times"] == [0, 0.5, 1] and index["x"] == -5
+    assert file_io.read("results", "main_test_inflow", "npy").shape == tuple(index["shape"])
+
+
+@pytest.mark.unit
+def test_main_inflow_exceptions(capsys):
+    """Test exceptions in generating inflow planes with main module"""
+    main.main(["inflow", "-n", "non_existent_field", "-t", "0", "1", "0.5"])
+    assert "Error loading field 'non_existent_field'" in capsys.readouterr().err
+
+    main.main(["inflow", "-n", "main_test_field", "-t", "0", "1", "0.5", "-s", "non_existent_sf"])
+    assert "Error setting shape function" in capsys.readouterr().err
+
+    main.main(["inflow", "-n", "main_test_field", "-t", "0", "1", "0.5", "-x", "100", "-o", "main_test_inflow"])
+    assert "Error generating inflow planes" in capsys.readouterr().err
+
+    for times in [["10", "0", "1"], ["0", "1", "0"], ["-1", "1", "0.5"]]:
+        main.main(["inflow", "-n", "main_test_field", "-t", *times, "-o", "main_test_inflow"])
+        assert "Error generating inflow planes: Times must be" in capsys.readouterr().err
+
+
+@pytest.mark.unit
+def test_main_convert(capsys):
+    """Test converting a pickled field with main module"""
+    field = FlowField.load("main_test_field")
+    field.name = "main_test_convert"
+    file_io.write("fields", "main_test_convert", field, "obj")
+    main.main(["convert", "-n", "main_test_convert.pkl", "-k"])
+    assert "Field 'main_test_convert' converted successfully" in capsys.readouterr().out
+    assert os.path.exists("src/fields/main_test_convert.pkl")
+    assert FlowField.load("main_test_convert").fingerprint() == field.fingerprint()
+    shutil.rmtree("src/fields/main_test_convert")
+    os.remove("src/fields/main_test_convert.pkl")
+
+    main.main(["convert", "-n", "non_existent_field"])
+    assert "Error converting field 'non_existent_field'" in capsys.readouterr().err
+
+
+@pytest.mark.unit
+def test_main_serve(monkeypatch):
+    """Test serving queries from stdin with main module"""
+    request = {"mode": "points", "params": {"coords": [[0, 0, 0]]}, "output": "binary"}
+    stdin = io.TextIOWrapper(io.BytesIO(json.dumps(request).encode() + b"\n"))
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, "stdin", stdin)
+    monkeypatch.setattr(sys, "stdout", stdout)
+    # Restore the global state set by serving
+    monkeypatch.setattr(shape_function, "active", shape_function.active)
+    monkeypatch.setattr(shape_function, "cutoff", shape_function.cutoff)
+    monkeypatch.setattr(FlowField, "verbose", FlowField.verbose)
+    args = ["serve", "-n", "main_test_field", "-s", "gaussian", "-c", "1.0"]
+    main.main(args)
+    stdout.buffer.seek(0)
+    header = json.loads(stdout.buffer.readline())
+    assert header["status"] == "ok"
+    assert header["shape"] == [1, 3]
+    assert len(stdout.buffer.read()) == header["nbytes"]
+
+
+@pytest.mark.unit
+def test_main_serve_exceptions(capsys):
+    """Test exceptions in serving queries with main module"""
+    main.main(["serve", "-n", "main_test_field", "non_existent_field"])
+    captured = capsys.readouterr()
+    assert "Error loading field 'non_existent_field'" in captured.err
+
+    main.main(["serve", "-n", "main_test_field", "-s", "non_existent_sf"])
+    captured = capsys.readouterr()
+    assert "Error setting shape function" in captured.err
+
+    main.main(["serve", "-n", "main_test_field", "-m", "0"])
+    captured = capsys.readouterr()
+    assert "Error starting session" in captured.err
@@ -0,0 +1,56 @@
+import pytest
+import numpy as np
+from modules.neighbors import NeighborIndex
+
+
+def brute_force_pairs(centers, points, radius):
+    """All eddy-point pairs within the radius, sorted by point then eddy"""
+    dist = np.linalg.norm(points[np.newaxis, :, :] - centers[:, np.newaxis, :], axis=-1)
+    eddy_idx, point_idx = np.nonzero(dist <= radius)
+    order = np.lexsort((eddy_idx, point_idx))
+    return eddy_idx[order], point_idx[order]
+
+
+def sorted_pairs(eddy_idx, point_idx):
+    order = np.lexsort((eddy_idx, point_idx))
+    return eddy_idx[order], point_idx[order]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("use_tree", [True, False])
+def test_neighbor_index(use_tree):
+    """Test the neighbor search finds the same pairs as checking all eddies against all points"""
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-5, 5, (3000, 3))
+    # Include points outside the eddy cloud, which have no or few neighbors
+    points = rng.uniform(-7, 7, (500, 3))
+    for radius in [0.3, 2.0]:
+        index = NeighborIndex(centers, radius, use_tree)
+        expected = brute_force_pairs(centers, points, radius)
+        result = sorted_pairs(*index.query(points))
+        assert np.array_equal(result[0], expected[0])
+        assert np.array_equal(result[1], expected[1])
+
+
+@pytest.mark.unit
+def test_neighbor_index_empty():
+    """Test the neighbor search without any eddies"""
+    index = NeighborIndex(np.empty((0, 3)), 1.0, use_tree=False)
+    eddy_idx, point_idx = index.query(np.zeros((4, 3)))
+    assert len(eddy_idx) == 0 and len(point_idx) == 0
+
+
+@pytest.mark.unit
+def test_neighbor_index_tree():
+    """Test the SciPy KD-tree finds the same pairs as the built-in cell grid"""
+    pytest.importorskip("scipy")
+    rng = np.random.default_rng(1)
+    centers = rng.uniform(-5, 5, (3000, 3))
+    points = rng.uniform(-7, 7, (500, 3))
+    tree = NeighborIndex(centers, 0.8, use_tree=True)
+    grid = NeighborIndex(centers, 0.8, use_tree=False)
+    assert tree.tree is not None and grid.tree is None
+    result = sorted_pairs(*tree.query(points))
+    expected = sorted_pairs(*grid.query(points))
+    assert np.array_equal(result[0], expected[0])
+    assert np.array_equal(result[1], expected[1])
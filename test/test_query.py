@@ -1,9 +1,13 @@
 import pytest
 import os
+import shutil
 import glob
+import copy
 import json
-# import numpy as np
+import numpy as np
 from modules import file_io
+from modules import result_cache
+from modules import shape_function
 from modules.query import Query
 from modules.eddy_profile import EddyProfile
 from modules.flow_field import FlowField
@@ -34,10 +38,13 @@ def setup_module():
     query = Query(field)
 
     os.remove(f"src/profiles/{profile_name}.json")
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
 
     yield
 
     # Clean up
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
     FlowField.verbose = True
     for file in glob.glob(f"src/results/{field_name}_*.npy"):
         os.remove(file)
@@ -86,6 +93,86 @@ def test_query_meshgrid():
     os.remove(f"src/queries/{request}.json")
 
 
+@pytest.mark.unit
+def test_query_meshgrid_out_of_core():
+    """Test querying the field with meshgrid mode, writing the result as a memory-mapped file"""
+    content = {
+        "mode": "meshgrid",
+        "params": {
+            "low_bounds": [-1, -1, -1],
+            "high_bounds": [1, 1, 1],
+            "step_size": 0.2,
+            "time": 0,
+        },
+    }
+    vel = query.field.sum_vel_mesh(**content["params"])
+
+    content["params"]["out_of_core"] = True
+    response = query.handle_request(request=json.dumps(content))
+    assert "Raw result saved to results" in response, f"{response}"
+
+    # The saved file holds the same velocity field
+    filename = response.split("results/")[-1].replace(".npy", "")
+    assert np.array_equal(file_io.read("results", filename, "npy"), vel)
+
+
+@pytest.mark.unit
+def test_query_meshgrid_times():
+    """Test querying the field with meshgrid mode at a series of times"""
+    content = {
+        "mode": "meshgrid",
+        "params": {
+            "low_bounds": [-1, -1, 0],
+            "high_bounds": [1, 1, 0],
+            "step_size": 0.2,
+            "times": {"start": 0, "stop": 1, "step": 0.5},
+        },
+        "plot": {"axis": "z", "index": 0},
+    }
+    response = query.handle_request(request=json.dumps(content))
+    assert "Plot saved to plots" in response, f"{response}"
+
+    # Frames are stacked along the first axis
+    filename = response.split("results/")[-1].split(".npy")[0]
+    vel = file_io.read("results", filename, "npy")
+    assert vel.shape == (3, 11, 11, 1, 3)
+    assert np.array_equal(vel[2], query.field.sum_vel_mesh([-1, -1, 0], [1, 1, 0], 0.2, time=1.0))
+
+    # Invalid times
+    for times in [{"start": 0, "stop": 1}, {"start": 10, "stop": 0, "step": 1}, [], "invalid"]:
+        content["params"]["times"] = times
+        with pytest.raises(TypeError, match=r"^Invalid request parameters"):
+            query.handle_request(request=json.dumps(content))
+
+
+@pytest.mark.unit
+def test_query_meshgrid_axes():
+    """Test querying the field with meshgrid mode on non-uniform axes"""
+    content = {
+        "mode": "meshgrid",
+        "params": {
+            "low_bounds": [-1, -1, 0],
+            "high_bounds": [1, 1, 0],
+            "step_size": 0.2,
+            "axes": {"x": [-1, -0.9, -0.5, 1], "y": {"num": 8, "stretch": "geometric", "factor": 1.2}},
+        },
+    }
+    response, vel, _ = query.run(content)
+    assert vel.shape == (4, 8, 1, 3)
+    assert np.array_equal(vel, query.field.sum_vel_mesh(**content["params"]))
+
+    # Other coordinates are another result
+    content["params"]["axes"]["x"] = [-1, -0.8, -0.5, 1]
+    assert "served from cache" not in query.run(content)[0]
+    content["params"]["axes"]["y"]["factor"] = 1.1
+    assert "served from cache" not in query.run(content)[0]
+    assert "served from cache" in query.run(content)[0]
+
+    content["params"]["axes"] = {"x": [1, -1]}
+    with pytest.raises(Exception, match=r"^Error calculating velocity in meshgrid"):
+        query.run(content)
+
+
 @pytest.mark.unit
 def test_query_points():
     """Test querying the field with points mode"""
@@ -107,6 +194,164 @@ def test_query_points():
     assert "Velocity calculation complete (mode: points)." in response, f"{response}"
 
 
+@pytest.mark.unit
+def test_query_plane_line():
+    """Test querying the field with plane and line modes"""
+    field: FlowField = query.field
+    content = {
+        "mode": "plane",
+        "params": {"axis": "y", "position": 1, "low_bounds": [-5, -2], "high_bounds": [5, 2], "step_size": 0.5},
+        "plot": {"size": [320, 240]},
+    }
+    response, vel, path = query.run(content)
+    assert "Plot saved" in response
+    expected = field.sum_vel_mesh([-5, 1, -2], [5, 1, 2], step_size=0.5)
+    assert vel.shape == (21, 9, 3)
+    assert np.allclose(vel, expected[:, 0], rtol=1e-10)
+    assert np.allclose(np.load(path), vel)
+
+    # A line along z, over the whole field by default
+    content = {"mode": "line", "params": {"axis": "z", "position": [0.5, -1], "step_size": 0.5, "time": 1}}
+    response, vel, _ = query.run(content)
+    assert "Velocity calculation complete (mode: line)." in response
+    expected = field.sum_vel_mesh([0.5, -1, field.low_bounds[2]], [0.5, -1, field.high_bounds[2]], 0.5, time=1)
+    assert np.allclose(vel, expected.reshape(-1, 3), rtol=1e-10)
+
+    # Invalid axis, position or bounds
+    for params in [{"axis": "w", "position": 0}, {"axis": "x"}, {"axis": "x", "position": 0, "low_bounds": [0]}]:
+        with pytest.raises(TypeError, match=r"^Invalid request parameters"):
+            query.run({"mode": "plane", "params": params})
+    with pytest.raises(TypeError, match=r"^Invalid request parameters"):
+        query.run({"mode": "line", "params": {"axis": "x", "position": "invalid"}})
+    with pytest.raises(Exception, match=r"^Error calculating velocity in line"):
+        query.run({"mode": "line", "params": {"axis": "x", "position": [100, 0]}})
+
+
+@pytest.mark.unit
+def test_query_points_file():
+    """Test querying the field with points mode, reading the points from a file"""
+    coords = np.array([[0, 1, 0], [2, 1.5, 2.1], [-3, 4, -1.5], [4.9, -4.9, 0.2]])
+    np.save("src/queries/__points__.npy", coords)
+    content = {
+        "mode": "points",
+        "params": {
+            "coords": "__points__.npy",
+            "time": 0.5,
+            "batch_size": 3,
+        },
+    }
+    response = query.handle_request(request=json.dumps(content))
+    assert "Raw result saved to results" in response, f"{response}"
+
+    # The saved file holds the same velocities as the points given in the request
+    filename = response.split("results/")[-1].replace(".npy", "")
+    vel = query.field.sum_vel_points(coords.tolist(), time=0.5)
+    assert np.allclose(file_io.read("results", filename, "npy"), vel)
+
+    # Missing file
+    content["params"]["coords"] = "__not_exist__.npy"
+    with pytest.raises(file_io.FailToRead):
+        query.handle_request(request=json.dumps(content))
+
+    os.remove("src/queries/__points__.npy")
+
+
+@pytest.mark.unit
+def test_query_cache():
+    """Test serving repeated queries from the result cache"""
+    content = {
+        "mode": "points",
+        "params": {"coords": [[0, 1, 0], [2, 1.5, 2.1]], "time": 0.25},
+    }
+    response = query.handle_request(request=json.dumps(content))
+    assert "cache" not in response
+
+    # Same query with numbers written differently and a different batch size
+    content["params"] = {"coords": [[0.0, 1.0, 0.0], [2, 1.5, 2.1]], "time": 0.25, "batch_size": 1}
+    response_cached = query.handle_request(request=json.dumps(content))
+    assert "Result served from cache" in response_cached
+    filename = response.split("results/")[-1].replace(".npy", "")
+    filename_cached = response_cached.split("results/")[-1].replace(".npy", "")
+    assert np.array_equal(file_io.read("results", filename, "npy"), file_io.read("results", filename_cached, "npy"))
+
+    # A different cutoff is a different query
+    cutoff = shape_function.get_cutoff()
+    shape_function.set_cutoff(cutoff + 0.5)
+    _, vel, _ = query.run(content, save=False)
+    assert not isinstance(vel, np.memmap)
+    shape_function.set_cutoff(cutoff)
+
+    # Cached meshgrids are memory-mapped
+    content = {
+        "mode": "meshgrid",
+        "params": {"low_bounds": [-1, -1, 0], "high_bounds": [1, 1, 0], "step_size": 0.5},
+    }
+    _, vel, _ = query.run(content, save=False)
+    _, vel_cached, _ = query.run(content, save=False)
+    assert isinstance(vel_cached, np.memmap)
+    assert np.array_equal(vel, vel_cached)
+
+    # Results using flow iterations derived from a seed drawn in this process are not cached
+    unseeded = Query(copy.copy(query.field))
+    unseeded.field.seed = None
+    unseeded.field.set_avg_vel(2.0)
+    assert unseeded.cache_key("points", {"coords": [[0, 0, 0]], "time": 50}) is None
+    assert unseeded.cache_key("points", {"coords": [[0, 0, 0]], "time": 0}) is not None
+
+    # Caching disabled
+    Query.cache_limit = 0
+    _, vel, _ = query.run(content, save=False)
+    assert not isinstance(vel, np.memmap)
+    Query.cache_limit = result_cache.CACHE_LIMIT
+
+
+@pytest.mark.unit
+def test_query_batch():
+    """Test querying the field with a batch of requests"""
+    plane = {"low_bounds": [0, -2, -2], "high_bounds": [0, 2, 2], "step_size": 0.5, "time": 1}
+    requests = [
+        {"mode": "meshgrid", "params": plane},
+        {"mode": "meshgrid", "params": {**plane, "low_bounds": [1, -2, -2], "high_bounds": [1, 2, 2]}},
+        {"mode": "points", "params": {"coords": [[0, 1, 0], [2, 1.5, 2.1]], "time": 1}},
+        {"mode": "points", "params": {"coords": [[-1, 1, 0]], "time": 1}},
+        {"mode": "meshgrid", "params": {**plane, "times": [0, 0.5]}},
+        {"mode": "points", "params": {"coords": [[0, 0, 100]]}},
+    ]
+    file_io.write("queries", "__test_batch__", {"requests": requests, "workers": 2})
+    response = query.handle_request(request="__test_batch__", format="file")
+    assert response.count("Raw result saved to results") == 5, f"{response}"
+    assert "Request 5: Error calculating velocity at points" in response
+    os.remove("src/queries/__test_batch__.json")
+
+    # Same results as separate requests, in the order of the requests
+    Query.cache_limit = 0
+    results = query.run_batch(requests[:5], save=False, workers=3)
+    for request, (_, vel, path) in zip(requests, results):
+        assert path is None
+        assert np.allclose(vel, query.run(request, save=False)[1], rtol=1e-12, atol=1e-12)
+    assert not query.field.prefetched
+
+    # Concurrent meshgrids keep their own chunk information, and do not clear points converted from a file
+    np.savetxt("src/queries/__batch_points__.csv", [[0, 1, 0], [2, 1.5, 2.1]], delimiter=",")
+    csv_request = {"mode": "points", "params": {"coords": "__batch_points__.csv", "time": 1}}
+    results = query.run_batch([requests[0], csv_request, requests[1], csv_request], save=False, workers=4)
+    assert all(vel is not None for _, vel, _ in results), f"{results}"
+    assert os.path.exists("src/.cache/__info___0.json") and os.path.exists("src/.cache/__info___2.json")
+    assert len(glob.glob("src/.cache/__batch_points___*.npy")) == 1
+    assert np.allclose(results[1][1], query.run(requests[2], save=False)[1], rtol=1e-12, atol=1e-12)
+    assert np.array_equal(results[1][1], results[3][1])
+    os.remove("src/queries/__batch_points__.csv")
+    for file in glob.glob("src/.cache/__batch_points___*.npy") + glob.glob("src/.cache/__info___*.json"):
+        os.remove(file)
+    Query.cache_limit = result_cache.CACHE_LIMIT
+
+    # Invalid batches
+    with pytest.raises(TypeError, match=r"^Invalid batch request"):
+        query.run_batch([1, 2])
+    with pytest.raises(ValueError, match=r"^Invalid batch request"):
+        query.run_batch(requests, workers=0)
+
+
 @pytest.mark.unit
 def test_query_meshgrid_exceptions():
     """Test query exceptions in meshgrid mode"""
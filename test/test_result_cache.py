@@ -0,0 +1,60 @@
+import pytest
+import os
+import shutil
+import numpy as np
+from modules import result_cache
+
+CACHE_DIR = "results/__test_result_cache__"
+
+
+@pytest.fixture(autouse=True)
+def setup_function():
+    """Setup and teardown for each test"""
+    yield
+    shutil.rmtree(f"src/{CACHE_DIR}", ignore_errors=True)
+
+
+@pytest.mark.unit
+def test_result_cache_store_load():
+    """Test storing and loading results"""
+    key = result_cache.make_key({"a": [1.0, 2.0]})
+    assert key == result_cache.make_key({"a": [1.0, 2.0]})
+    assert key != result_cache.make_key({"a": [1.0, 2.5]})
+    assert result_cache.load(key, CACHE_DIR) is None
+
+    array = np.arange(12.0).reshape(4, 3)
+    result_cache.store(key, array, CACHE_DIR)
+    cached = result_cache.load(key, CACHE_DIR)
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, array)
+
+    # Results in a file are copied into the cache, writing into the file leaves the cached result as it was
+    path = result_cache.get_path(CACHE_DIR, "__source__")
+    np.save(path, array * 2)
+    key = result_cache.hash_array(array)
+    result_cache.store(key, path, CACHE_DIR)
+    assert np.array_equal(result_cache.load(key, CACHE_DIR), array * 2)
+    result = np.load(path, mmap_mode="r+")
+    result[...] = -1
+    result.flush()
+    assert np.array_equal(result_cache.load(key, CACHE_DIR), array * 2)
+    del result
+    os.remove(path)
+    assert np.array_equal(result_cache.load(key, CACHE_DIR), array * 2)
+
+
+@pytest.mark.unit
+def test_result_cache_eviction():
+    """Test removing the least recently used results over the size limit"""
+    array = np.zeros((1024, 128))  # 1 MB
+    keys = [result_cache.make_key({"i": i}) for i in range(3)]
+    for i, key in enumerate(keys):
+        result_cache.store(key, array, CACHE_DIR)
+        os.utime(result_cache.get_path(CACHE_DIR, key), ns=(i, i))
+
+    # Use the first result, the second is then the least recently used
+    os.utime(result_cache.get_path(CACHE_DIR, keys[0]), ns=(10, 10))
+    result_cache.evict(CACHE_DIR, limit=2.5)
+    assert os.path.exists(result_cache.get_path(CACHE_DIR, keys[0]))
+    assert not os.path.exists(result_cache.get_path(CACHE_DIR, keys[1]))
+    assert os.path.exists(result_cache.get_path(CACHE_DIR, keys[2]))
@@ -0,0 +1,171 @@
+import pytest
+import io
+import os
+import shutil
+import glob
+import json
+import socket
+import threading
+import numpy as np
+from modules import file_io
+from modules import result_cache
+from modules import server
+from modules.query import Query
+from modules.session import Session
+from modules.eddy_profile import EddyProfile
+from modules.flow_field import FlowField
+
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_module():
+    """Setup and teardown for the module tests"""
+    global fields, session
+    profile_name = "__test__"
+    content = {
+        "settings": {},
+        "variants": [
+            {"density": 10, "intensity": 1, "length_scale": 0.2},
+            {"density": 0.5, "intensity": 1.1, "length_scale": 0.5},
+        ],
+    }
+    file_io.write("profiles", profile_name, content)
+    profile = EddyProfile(profile_name)
+    FlowField.verbose = False
+    fields = {
+        "server_test_a": FlowField(profile, "server_test_a", [4, 4, 4]),
+        "server_test_b": FlowField(profile, "server_test_b", [4, 4, 4], avg_vel=1.0),
+    }
+    session = Session()
+    for field in fields.values():
+        session.add(field)
+    os.remove(f"src/profiles/{profile_name}.json")
+
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
+
+    yield
+
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
+    FlowField.verbose = True
+    for file in glob.glob("src/results/server_test_*.npy"):
+        os.remove(file)
+
+
+def read_response(stream):
+    """Read a response header and its payload from a binary stream"""
+    header = json.loads(stream.readline())
+    payload = stream.read(header.get("nbytes", 0))
+    return header, payload
+
+
+points = {"mode": "points", "params": {"coords": [[0, 0, 0], [1, 0.5, -1]], "time": 0.5}}
+
+
+@pytest.mark.unit
+def test_server_stream():
+    """Test serving requests from a stream, with file and binary outputs"""
+    requests = [
+        points,
+        {**points, "field": "server_test_b", "output": "binary"},
+        "not json",
+        {**points, "field": "missing"},
+        {**points, "output": "text"},
+        {"mode": "points"},
+        {"command": "shutdown"},
+        points,
+    ]
+    instream = io.BytesIO(b"\n".join(r.encode() if isinstance(r, str) else json.dumps(r).encode() for r in requests))
+    outstream = io.BytesIO()
+    server.serve_stream(session, instream, outstream)
+    outstream.seek(0)
+
+    # Saved to a file of the first field
+    header, _ = read_response(outstream)
+    assert header["status"] == "ok"
+    assert header["field"] == "server_test_a"
+    assert header["shape"] == [2, 3]
+    expected = fields["server_test_a"].sum_vel_points(points["params"]["coords"], time=0.5)
+    assert np.allclose(np.load(header["path"]), expected)
+
+    # Raw buffer of the second field
+    header, payload = read_response(outstream)
+    assert header["status"] == "ok"
+    vel = np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+    expected = fields["server_test_b"].sum_vel_points(points["params"]["coords"], time=0.5)
+    assert np.allclose(vel, expected)
+
+    # Errors do not stop the server
+    messages = [read_response(outstream)[0] for _ in range(4)]
+    assert all(header["status"] == "error" for header in messages)
+    assert "Invalid query request string" in messages[0]["message"]
+    assert "Error loading field" in messages[1]["message"]
+    assert "Invalid output" in messages[2]["message"]
+    assert "Error handling query" in messages[3]["message"]
+
+    # Nothing is served after shutdown
+    header, _ = read_response(outstream)
+    assert header["command"] == "shutdown"
+    assert outstream.read() == b""
+
+
+@pytest.mark.unit
+def test_server_socket():
+    """Test serving requests on a Unix socket"""
+    path = "src/__test_server__.sock"
+    if os.path.exists(path):
+        os.remove(path)
+    thread = threading.Thread(target=server.serve_socket, args=(session, path), daemon=True)
+    thread.start()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        # The socket file exists once bound, connect once the server listens
+        while True:
+            try:
+                client.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+        stream = client.makefile("rwb")
+        for time in [0, 1]:
+            request = {**points, "output": "binary"}
+            request["params"] = {**points["params"], "time": time}
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            header, payload = read_response(stream)
+            vel = np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+            assert np.allclose(vel, fields["server_test_a"].sum_vel_points(request["params"]["coords"], time=time))
+        stream.write(b'{"command": "shutdown"}\n')
+        stream.flush()
+        assert read_response(stream)[0]["status"] == "ok"
+
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.unit
+def test_server_batch():
+    """Test serving a batch of requests with raw buffers one after another"""
+    second = {"mode": "points", "params": {"coords": [[0, 0, 1]], "time": 0.5}}
+    request = {"requests": [points, second, {"mode": "invalid", "params": {}}], "output": "binary"}
+    instream = io.BytesIO(json.dumps(request).encode())
+    outstream = io.BytesIO()
+    server.serve_stream(session, instream, outstream)
+    outstream.seek(0)
+
+    header = json.loads(outstream.readline())
+    assert header["status"] == "ok"
+    assert [result["status"] for result in header["results"]] == ["ok", "ok", "error"]
+    assert header["nbytes"] == sum(result.get("nbytes", 0) for result in header["results"])
+    field = fields["server_test_a"]
+    for result, query in zip(header["results"][:2], [points, second]):
+        vel = np.frombuffer(outstream.read(result["nbytes"]), dtype=result["dtype"]).reshape(result["shape"])
+        assert np.allclose(vel, field.sum_vel_points(query["params"]["coords"], time=0.5))
+
+
+@pytest.mark.unit
+def test_query_run_no_save():
+    """Test running a parsed request without saving the result"""
+    response, vel, path = Query(fields["server_test_a"]).run(points, save=False)
+    assert "saved" not in response
+    assert path is None
+    assert vel.shape == (2, 3)
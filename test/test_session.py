@@ -0,0 +1,104 @@
+import pytest
+import os
+import shutil
+import glob
+import json
+from modules import file_io
+from modules import result_cache
+from modules.query import Query
+from modules.session import Session
+from modules.eddy_profile import EddyProfile
+from modules.flow_field import FlowField
+
+
+@pytest.fixture(scope="module", autouse=True)
+def setup_module():
+    """Setup and teardown for the module tests"""
+    global profile
+    profile_name = "__test__"
+    content = {
+        "settings": {},
+        "variants": [
+            {"density": 10, "intensity": 1, "length_scale": 0.2},
+            {"density": 0.5, "intensity": 1.1, "length_scale": 0.5},
+        ],
+    }
+    file_io.write("profiles", profile_name, content)
+    profile = EddyProfile(profile_name)
+    FlowField.verbose = False
+    os.remove(f"src/profiles/{profile_name}.json")
+
+    Query.cache_dir = "results/__test_cache__"  # Keep cached test results apart
+
+    yield
+
+    Query.cache_dir = result_cache.CACHE_DIR
+    shutil.rmtree("src/results/__test_cache__", ignore_errors=True)
+    FlowField.verbose = True
+    for directory in glob.glob("src/fields/session_test_*"):
+        shutil.rmtree(directory)
+    for file in glob.glob("src/results/session_test_*.npy"):
+        os.remove(file)
+
+
+@pytest.mark.unit
+def test_session_routing():
+    """Test routing requests to fields by name, loading saved fields on first use"""
+    session = Session()
+    field_a = FlowField(profile, "session_test_a", [4, 4, 4])
+    field_b = FlowField(profile, "session_test_b", [4, 4, 4], avg_vel=1.0)
+    field_b.save()
+    query_a = session.add(field_a)
+
+    # Each field keeps its own query handler
+    query_b = session.get("session_test_b")
+    assert query_b is not query_a
+    assert query_a.field is field_a
+    assert query_b.field.name == "session_test_b"
+    assert session.get() is query_a
+    assert session.get("session_test_b") is query_b
+    assert Query(field_b) is not Query(field_a)
+
+    request = {"mode": "points", "params": {"coords": [[0, 0, 0]]}}
+    assert "points" in session.handle_request(json.dumps(request))
+    assert "points" in session.handle_request(json.dumps({**request, "field": "session_test_b"}))
+    assert len(glob.glob("src/results/session_test_b_points_*.npy")) == 1
+
+
+@pytest.mark.unit
+def test_session_eviction():
+    """Test unloading the least recently used fields over the memory budget"""
+    fields = [FlowField(profile, f"session_test_{i}", [4, 4, 4]) for i in range(3)]
+    limit = (fields[0].nbytes() + fields[1].nbytes() + fields[2].nbytes() / 2) / 1024**2
+    session = Session(memory_limit=limit)
+    session.add(fields[0])
+    session.add(fields[1])
+    assert list(session.queries) == ["session_test_0", "session_test_1"]
+
+    # Using the first field makes the second one least recently used
+    session.get("session_test_0")
+    session.add(fields[2])
+    assert list(session.queries) == ["session_test_0", "session_test_2"]
+    assert session.nbytes() <= limit * 1024**2
+
+    # A single field over the budget is kept
+    session = Session(memory_limit=1e-6)
+    session.add(fields[0])
+    session.add(fields[1])
+    assert list(session.queries) == ["session_test_1"]
+
+
+@pytest.mark.unit
+def test_session_exceptions():
+    """Test exceptions in the session"""
+    with pytest.raises(ValueError):
+        Session(memory_limit=0)
+    session = Session()
+    with pytest.raises(ValueError):
+        session.get()
+    with pytest.raises(file_io.FailToRead):
+        session.get("non_existent_field")
+    with pytest.raises(Exception, match="Invalid query request string"):
+        session.handle_request("not json")
+    with pytest.raises(TypeError):
+        session.handle_request("[]")
@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+from modules import stretching
+
+
+@pytest.mark.unit
+def test_stretching():
+    """Test stretched axes span the bounds and cluster points where requested"""
+    for stretch in ["uniform", "tanh", "geometric"]:
+        for cluster in stretching.CLUSTERS:
+            coords = stretching.axis_coords(-1, 3, 11, stretch, 1.5, cluster)
+            assert len(coords) == 11
+            assert coords[0] == -1 and coords[-1] == 3
+            assert np.all(np.diff(coords) > 0)
+
+    # Smallest cells at the clustered bounds
+    steps = np.diff(stretching.axis_coords(0, 1, 11, "tanh", 2.0, "low"))
+    assert steps[0] == np.min(steps) and steps[-1] == np.max(steps)
+    steps = np.diff(stretching.axis_coords(0, 1, 11, "tanh", 2.0, "high"))
+    assert steps[-1] == np.min(steps)
+    steps = np.diff(stretching.axis_coords(0, 1, 11, "tanh", 2.0, "both"))
+    assert np.allclose(steps, steps[::-1])
+
+    # Geometric cells grow by the factor, also towards the middle from both bounds
+    steps = np.diff(stretching.axis_coords(0, 1, 6, "geometric", 1.5, "low"))
+    assert np.allclose(steps[1:] / steps[:-1], 1.5)
+    steps = np.diff(stretching.axis_coords(0, 1, 7, "geometric", 1.5, "both"))
+    assert np.allclose(steps[1:3] / steps[:2], 1.5)
+    assert np.allclose(stretching.axis_coords(0, 1, 5, "geometric", 1, "low"), np.linspace(0, 1, 5))
+
+
+@pytest.mark.unit
+def test_stretching_exceptions():
+    """Test invalid stretching parameters"""
+    with pytest.raises(ValueError, match="is not defined"):
+        stretching.axis_coords(0, 1, 11, "invalid")
+    with pytest.raises(ValueError, match="is not defined"):
+        stretching.axis_coords(0, 1, 11, "axis_coords")
+    with pytest.raises(ValueError, match="at least 2"):
+        stretching.axis_coords(0, 1, 1)
+    with pytest.raises(ValueError, match="positive number"):
+        stretching.axis_coords(0, 1, 11, factor=0)
+    with pytest.raises(ValueError, match="Cluster must be one of"):
+        stretching.axis_coords(0, 1, 11, cluster="middle")
+    with pytest.raises(ValueError, match="less than its high bound"):
+        stretching.axis_coords(1, 1, 11)